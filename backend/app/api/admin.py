@@ -1,8 +1,18 @@
+import asyncio
+import os
+import shutil
+import tempfile
 from collections import Counter
 
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Form, HTTPException, Query
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 
+from app.config import settings
+from app.rag.embedder import embedder
+from app.rag.index_bundle import BundleError
 from app.rag.ingest import ingestion_pipeline
+from app.rag.reranker import cross_encoder_reranker
 from app.rag.vector_store import vector_store
 from app.rag.chunker import _detect_content_type
 
@@ -38,30 +48,24 @@ async def ingest_pdf(
 async def content_type_stats(vehicle_id: str = Query(...)):
     """Show content_type distribution and diff against re-classification (max 50 diffs)."""
     try:
-        collection = vector_store._get_collection()
-        results = collection.get(
-            where={"vehicle_id": vehicle_id},
-            include=["documents", "metadatas"],
-        )
+        chunks = await vector_store.get_chunks(vehicle_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
 
-    documents = results.get("documents") or []
-    metadatas = results.get("metadatas") or []
-
     # Current distribution
     current_counts: Counter = Counter()
     diffs: list[dict] = []
 
-    for doc, meta in zip(documents, metadatas):
-        stored_type = meta.get("content_type", "general")
+    for chunk in chunks:
+        doc = chunk["content"]
+        stored_type = chunk["content_type"] or "general"
         current_counts[stored_type] += 1
 
         reclassified = _detect_content_type(doc)
         if reclassified != stored_type and len(diffs) < 50:
             diffs.append({
-                "page": meta.get("page", 0),
-                "section": meta.get("section", ""),
+                "page": chunk["page"],
+                "section": chunk["section"],
                 "stored": stored_type,
                 "reclassified": reclassified,
                 "text_preview": doc[:120] if doc else "",
@@ -69,7 +73,7 @@ async def content_type_stats(vehicle_id: str = Query(...)):
 
     return {
         "vehicle_id": vehicle_id,
-        "total_chunks": len(documents),
+        "total_chunks": len(chunks),
         "distribution": dict(current_counts),
         "reclassification_diffs": diffs,
         "diff_count": len(diffs),
@@ -84,33 +88,109 @@ async def content_type_samples(
 ):
     """Show sample chunks for a specific content_type."""
     try:
-        collection = vector_store._get_collection()
-        results = collection.get(
-            where={"$and": [
-                {"vehicle_id": vehicle_id},
-                {"content_type": content_type},
-            ]},
-            include=["documents", "metadatas"],
-        )
+        chunks = await vector_store.get_chunks(vehicle_id, content_type=content_type)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Query error: {str(e)}")
 
-    documents = results.get("documents") or []
-    metadatas = results.get("metadatas") or []
-
     samples = []
-    for doc, meta in zip(documents[:limit], metadatas[:limit]):
+    for chunk in chunks[:limit]:
         samples.append({
-            "page": meta.get("page", 0),
-            "section": meta.get("section", ""),
-            "has_warning": meta.get("has_warning", False),
-            "text_preview": doc[:200] if doc else "",
+            "page": chunk["page"],
+            "section": chunk["section"],
+            "has_warning": chunk["has_warning"],
+            "text_preview": chunk["content"][:200] if chunk["content"] else "",
         })
 
     return {
         "vehicle_id": vehicle_id,
         "content_type": content_type,
-        "total": len(documents),
+        "total": len(chunks),
         "showing": len(samples),
         "samples": samples,
     }
+
+
+@router.get("/admin/embedding-cache-stats")
+async def embedding_cache_stats():
+    """Show hit/miss counters of the query embedding cache."""
+    return embedder.cache_stats()
+
+
+@router.get("/admin/reranker-stats")
+async def reranker_stats():
+    """Show the configured reranker backend and cross-encoder batching counters."""
+    return {"backend": settings.reranker_backend, "cross_encoder": cross_encoder_reranker.stats()}
+
+
+@router.get("/admin/search-cache-stats")
+async def search_cache_stats():
+    """Show hit ratio and memory usage of the search result cache."""
+    return vector_store.cache_stats()
+
+
+@router.get("/admin/vector-store-stats")
+async def vector_store_stats():
+    """Show index size and I/O thread pool queue depth."""
+    return await vector_store.get_stats()
+
+
+@router.get("/admin/index-bundle/export")
+async def export_index_bundle(vehicle_id: str = Query(...)):
+    """Download a vehicle's chunks, embeddings and keyword index as a single bundle file."""
+    fd, path = tempfile.mkstemp(suffix=".vbundle")
+    os.close(fd)
+    try:
+        await vector_store.export_bundle(vehicle_id, path)
+    except ValueError as e:
+        os.remove(path)
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        os.remove(path)
+        raise HTTPException(status_code=500, detail=f"Export error: {str(e)}")
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename=f"{vehicle_id}.vbundle",
+        background=BackgroundTask(os.remove, path),
+    )
+
+
+def _save_upload(file: UploadFile, fd: int):
+    with os.fdopen(fd, "wb") as f:
+        shutil.copyfileobj(file.file, f)
+
+
+@router.post("/admin/index-bundle/import")
+async def import_index_bundle(file: UploadFile = File(...), verify: bool = Form(True)):
+    """Load a bundle exported from another node without re-embedding."""
+    fd, path = tempfile.mkstemp(suffix=".vbundle")
+    try:
+        # 数GBになりうるアップロードの書き出しでイベントループを塞がない
+        await asyncio.to_thread(_save_upload, file, fd)
+        return await vector_store.import_bundle(path, verify=verify)
+    except BundleError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Import error: {str(e)}")
+    finally:
+        os.remove(path)
+
+
+@router.post("/admin/reembed")
+async def reembed(background_tasks: BackgroundTasks, vehicle_id: str | None = Form(None)):
+    """Re-embed stored chunks with the current embedding model in the background.
+
+    Each vehicle is rebuilt as a new index version and switched over when complete,
+    so searches keep using the current version meanwhile.
+    """
+    vehicle_ids = [vehicle_id] if vehicle_id else await vector_store.list_vehicles()
+    if not vehicle_ids:
+        raise HTTPException(status_code=404, detail="No indexed vehicles")
+    background_tasks.add_task(vector_store.reembed_vehicles, vehicle_ids)
+    return {"scheduled": vehicle_ids, "embedding_model": embedder.model_name}
+
+
+@router.post("/admin/index-gc")
+async def collect_index_garbage():
+    """Drop index versions no longer referenced by any vehicle alias."""
+    return await vector_store.collect_garbage()
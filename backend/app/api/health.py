@@ -1,6 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 
 from app.llm.registry import provider_registry
+from app.services.warmup import warmup_service
 
 router = APIRouter()
 
@@ -10,6 +12,18 @@ async def health_check():
     active = provider_registry.get_active()
     return {
         "status": "ok",
+        "ready": warmup_service.ready,
+        "warmup": warmup_service.snapshot(),
         "llm_provider": active.name if active else None,
         "llm_configured": active.is_configured() if active else False,
     }
+
+
+@router.get("/health/ready")
+async def readiness_check():
+    """ロードバランサー用: ウォームアップ完了まで503を返す。"""
+    status_code = 200 if warmup_service.ready else 503
+    return JSONResponse(
+        status_code=status_code,
+        content={"ready": warmup_service.ready, "status": warmup_service.status},
+    )
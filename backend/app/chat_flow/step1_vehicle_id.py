@@ -1,5 +1,6 @@
 from app.models.session import SessionState, ChatStep
 from app.models.chat import ChatRequest, ChatResponse, PromptInfo
+from app.rag.vector_store import vector_store
 from app.services.vehicle_service import vehicle_service
 
 
@@ -13,6 +14,8 @@ async def handle_vehicle_id(session: SessionState, request: ChatRequest) -> Chat
             session.vehicle_year = vehicle.year
             session.vehicle_photo_url = vehicle.photo_url
             session.current_step = ChatStep.PHOTO_CONFIRM
+            # 症状入力までの間に車両のインデックスシャードを読み込んでおく
+            vector_store.schedule_prefetch(vehicle.id)
 
             return ChatResponse(
                 session_id=session.session_id,
@@ -5,9 +5,46 @@ class Settings(BaseSettings):
     openai_api_key: str = ""
     openai_model: str = "gpt-4o-mini"
     openai_embedding_model: str = "text-embedding-3-small"
-    embedding_provider: str = "local"  # "local" (e5), "openai", or "bedrock"
+    embedding_provider: str = "local"  # "local" (e5), "local_onnx" (e5 int8), "local_server", "openai", or "bedrock"
     local_embedding_model: str = "intfloat/multilingual-e5-large-instruct"
+    local_onnx_model_dir: str = "./models/multilingual-e5-large-instruct-onnx-int8"
+    local_onnx_num_threads: int = 0  # 0 = ONNX Runtimeの自動設定
+    embedding_server_socket: str = "/tmp/vehicle-ai-embedding.sock"  # embedding_provider="local_server" の接続先
+    embedding_server_backend: str = "local"  # 共有embeddingサーバーが使うモデル: "local" or "local_onnx"
+    embedding_server_pool_size: int = 4
+    embedding_server_timeout_seconds: float = 30.0
+    embedding_cache_size: int = 2048  # クエリembeddingのLRUキャッシュ件数（0で無効）
+    embedding_cache_ttl_seconds: int = 3600
+    embedding_batch_max_size: int = 32  # ローカルembeddingのマイクロバッチ上限（テキスト数）
+    embedding_batch_max_wait_ms: float = 5.0  # バッチに相乗りするリクエストを待つ最大時間
+    embedding_batch_token_budget: int = 16384  # ingest時の1バッチあたりのトークン予算（件数×最大長）
+    bedrock_embed_max_concurrency: int = 8  # Bedrock embeddingの同時リクエスト上限
+    bedrock_embed_max_retries: int = 5  # ThrottlingException時のリトライ回数
+    embedding_store_dir: str = "./embedding_store"  # チャンクembeddingの永続ストア（空文字で無効）
+    embedding_store_dtype: str = "float32"  # "float32" or "float16"
     chroma_persist_dir: str = "./chroma_data"
+    vector_store_backend: str = "chroma"  # "chroma" or "flat"（車両ごとのNumPy行列で厳密検索）
+    flat_index_dir: str = "./flat_index"
+    vector_store_shard_per_vehicle: bool = False  # chroma: 車両ごとにコレクションを分ける（flatは常に車両単位）
+    vector_store_memory_budget_mb: int = 0  # 常駐させるインデックスのメモリ上限（0で無制限、超過分はLRUで解放）
+    vector_store_io_workers: int = 4  # インデックスI/O専用スレッドプールの同時実行数
+    vector_store_quantization: str = "none"  # flat: "none", "float16", "int8"（圧縮表現で候補を絞りfloat32で再スコア）
+    vector_store_rescore_factor: int = 4  # 量子化時に再スコアする候補数（top-k × この倍率）
+    search_cache_size: int = 1024  # 検索結果のLRUキャッシュ件数（0で無効）
+    search_cache_ttl_seconds: int = 600  # 他プロセスでのingestはバージョンで検知できないため短めに
+    mmr_enabled: bool = True  # リランク前にMMRで重複に近い候補を間引く
+    mmr_lambda: float = 0.7  # MMRの関連度の重み（1.0で関連度順のまま）
+    mmr_top_n: int = 12  # MMR後にリランカーへ渡す候補数の上限
+    mmr_duplicate_threshold: float = 0.95  # 選択済みとのコサイン類似度がこれ以上の候補は除外
+    reranker_backend: str = "llm"  # "llm"（アクティブLLMで評価）or "cross_encoder"（ローカルCPUのcross-encoder）
+    reranker_model: str = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"  # 多言語cross-encoder
+    reranker_max_length: int = 512  # cross-encoderの入力トークン上限（クエリ + 文書）
+    reranker_batch_size: int = 64  # cross-encoderのマイクロバッチ上限（ペア数）
+    rag_alt_query_timeout_seconds: float = 4.0  # 追加クエリ生成（LLM）の待ち時間上限。超えたら追加クエリなしで続行（0で無制限）
+    rag_search_timeout_seconds: float = 3.0  # 追加クエリ検索・CRAG再検索の待ち時間上限。超えた検索の結果は使わない（メイン検索には適用しない）
+    rag_rerank_timeout_seconds: float = 8.0  # リランクの待ち時間上限。超えたら検索順の上位を使う
+    embedding_projection: str = "none"  # "none", "pca", or "truncate"（次元削減）
+    embedding_projection_dim: int = 256
     pdf_dir: str = "./pdfs"
     cors_origins: str = "http://localhost:3000"
     session_ttl_seconds: int = 3600
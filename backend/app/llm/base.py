@@ -40,3 +40,6 @@ class LLMProvider(ABC):
     @abstractmethod
     def is_configured(self) -> bool:
         ...
+
+    def warm_up(self) -> None:
+        """APIクライアント等を事前に構築する（起動時ウォームアップ用）。"""
@@ -27,6 +27,10 @@ class BedrockProvider(LLMProvider):
             )
         return self._client
 
+    def warm_up(self) -> None:
+        if self.is_configured():
+            self._get_client()
+
     def is_configured(self) -> bool:
         try:
             session = boto3.Session()
@@ -16,6 +16,10 @@ class OpenAIProvider(LLMProvider):
             self._client = AsyncOpenAI(api_key=settings.openai_api_key)
         return self._client
 
+    def warm_up(self) -> None:
+        if self.is_configured():
+            self._get_client()
+
     def is_configured(self) -> bool:
         return bool(settings.openai_api_key and settings.openai_api_key != "sk-your-openai-api-key")
 
@@ -7,7 +7,9 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import settings
 from app.api.router import api_router
 from app.llm.registry import provider_registry
+from app.rag.store_executor import store_executor
 from app.rag.vector_store import vector_store
+from app.services.warmup import warmup_service
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s: %(message)s")
 
@@ -16,7 +18,10 @@ logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s: %(messag
 async def lifespan(app: FastAPI):
     provider_registry.initialize()
     vector_store.initialize()
+    warmup_service.start()
     yield
+    await warmup_service.stop()
+    store_executor.shutdown()
 
 
 app = FastAPI(title="Vehicle AI Chat", version="1.0.0", lifespan=lifespan)
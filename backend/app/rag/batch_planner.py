@@ -0,0 +1,38 @@
+"""長さ考慮のembeddingバッチ計画
+
+ドキュメント順に固定件数で区切ると、各バッチが最長チャンクに合わせて
+パディングされ、短い表の行が長い手順チャンクのコストを払うことになる。
+ここではトークン長でソートし、「件数 × バッチ内最大長」がトークン予算を
+超えないようにバケットを作る。呼び出し側は元のインデックスで結果を戻す。
+"""
+
+
+def estimate_token_length(text: str) -> int:
+    """トークナイザーが使えない場合の概算（日本語はおおむね1文字≒1トークン）。"""
+    return max(1, len(text))
+
+
+def plan_length_buckets(
+    lengths: list[int],
+    token_budget: int,
+    max_batch_size: int | None = None,
+) -> list[list[int]]:
+    """長さ順に並べた元インデックスのバケット列を返す。
+
+    各バケットは「件数 × 最大長 <= token_budget」を満たす（予算を単独で
+    超える1件は、それだけで1バケットになる）。
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets: list[list[int]] = []
+    current: list[int] = []
+    for idx in order:
+        # 昇順に並べているので、追加する要素がバケット内の最大長になる
+        padded_cost = (len(current) + 1) * lengths[idx]
+        full = max_batch_size is not None and len(current) >= max_batch_size
+        if current and (padded_cost > token_budget or full):
+            buckets.append(current)
+            current = []
+        current.append(idx)
+    if current:
+        buckets.append(current)
+    return buckets
@@ -0,0 +1,229 @@
+"""BM25キーワード索引
+
+日本語は分かち書きされないため、本文を文字bigramに分解し、さらに
+keyword_extractor の辞書・パターンで抽出した語（"w:" 接頭辞）を語彙に加える。
+車両ごとに転置索引（語 → 行番号・出現回数）を持ち、BM25でスコアリングする。
+
+永続化は車両ごとの .npz（語・オフセット・posting配列）。ingest時に構築し、
+索引がない既存データは最初のキーワード検索時に構築する。
+"""
+
+import io
+import logging
+import math
+import os
+import re
+import threading
+import unicodedata
+from collections import Counter
+from typing import BinaryIO, Callable
+
+import numpy as np
+
+from app.rag.keyword_extractor import extract_terms
+
+logger = logging.getLogger(__name__)
+
+_K1 = 1.2
+_B = 0.75
+
+# 区切り文字をまたぐbigramは作らない（長音符とハイフンは語の一部なので除外）
+_SEPARATORS = re.compile(r"[\s、。，．,.:：;；()（）「」『』【】\[\]/／!！?？・…\"'”“]+")
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def tokenize(text: str) -> list[str]:
+    """文字bigram + 抽出語（"w:" 接頭辞）を出現回数分返す。"""
+    normalized = unicodedata.normalize("NFKC", text)
+    terms: list[str] = []
+    for segment in _SEPARATORS.split(normalized.lower()):
+        terms.extend(segment[i : i + 2] for i in range(len(segment) - 1))
+    terms.extend(f"w:{term.lower()}" for term in extract_terms(normalized))
+    return terms
+
+
+class _VehiclePostings:
+    """1車両分の転置索引。行番号は ids のインデックス。"""
+
+    def __init__(self, ids: list[str], doc_len: np.ndarray, postings: dict[str, tuple[np.ndarray, np.ndarray]]):
+        self.ids = ids
+        self.doc_len = doc_len
+        self.postings = postings
+        avgdl = float(doc_len.mean()) if len(doc_len) else 1.0
+        self._norm = _K1 * (1 - _B + _B * doc_len / max(avgdl, 1e-9))
+
+    @classmethod
+    def build(cls, ids: list[str], documents: list[str], base: "_VehiclePostings | None" = None) -> "_VehiclePostings":
+        offset = len(base.ids) if base else 0
+        rows: dict[str, list[int]] = {}
+        tfs: dict[str, list[int]] = {}
+        lengths = []
+        for row, doc in enumerate(documents, start=offset):
+            counts = Counter(tokenize(doc))
+            lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                rows.setdefault(term, []).append(row)
+                tfs.setdefault(term, []).append(tf)
+
+        postings = dict(base.postings) if base else {}
+        for term, term_rows in rows.items():
+            new_rows = np.array(term_rows, dtype=np.int32)
+            new_tfs = np.array(tfs[term], dtype=np.int32)
+            if term in postings:
+                old_rows, old_tfs = postings[term]
+                new_rows = np.concatenate([old_rows, new_rows])
+                new_tfs = np.concatenate([old_tfs, new_tfs])
+            postings[term] = (new_rows, new_tfs)
+
+        doc_len = np.array(lengths, dtype=np.int32)
+        if base:
+            doc_len = np.concatenate([base.doc_len, doc_len])
+        return cls((base.ids if base else []) + list(ids), doc_len, postings)
+
+    def score(self, terms: set[str]) -> np.ndarray:
+        n = len(self.ids)
+        scores = np.zeros(n, dtype=np.float32)
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            rows, tf = posting
+            df = len(rows)
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tf * (_K1 + 1) / (tf + self._norm[rows])
+        return scores
+
+    def renamed(self, rename: Callable[[str], str]) -> "_VehiclePostings":
+        """チャンクIDだけを付け替えた索引（版の間・ノード間でのコピー用）"""
+        return _VehiclePostings([rename(i) for i in self.ids], self.doc_len, self.postings)
+
+    def write(self, f: BinaryIO):
+        terms = list(self.postings)
+        lengths = [len(self.postings[t][0]) for t in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        empty = np.empty(0, dtype=np.int32)
+        np.savez(
+            f,
+            ids=np.array(self.ids, dtype=str),
+            doc_len=self.doc_len,
+            terms=np.array(terms, dtype=str),
+            offsets=offsets,
+            rows=np.concatenate([self.postings[t][0] for t in terms]) if terms else empty,
+            tfs=np.concatenate([self.postings[t][1] for t in terms]) if terms else empty,
+        )
+
+    def save(self, path: str):
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            self.write(f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str | BinaryIO) -> "_VehiclePostings":
+        with np.load(path) as data:
+            offsets = data["offsets"]
+            rows = data["rows"]
+            tfs = data["tfs"]
+            postings = {
+                str(term): (rows[offsets[i] : offsets[i + 1]], tfs[offsets[i] : offsets[i + 1]])
+                for i, term in enumerate(data["terms"])
+            }
+            return cls([str(i) for i in data["ids"]], data["doc_len"], postings)
+
+
+class BM25Index:
+    """車両ごとの BM25 転置索引（{root_dir}/{vehicle_id}.npz）"""
+
+    def __init__(self, root_dir: str):
+        self.root_dir = root_dir
+        self._vehicles: dict[str, _VehiclePostings] = {}
+        self._lock = threading.RLock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _path(self, vehicle_id: str) -> str:
+        return os.path.join(self.root_dir, _UNSAFE_PATH_CHARS.sub("_", vehicle_id) + ".npz")
+
+    def _get(self, vehicle_id: str) -> _VehiclePostings | None:
+        with self._lock:
+            if vehicle_id not in self._vehicles:
+                path = self._path(vehicle_id)
+                if not os.path.exists(path):
+                    return None
+                try:
+                    self._vehicles[vehicle_id] = _VehiclePostings.load(path)
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning("Ignoring broken BM25 index %s: %s", path, e)
+                    return None
+            return self._vehicles[vehicle_id]
+
+    def has(self, vehicle_id: str) -> bool:
+        return self._get(vehicle_id) is not None
+
+    def add(self, vehicle_id: str, ids: list[str], documents: list[str]):
+        """既存の索引にチャンクを追加する。"""
+        with self._lock:
+            self._store(vehicle_id, _VehiclePostings.build(ids, documents, self._get(vehicle_id)))
+
+    def build(self, vehicle_id: str, ids: list[str], documents: list[str]):
+        """車両の索引を作り直す（既存の索引には足さずに置き換える）。"""
+        with self._lock:
+            self._store(vehicle_id, _VehiclePostings.build(ids, documents))
+
+    def ensure(self, vehicle_id: str, loader: Callable[[], tuple[list[str], list[str]]]) -> bool:
+        """索引がなければ loader() の (チャンクID, 本文) から構築する。構築したら True。
+
+        確認から構築までロックを保持するので、並行する検索が同じ索引を重ねて作ることはない。
+        """
+        with self._lock:
+            if self._get(vehicle_id) is not None:
+                return False
+            ids, documents = loader()
+            if not ids:
+                return False
+            self._store(vehicle_id, _VehiclePostings.build(ids, documents))
+            return True
+
+    def _store(self, vehicle_id: str, postings: _VehiclePostings):
+        self._vehicles[vehicle_id] = postings
+        postings.save(self._path(vehicle_id))
+
+    def dump(self, vehicle_id: str, rename: Callable[[str], str] | None = None) -> bytes | None:
+        """車両の索引をバイト列で返す（インデックスバンドル用）。rename でチャンクIDを付け替える。"""
+        postings = self._get(vehicle_id)
+        if postings is None:
+            return None
+        if rename is not None:
+            postings = postings.renamed(rename)
+        buffer = io.BytesIO()
+        postings.write(buffer)
+        return buffer.getvalue()
+
+    def restore(self, vehicle_id: str, data: bytes, rename: Callable[[str], str] | None = None):
+        """dump() の中身で車両の索引を置き換える。"""
+        postings = _VehiclePostings.load(io.BytesIO(data))
+        if rename is not None:
+            postings = postings.renamed(rename)
+        with self._lock:
+            self._store(vehicle_id, postings)
+
+    def delete_vehicle(self, vehicle_id: str):
+        with self._lock:
+            self._vehicles.pop(vehicle_id, None)
+            path = self._path(vehicle_id)
+            if os.path.exists(path):
+                os.remove(path)
+
+    def search(self, query: str, vehicle_id: str, n_results: int = 5) -> list[tuple[str, float]]:
+        """(チャンクID, BM25スコア) をスコア降順で返す。語が1つも一致しなければ空。"""
+        postings = self._get(vehicle_id)
+        terms = set(tokenize(query))
+        if postings is None or not terms or not postings.ids:
+            return []
+
+        scores = postings.score(terms)
+        candidates = np.flatnonzero(scores > 0)
+        if len(candidates) > n_results:
+            candidates = candidates[np.argpartition(-scores[candidates], n_results - 1)[:n_results]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(postings.ids[row], float(scores[row])) for row in candidates]
@@ -1,21 +1,125 @@
 import asyncio
+import copy
 import json
 import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import numpy as np
 
 from app.config import settings
+from app.rag.batch_planner import estimate_token_length
+from app.rag.embedding_store import EmbeddingStore
+from app.rag.micro_batcher import MicroBatcher
 
 logger = logging.getLogger(__name__)
 
 BEDROCK_EMBED_MODEL = "amazon.titan-embed-text-v2:0"
 BEDROCK_EMBED_REGION = "us-east-1"
 BEDROCK_EMBED_DIMENSIONS = 1024
+_THROTTLING_ERROR_CODES = frozenset({"ThrottlingException", "TooManyRequestsException"})
+
+# 進捗コールバック: (完了件数, 全件数)
+ProgressCallback = Callable[[int, int], None]
+
+
+def _as_matrix(vectors) -> np.ndarray:
+    """float32 の C連続配列にする。既にそうなら変換もコピーもしない。"""
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def _is_throttling_error(error: Exception) -> bool:
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code") in _THROTTLING_ERROR_CODES
+
+
+class EmbeddingCache:
+    """スレッドセーフな LRU + TTL キャッシュ。
+
+    キーは (backend, model, prefix, text)。同一ターン内の再検索や
+    CRAGの再クエリで同じ文字列を何度もembeddingするのを防ぐ。
+    """
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[tuple, tuple[float, np.ndarray]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> np.ndarray | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: tuple, value: np.ndarray):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+            }
 
 
 class LocalEmbedder:
-    """intfloat/multilingual-e5-large-instruct によるローカルembedding"""
+    """intfloat/multilingual-e5-large-instruct によるローカルembedding
+
+    推論は MicroBatcher のワーカースレッドで実行し、並行リクエストを
+    1回のforward passにまとめる。
+    """
+
+    name = "local"
+
+    @property
+    def model_name(self) -> str:
+        return settings.local_embedding_model
 
     def __init__(self):
         self._model = None
+        # バッチ計画用のトークン長はワーカーと別のトークナイザーで数える
+        # （HFのfastトークナイザーは並行利用すると "Already borrowed" になる）
+        self._length_tokenizer = None
+        self._length_lock = threading.Lock()
+        self._batcher: MicroBatcher[str] = MicroBatcher(
+            self._encode,
+            max_batch_size=settings.embedding_batch_max_size,
+            max_wait_ms=settings.embedding_batch_max_wait_ms,
+            name="local-embedder",
+        )
 
     def _load_model(self):
         if self._model is None:
@@ -26,47 +130,267 @@ class LocalEmbedder:
             logger.info("Local embedding model loaded")
         return self._model
 
-    async def embed(self, texts: list[str]) -> list[list[float]]:
-        model = self._load_model()
-        prefixed = [f"passage: {t}" for t in texts]
-        embeddings = model.encode(prefixed, normalize_embeddings=True)
-        return [e.tolist() for e in embeddings]
+    def _encode(self, prefixed: list[str]) -> np.ndarray:
+        """ワーカースレッドから呼ばれる同期encode。
 
-    async def embed_query(self, text: str) -> list[float]:
+        呼び出し側（マイクロバッチ / ingestの長さバケット）でバッチサイズは
+        決まっているため、ここでは分割せず1回のforward passで処理する。
+        """
         model = self._load_model()
-        prefixed = f"query: {text}"
-        embedding = model.encode([prefixed], normalize_embeddings=True)
-        return embedding[0].tolist()
+        embeddings = model.encode(
+            prefixed,
+            normalize_embeddings=True,
+            batch_size=max(1, len(prefixed)),
+            convert_to_numpy=True,
+        )
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    def token_lengths(self, texts: list[str]) -> list[int]:
+        """モデルがロード済みならトークナイザーで、未ロードなら文字数で概算する。
+
+        同期処理なのでイベントループからは asyncio.to_thread 経由で呼ぶ。
+        """
+        if self._model is None:
+            return [estimate_token_length(t) for t in texts]
+        with self._length_lock:
+            if self._length_tokenizer is None:
+                self._length_tokenizer = copy.deepcopy(self._model.tokenizer)
+            encoded = self._length_tokenizer([f"passage: {t}" for t in texts], add_special_tokens=True)
+        max_length = self._model.max_seq_length
+        return [min(len(ids), max_length) for ids in encoded["input_ids"]]
+
+    async def embed(
+        self, texts: list[str], progress_callback: ProgressCallback | None = None,
+    ) -> np.ndarray:
+        embeddings = await self._batcher.submit([f"passage: {t}" for t in texts])
+        if progress_callback:
+            progress_callback(len(texts), len(texts))
+        return embeddings
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        embeddings = await self._batcher.submit([f"query: {text}"])
+        return embeddings[0]
+
+    async def embed_queries(self, texts: list[str]) -> np.ndarray:
+        return await self._batcher.submit([f"query: {t}" for t in texts])
 
-    async def embed_single(self, text: str) -> list[float]:
+    async def embed_single(self, text: str) -> np.ndarray:
+        return await self.embed_query(text)
+
+
+class LocalOnnxEmbedder(LocalEmbedder):
+    """ONNX Runtime + int8量子化した multilingual-e5-large-instruct によるローカルembedding
+
+    CPU専用ノード向け。LocalEmbedder と同じモデルをエクスポート・動的量子化した
+    ものを使うため、既存コレクションのベクトルとそのまま比較できる。
+    コサイン一致度とレイテンシ/RSSの差は tests/bench/bench_onnx_embedder.py で確認する。
+
+    モデルディレクトリには model_quantized.onnx（または model.onnx）と
+    tokenizer.json を置く（同スクリプトの export サブコマンドで生成）。
+    """
+
+    name = "local_onnx"
+    _MAX_SEQ_LENGTH = 512
+
+    @property
+    def model_name(self) -> str:
+        return f"{settings.local_embedding_model}#onnx-int8"
+
+    def __init__(self):
+        super().__init__()
+        self._tokenizer = None
+        self._input_names: set[str] = set()
+
+    def _load_model(self):
+        if self._model is None:
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+
+            model_dir = settings.local_onnx_model_dir
+            model_path = os.path.join(model_dir, "model_quantized.onnx")
+            if not os.path.exists(model_path):
+                model_path = os.path.join(model_dir, "model.onnx")
+            logger.info(f"Loading ONNX embedding model: {model_path}")
+
+            options = ort.SessionOptions()
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            if settings.local_onnx_num_threads > 0:
+                options.intra_op_num_threads = settings.local_onnx_num_threads
+
+            tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+            tokenizer.enable_truncation(max_length=self._MAX_SEQ_LENGTH)
+            pad_id = tokenizer.token_to_id("<pad>")
+            tokenizer.enable_padding(pad_id=pad_id if pad_id is not None else 1, pad_token="<pad>")
+            self._tokenizer = tokenizer
+
+            self._model = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+            self._input_names = {i.name for i in self._model.get_inputs()}
+            logger.info("ONNX embedding model loaded")
+        return self._model
+
+    def token_lengths(self, texts: list[str]) -> list[int]:
+        if self._tokenizer is None:
+            return [estimate_token_length(t) for t in texts]
+        with self._length_lock:
+            if self._length_tokenizer is None:
+                self._length_tokenizer = copy.deepcopy(self._tokenizer)
+            encoded = self._length_tokenizer.encode_batch([f"passage: {t}" for t in texts])
+        # パディング有効のトークナイザーなので attention_mask で実長を数える
+        return [sum(e.attention_mask) for e in encoded]
+
+    def _encode(self, prefixed: list[str]) -> np.ndarray:
+        """ワーカースレッドから呼ばれる同期encode（mean pooling + L2正規化）。"""
+        session = self._load_model()
+        encodings = self._tokenizer.encode_batch(prefixed)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        last_hidden = session.run(None, feeds)[0]
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (last_hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return np.ascontiguousarray(pooled, dtype=np.float32)
+
+
+class LocalServerEmbedder:
+    """共有embeddingサーバー（app/rag/embedding_server.py）のクライアント
+
+    マルチワーカー構成で、モデルを1プロセスに集約するために使う。
+    Unixドメインソケットの接続をプールして再利用する。
+    """
+
+    name = "local_server"
+
+    @property
+    def model_name(self) -> str:
+        # サーバー側のバックエンドと同じキーにし、embeddingストアを共有する
+        if settings.embedding_server_backend == "local_onnx":
+            return f"{settings.local_embedding_model}#onnx-int8"
+        return settings.local_embedding_model
+
+    def __init__(self, socket_path: str | None = None):
+        self.socket_path = socket_path or settings.embedding_server_socket
+        self._idle: list[tuple[asyncio.StreamReader, asyncio.StreamWriter]] = []
+
+    async def _acquire(self) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+        if self._idle:
+            return self._idle.pop()
+        return await asyncio.open_unix_connection(self.socket_path)
+
+    def _release(self, conn: tuple[asyncio.StreamReader, asyncio.StreamWriter]):
+        if len(self._idle) < settings.embedding_server_pool_size:
+            self._idle.append(conn)
+        else:
+            conn[1].close()
+
+    async def _roundtrip(self, conn, payload: bytes) -> np.ndarray:
+        from app.rag.embedding_server import read_frame, write_frame
+
+        reader, writer = conn
+        write_frame(writer, payload)
+        await writer.drain()
+        header = json.loads(await read_frame(reader))
+        if not header.get("ok"):
+            raise RuntimeError(f"Embedding server error: {header.get('error')}")
+        body = await read_frame(reader)
+        return np.frombuffer(body, dtype=np.float32).reshape(header["n"], header["dim"])
+
+    async def _request(self, prefix: str, texts: list[str]) -> np.ndarray:
+        payload = json.dumps({"prefix": prefix, "texts": texts}, ensure_ascii=False).encode("utf-8")
+        # プール済み接続がサーバー再起動で切れている場合に備え、1回だけ新規接続で再試行
+        for attempt in range(2):
+            conn = await self._acquire()
+            try:
+                result = await asyncio.wait_for(
+                    self._roundtrip(conn, payload),
+                    timeout=settings.embedding_server_timeout_seconds,
+                )
+            except (ConnectionError, asyncio.IncompleteReadError) as e:
+                conn[1].close()
+                if attempt == 1:
+                    raise
+                logger.info("Embedding server connection lost (%s), reconnecting", e)
+                self._idle.clear()
+            except BaseException:
+                conn[1].close()
+                raise
+            else:
+                self._release(conn)
+                return result
+        raise RuntimeError("unreachable")
+
+    async def embed(
+        self, texts: list[str], progress_callback: ProgressCallback | None = None,
+    ) -> np.ndarray:
+        embeddings = await self._request("passage", texts)
+        if progress_callback:
+            progress_callback(len(texts), len(texts))
+        return embeddings
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        embeddings = await self._request("query", [text])
+        return embeddings[0]
+
+    async def embed_queries(self, texts: list[str]) -> np.ndarray:
+        return await self._request("query", texts)
+
+    async def embed_single(self, text: str) -> np.ndarray:
         return await self.embed_query(text)
 
 
 class OpenAIEmbedder:
     """OpenAI APIによるembedding"""
 
-    async def embed(self, texts: list[str]) -> list[list[float]]:
+    name = "openai"
+
+    @property
+    def model_name(self) -> str:
+        return settings.openai_embedding_model
+
+    async def embed(
+        self, texts: list[str], progress_callback: ProgressCallback | None = None,
+    ) -> np.ndarray:
         from app.llm.registry import provider_registry
 
         provider = provider_registry.get_embedding_provider()
         if not provider or not provider.is_configured():
             raise RuntimeError("Embedding provider (OpenAI) is not configured")
         response = await provider.embed(texts)
-        return response.embeddings
+        if progress_callback:
+            progress_callback(len(texts), len(texts))
+        # APIはJSONのfloat配列を返すため、ここで1回だけ行列に変換する
+        return np.asarray(response.embeddings, dtype=np.float32)
 
-    async def embed_query(self, text: str) -> list[float]:
+    async def embed_query(self, text: str) -> np.ndarray:
         result = await self.embed([text])
         return result[0]
 
-    async def embed_single(self, text: str) -> list[float]:
+    async def embed_queries(self, texts: list[str]) -> np.ndarray:
+        return await self.embed(texts)
+
+    async def embed_single(self, text: str) -> np.ndarray:
         return await self.embed_query(text)
 
 
 class BedrockEmbedder:
     """AWS Bedrock Titan Embeddings V2 によるembedding"""
 
+    name = "bedrock"
+    model_name = BEDROCK_EMBED_MODEL
+
+    # ThrottlingException時の指数バックオフ（秒）
+    _BACKOFF_BASE_SECONDS = 0.5
+    _BACKOFF_MAX_SECONDS = 20.0
+
     def __init__(self):
         self._client = None
+        # AIMD: スロットリングで同時実行数を半減し、成功が続けば1ずつ戻す
+        self._max_concurrency = max(1, settings.bedrock_embed_max_concurrency)
+        self._concurrency = self._max_concurrency
+        self._success_streak = 0
 
     def _get_client(self):
         if self._client is None:
@@ -77,7 +401,7 @@ class BedrockEmbedder:
             )
         return self._client
 
-    def _invoke(self, text: str, input_type: str = "search_document") -> list[float]:
+    def _invoke(self, text: str, input_type: str = "search_document") -> np.ndarray:
         """Bedrock Titan Embeddings V2 を同期呼び出しで1テキストembedding。"""
         client = self._get_client()
         body = json.dumps({
@@ -92,40 +416,119 @@ class BedrockEmbedder:
             accept="application/json",
         )
         result = json.loads(response["body"].read())
-        return result["embedding"]
-
-    async def embed(self, texts: list[str]) -> list[list[float]]:
-        loop = asyncio.get_event_loop()
-        # バッチ処理: Titan V2はバッチAPIがないので1件ずつ
-        embeddings = []
-        for text in texts:
-            embedding = await loop.run_in_executor(
-                None, self._invoke, text, "search_document"
-            )
-            embeddings.append(embedding)
-        return embeddings
+        return np.asarray(result["embedding"], dtype=np.float32)
+
+    def _on_success(self):
+        self._success_streak += 1
+        if self._concurrency < self._max_concurrency and self._success_streak >= self._concurrency:
+            self._concurrency += 1
+            self._success_streak = 0
+
+    def _on_throttle(self):
+        self._success_streak = 0
+        self._concurrency = max(1, self._concurrency // 2)
+
+    async def _invoke_with_retry(self, text: str, input_type: str) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        max_retries = settings.bedrock_embed_max_retries
+        for attempt in range(max_retries + 1):
+            try:
+                embedding = await loop.run_in_executor(None, self._invoke, text, input_type)
+            except Exception as e:
+                if not _is_throttling_error(e) or attempt == max_retries:
+                    raise
+                self._on_throttle()
+                delay = min(self._BACKOFF_MAX_SECONDS, self._BACKOFF_BASE_SECONDS * 2**attempt)
+                logger.info(
+                    "Bedrock embedding throttled (attempt %d, concurrency→%d), retrying in %.1fs",
+                    attempt + 1, self._concurrency, delay,
+                )
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            else:
+                self._on_success()
+                return embedding
+        raise RuntimeError("unreachable")
+
+    async def embed(
+        self, texts: list[str], progress_callback: ProgressCallback | None = None,
+    ) -> np.ndarray:
+        return await self._embed_many(texts, "search_document", progress_callback)
+
+    async def _embed_many(
+        self, texts: list[str], input_type: str, progress_callback: ProgressCallback | None = None,
+    ) -> np.ndarray:
+        """Titan V2はバッチAPIがないため、同時実行数を制限して並列に1件ずつ呼び出す。
+
+        結果は入力順を保持する。スロットリング中は同時実行数を自動で絞る。
+        """
+        if not texts:
+            return np.empty((0, BEDROCK_EMBED_DIMENSIONS), dtype=np.float32)
+        results: list[np.ndarray | None] = [None] * len(texts)
+        pending = iter(range(len(texts)))
+        done = 0
+
+        async def worker(worker_id: int):
+            nonlocal done
+            for idx in pending:
+                # 縮退中は上限を超えるワーカーを待機させる
+                while worker_id >= self._concurrency:
+                    await asyncio.sleep(self._BACKOFF_BASE_SECONDS)
+                results[idx] = await self._invoke_with_retry(texts[idx], input_type)
+                done += 1
+                if progress_callback:
+                    progress_callback(done, len(texts))
+
+        n_workers = min(self._max_concurrency, len(texts))
+        tasks = [asyncio.create_task(worker(i)) for i in range(n_workers)]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # 1件でも失敗したら残りのワーカーを止める（未送信のテキストは呼び出さない）
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return np.asarray(results, dtype=np.float32)
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        return await self._invoke_with_retry(text, "search_query")
+
+    async def embed_queries(self, texts: list[str]) -> np.ndarray:
+        return await self._embed_many(texts, "search_query")
+
+    async def embed_single(self, text: str) -> np.ndarray:
+        return await self.embed_query(text)
 
-    async def embed_query(self, text: str) -> list[float]:
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(
-            None, self._invoke, text, "search_query"
-        )
 
-    async def embed_single(self, text: str) -> list[float]:
-        return await self.embed_query(text)
+EmbeddingBackend = LocalEmbedder | LocalOnnxEmbedder | LocalServerEmbedder | OpenAIEmbedder | BedrockEmbedder
 
 
 class Embedder:
-    """設定に応じてローカル/OpenAI/Bedrockを切り替えるファサード"""
+    """設定に応じてローカル/ローカルONNX/共有サーバー/OpenAI/Bedrockを切り替えるファサード"""
 
     def __init__(self):
-        self._backend: LocalEmbedder | OpenAIEmbedder | BedrockEmbedder | None = None
+        self._backend: EmbeddingBackend | None = None
+        self._query_cache = EmbeddingCache(
+            max_size=settings.embedding_cache_size,
+            ttl_seconds=settings.embedding_cache_ttl_seconds,
+        )
+        self._passage_store: EmbeddingStore | None = (
+            EmbeddingStore(settings.embedding_store_dir, dtype=settings.embedding_store_dtype)
+            if settings.embedding_store_dir
+            else None
+        )
 
-    def _get_backend(self) -> LocalEmbedder | OpenAIEmbedder | BedrockEmbedder:
+    def _get_backend(self) -> EmbeddingBackend:
         if self._backend is None:
             if settings.embedding_provider == "local":
                 logger.info("Using local embedding (multilingual-e5-large-instruct)")
                 self._backend = LocalEmbedder()
+            elif settings.embedding_provider == "local_onnx":
+                logger.info("Using local ONNX embedding (multilingual-e5-large-instruct, int8)")
+                self._backend = LocalOnnxEmbedder()
+            elif settings.embedding_provider == "local_server":
+                logger.info(f"Using shared embedding server at {settings.embedding_server_socket}")
+                self._backend = LocalServerEmbedder()
             elif settings.embedding_provider == "bedrock":
                 logger.info("Using Bedrock Titan Embeddings V2")
                 self._backend = BedrockEmbedder()
@@ -134,14 +537,95 @@ class Embedder:
                 self._backend = OpenAIEmbedder()
         return self._backend
 
-    async def embed(self, texts: list[str]) -> list[list[float]]:
-        return await self._get_backend().embed(texts)
+    @property
+    def model_name(self) -> str:
+        return self._get_backend().model_name
+
+    async def embed(
+        self, texts: list[str], progress_callback: ProgressCallback | None = None,
+    ) -> np.ndarray:
+        """チャンク（passage）のembeddingを (len(texts), dim) の float32 行列で返す。
+
+        永続ストアにあるテキストは再計算しない。
+        """
+        backend = self._get_backend()
+        if self._passage_store is None:
+            return _as_matrix(await backend.embed(texts, progress_callback=progress_callback))
+
+        stored = self._passage_store.get_many(backend.model_name, "passage", texts)
+        missing = list(dict.fromkeys(t for t, v in zip(texts, stored) if v is None))
+        reused = len(texts) - len(missing)
+        computed: dict[str, np.ndarray] = {}
+        if missing:
+            backend_progress = None
+            if progress_callback:
+                def backend_progress(done: int, total: int):
+                    progress_callback(min(len(texts), reused + done), len(texts))
+            vectors = _as_matrix(await backend.embed(missing, progress_callback=backend_progress))
+            self._passage_store.put_many(backend.model_name, "passage", missing, vectors)
+            if len(missing) == len(texts):
+                # 全件新規（重複なし）ならそのまま返せる
+                if progress_callback:
+                    progress_callback(len(texts), len(texts))
+                return vectors
+            computed = dict(zip(missing, vectors))
+
+        if progress_callback:
+            progress_callback(len(texts), len(texts))
+        logger.info(
+            "Passage embeddings: %d reused from store, %d computed",
+            reused, len(missing),
+        )
+        return np.stack([v if v is not None else computed[t] for t, v in zip(texts, stored)])
+
+    async def embed_query(self, text: str) -> np.ndarray:
+        """クエリのembeddingを (dim,) の float32 ベクトルで返す（キャッシュ共有のため読み取り専用）。"""
+        backend = self._get_backend()
+        key = (backend.name, backend.model_name, "query", text)
+        cached = self._query_cache.get(key)
+        if cached is not None:
+            return cached
+        embedding = _as_matrix(await backend.embed_query(text))
+        embedding.setflags(write=False)
+        self._query_cache.put(key, embedding)
+        return embedding
+
+    async def embed_queries(self, texts: list[str]) -> np.ndarray:
+        """複数クエリを (n, dim) 行列で返す。キャッシュにないものだけを1バッチでembeddingする。"""
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        backend = self._get_backend()
+        found: dict[str, np.ndarray] = {}
+        for text in texts:
+            cached = self._query_cache.get((backend.name, backend.model_name, "query", text))
+            if cached is not None:
+                found[text] = cached
+
+        missing = list(dict.fromkeys(t for t in texts if t not in found))
+        if missing:
+            vectors = _as_matrix(await backend.embed_queries(missing))
+            vectors.setflags(write=False)
+            for text, vector in zip(missing, vectors):
+                self._query_cache.put((backend.name, backend.model_name, "query", text), vector)
+                found[text] = vector
+        return np.stack([found[t] for t in texts])
+
+    async def embed_single(self, text: str) -> np.ndarray:
+        return await self.embed_query(text)
+
+    def token_lengths(self, texts: list[str]) -> list[int]:
+        """バッチ計画用のトークン長。ローカルモデルはトークナイザーで数える。"""
+        backend = self._get_backend()
+        if isinstance(backend, LocalEmbedder):
+            return backend.token_lengths(texts)
+        return [estimate_token_length(t) for t in texts]
 
-    async def embed_query(self, text: str) -> list[float]:
-        return await self._get_backend().embed_query(text)
+    async def warm_up(self):
+        """モデルのロードとダミーencodeを行い、初回リクエストの遅延をなくす。"""
+        await self._get_backend().embed_query("ウォームアップ")
 
-    async def embed_single(self, text: str) -> list[float]:
-        return await self._get_backend().embed_single(text)
+    def cache_stats(self) -> dict:
+        return self._query_cache.stats()
 
 
 embedder = Embedder()
@@ -0,0 +1,129 @@
+"""共有embeddingサーバー（マルチワーカー構成向け）
+
+uvicornを複数ワーカーで動かすと、各ワーカーが e5-large を個別にロードし
+N × 2GB のRSSとN回のコールドスタートが発生する。このモジュールは
+モデルを1つだけ保持するプロセスを立て、Unixドメインソケット経由で
+バッチembeddingを提供する。全APIワーカーは embedding_provider="local_server"
+（LocalServerEmbedder）で接続し、1つのモデルと1つのマイクロバッチキューを共有する。
+
+プロトコル（1接続で複数リクエスト可）:
+    フレーム = 4バイトのビッグエンディアン長 + ペイロード
+    リクエスト: JSONフレーム {"prefix": "query" | "passage", "texts": [...]}
+    レスポンス: JSONフレーム {"ok": true, "n": N, "dim": D} + float32行列の生バイトフレーム
+              失敗時は JSONフレーム {"ok": false, "error": "..."} のみ
+
+起動:
+  cd backend
+  python -m app.rag.embedding_server
+"""
+
+import asyncio
+import json
+import logging
+import os
+import struct
+
+import numpy as np
+
+from app.config import settings
+from app.rag.embedder import LocalEmbedder, LocalOnnxEmbedder
+
+logger = logging.getLogger(__name__)
+
+_FRAME_HEADER = struct.Struct(">I")
+_MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+
+async def read_frame(reader: asyncio.StreamReader) -> bytes:
+    header = await reader.readexactly(_FRAME_HEADER.size)
+    (length,) = _FRAME_HEADER.unpack(header)
+    if length > _MAX_FRAME_BYTES:
+        raise ValueError(f"Frame too large: {length} bytes")
+    return await reader.readexactly(length)
+
+
+def write_frame(writer: asyncio.StreamWriter, payload: bytes):
+    writer.write(_FRAME_HEADER.pack(len(payload)) + payload)
+
+
+def create_server_backend() -> LocalEmbedder:
+    if settings.embedding_server_backend == "local_onnx":
+        return LocalOnnxEmbedder()
+    return LocalEmbedder()
+
+
+class EmbeddingServer:
+    def __init__(self, socket_path: str, backend: LocalEmbedder):
+        self.socket_path = socket_path
+        self.backend = backend
+        self._server: asyncio.AbstractServer | None = None
+        self._connections: set[asyncio.StreamWriter] = set()
+
+    async def _embed(self, prefix: str, texts: list[str]) -> np.ndarray:
+        if prefix == "query":
+            return await self.backend.embed_queries(texts)
+        if prefix == "passage":
+            return await self.backend.embed(texts)
+        raise ValueError(f"Unknown prefix: {prefix}")
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections.add(writer)
+        try:
+            while True:
+                try:
+                    request = json.loads(await read_frame(reader))
+                except asyncio.IncompleteReadError:
+                    break  # クライアント切断
+
+                try:
+                    vectors = await self._embed(request.get("prefix", ""), request.get("texts", []))
+                except Exception as e:
+                    logger.warning("Embedding server request failed: %s", e)
+                    write_frame(writer, json.dumps({"ok": False, "error": str(e)}).encode("utf-8"))
+                else:
+                    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+                    dim = matrix.shape[1] if matrix.ndim == 2 else 0
+                    header = {"ok": True, "n": matrix.shape[0], "dim": dim}
+                    write_frame(writer, json.dumps(header).encode("utf-8"))
+                    write_frame(writer, matrix.tobytes())
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def start(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # 前回の異常終了で残ったソケット
+        self._server = await asyncio.start_unix_server(self._handle, path=self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        logger.info("Embedding server listening on %s (%s)", self.socket_path, self.backend.model_name)
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._connections):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()  # type: ignore[union-attr]
+        finally:
+            await self.stop()
+
+
+async def _main():
+    backend = create_server_backend()
+    await backend.embed_query("ウォームアップ")  # 接続受付前にモデルをロード
+    await EmbeddingServer(settings.embedding_server_socket, backend).serve_forever()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s: %(message)s")
+    asyncio.run(_main())
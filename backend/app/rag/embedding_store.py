@@ -0,0 +1,217 @@
+"""content-addressedな永続embeddingストア
+
+hash(model, prefix, text) をキーに、チャンクのembeddingをディスクに保存する。
+マニュアルの再アップロードや再チャンキング時に、テキストが変わっていない
+チャンクは保存済みベクトルを再利用し、変更分だけをembeddingする。
+
+ディスク構成（モデルごとにサブディレクトリ）:
+    <root>/<model>/vectors.bin  行優先の float32/float16 行列（追記のみ）
+    <root>/<model>/keys.txt     1行1キー。行番号 = vectors.bin の行オフセット
+    <root>/<model>/meta.json    {"dim": 1024, "dtype": "float32"}
+    <root>/<model>/.lock        追記時のファイルロック（複数ワーカープロセスで共有できる）
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
+
+
+def content_key(model: str, prefix: str, text: str) -> str:
+    """(model, prefix, text) から content-addressed キーを生成する。"""
+    payload = f"{model}\x00{prefix}\x00{text}".encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()
+
+
+class _ModelShard:
+    """1モデル分のベクトル行列とオフセット索引。
+
+    複数のワーカープロセスが同じストアに書き込むため、追記は <model>/.lock の
+    ファイルロック下で行う。ロック内で他プロセスが追記したキーを取り込み、
+    キーのない末尾の行（追記途中で落ちた残り）を切り詰めてから追記するので、
+    キーの行番号は常に vectors.bin の行と一致する。
+    """
+
+    def __init__(self, directory: str, dtype: str):
+        self.directory = directory
+        self.dtype = np.dtype(dtype)
+        self.dim: int | None = None
+        self._offsets: dict[str, int] = {}
+        self._n_rows = 0  # keys.txt から読み込んだ行数
+        self._keys_bytes = 0  # keys.txt の読み込み済みバイト数
+        self._matrix: np.memmap | None = None
+        if os.path.exists(self._meta_path):
+            with self._file_lock():
+                self._repair()
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.directory, "vectors.bin")
+
+    @property
+    def _keys_path(self) -> str:
+        return os.path.join(self.directory, "keys.txt")
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_meta(self):
+        if self.dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            self.dim = int(meta["dim"])
+            self.dtype = np.dtype(meta["dtype"])
+
+    def _catch_up(self):
+        """keys.txt の未読分（他プロセスの追記を含む）を索引に取り込む。
+
+        キーはベクトルの後に追記されるため、読めたキーの行は必ず存在する。
+        書き込み途中の最終行（改行なし）は次回に回す。
+        """
+        self._load_meta()
+        if self.dim is None or not os.path.exists(self._keys_path):
+            return
+        with open(self._keys_path, "rb") as f:
+            f.seek(self._keys_bytes)
+            data = f.read()
+        complete = data[: data.rfind(b"\n") + 1]
+        if not complete:
+            return
+        for key in complete.decode("utf-8").splitlines():
+            self._offsets[key] = self._n_rows
+            self._n_rows += 1
+        self._keys_bytes += len(complete)
+
+    def _repair(self):
+        """（ファイルロック下で）キーのない末尾の行・改行のないキー行を切り詰める。"""
+        self._catch_up()
+        if self.dim is None:
+            return
+        row_bytes = self.dim * self.dtype.itemsize
+        if os.path.exists(self._keys_path) and os.path.getsize(self._keys_path) > self._keys_bytes:
+            os.truncate(self._keys_path, self._keys_bytes)
+        n_rows = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+        if n_rows < self._n_rows:
+            # vectors.bin が外部要因で短くなった場合は、行のないキーを捨てる
+            logger.warning("Dropping %d keys without vectors in %s", self._n_rows - n_rows, self._keys_path)
+            with open(self._keys_path, "rb") as f:
+                lines = f.read().splitlines(keepends=True)[:n_rows]
+            with open(self._keys_path, "wb") as f:
+                f.writelines(lines)
+            self._offsets = {k: row for k, row in self._offsets.items() if row < n_rows}
+            self._n_rows = n_rows
+            self._keys_bytes = sum(len(line) for line in lines)
+        if os.path.exists(self._vectors_path) and os.path.getsize(self._vectors_path) != self._n_rows * row_bytes:
+            logger.warning("Truncating %d orphan rows in %s", n_rows - self._n_rows, self._vectors_path)
+            os.truncate(self._vectors_path, self._n_rows * row_bytes)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def _get_matrix(self) -> np.memmap | None:
+        if self.dim is None or not self._n_rows:
+            return None
+        if self._matrix is None or self._matrix.shape[0] < self._n_rows:
+            self._matrix = np.memmap(self._vectors_path, dtype=self.dtype, mode="r", shape=(self._n_rows, self.dim))
+        return self._matrix
+
+    def get(self, keys: list[str]) -> list[np.ndarray | None]:
+        if any(key not in self._offsets for key in keys):
+            self._catch_up()  # 他プロセスが保存した分
+        matrix = self._get_matrix()
+        if matrix is None:
+            return [None] * len(keys)
+        rows = [self._offsets.get(key) for key in keys]
+        found = [r for r in rows if r is not None]
+        if not found:
+            return [None] * len(keys)
+        # memmapから必要な行だけをまとめて読み出す（float32にコピー）
+        gathered = iter(np.asarray(matrix[found], dtype=np.float32))
+        return [None if r is None else next(gathered) for r in rows]
+
+    def put(self, keys: list[str], vectors: np.ndarray):
+        if all(k in self._offsets for k in keys):
+            return
+        matrix = np.asarray(vectors, dtype=self.dtype)
+        with self._file_lock():
+            self._repair()
+            new_rows = {k: i for i, k in enumerate(keys) if k not in self._offsets}
+            if not new_rows:
+                return
+            new = list(new_rows)
+            matrix = matrix[list(new_rows.values())]
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                with open(self._meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim mismatch: store={self.dim}, got={matrix.shape[1]}")
+
+            # 行番号は追記前のファイルサイズから決める（_repair 後は索引の行数と一致する）
+            row_bytes = self.dim * self.dtype.itemsize
+            start = os.path.getsize(self._vectors_path) // row_bytes if os.path.exists(self._vectors_path) else 0
+            # ベクトルを先に書き、キーは後から追記する（キーがあれば行は必ず存在する）
+            with open(self._vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            payload = "".join(f"{k}\n" for k in new).encode("utf-8")
+            with open(self._keys_path, "ab") as f:
+                f.write(payload)
+
+            for i, key in enumerate(new):
+                self._offsets[key] = start + i
+            self._n_rows = start + len(new)
+            self._keys_bytes += len(payload)
+        self._matrix = None
+
+
+class EmbeddingStore:
+    """ディスク永続のcontent-addressed embeddingストア"""
+
+    def __init__(self, root_dir: str, dtype: str = "float32"):
+        self.root_dir = root_dir
+        self.dtype = dtype
+        self._shards: dict[str, _ModelShard] = {}
+        self._lock = threading.Lock()
+
+    def _get_shard(self, model: str) -> _ModelShard:
+        shard = self._shards.get(model)
+        if shard is None:
+            directory = os.path.join(self.root_dir, _UNSAFE_CHARS.sub("_", model))
+            shard = _ModelShard(directory, self.dtype)
+            self._shards[model] = shard
+        return shard
+
+    def get_many(self, model: str, prefix: str, texts: list[str]) -> list[np.ndarray | None]:
+        keys = [content_key(model, prefix, t) for t in texts]
+        with self._lock:
+            return self._get_shard(model).get(keys)
+
+    def put_many(self, model: str, prefix: str, texts: list[str], vectors: np.ndarray):
+        keys = [content_key(model, prefix, t) for t in texts]
+        with self._lock:
+            self._get_shard(model).put(keys, vectors)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {model: len(shard) for model, shard in self._shards.items()}
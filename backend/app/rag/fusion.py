@@ -0,0 +1,74 @@
+"""Reciprocal Rank Fusion (RRF) による検索結果の統合
+
+複数のランキング（ベクトル検索・BM25・追加クエリなど）をチャンクIDで突き合わせ、
+順位とスコアを NumPy 配列で集計する。dict のコピーは最終的に返す上位 top_n 件だけ。
+"""
+
+import numpy as np
+
+# Phase 3-2: content_type ブースト
+# troubleshooting/procedure: ×1.3（診断手順を優先）
+# specification: ×1.15（ヒューズ表等の仕様情報も軽くブースト）
+CONTENT_TYPE_BOOSTS: dict[str, float] = {
+    "troubleshooting": 1.3,
+    "procedure": 1.3,
+    "specification": 1.15,
+}
+
+
+def _doc_key(doc: dict) -> str:
+    # チャンクIDで同一文書を判定する（IDのない結果は本文の先頭100文字で代用）
+    return doc.get("id") or doc["content"][:100]
+
+
+def reciprocal_rank_fusion(
+    ranked_lists: list[list[dict]],
+    weights: list[float] | None = None,
+    k: int = 60,
+    top_n: int | None = None,
+    boosts: dict[str, float] | None = None,
+) -> list[dict]:
+    """RRFで任意個のランキングを統合し、スコア降順で返す。
+
+    スコア = k × Σ weight_i / (k + rank_i) × content_type ブースト
+    （×k で、1つのリストで1位の文書が 1.0 になる）。同点はリストに先に現れた順。
+    返す dict は入力のコピーで、score だけをRRFスコアに置き換える。
+    """
+    if weights is None:
+        weights = [1.0] * len(ranked_lists)
+    if len(weights) != len(ranked_lists):
+        raise ValueError("weights must have one entry per ranked list")
+    if boosts is None:
+        boosts = CONTENT_TYPE_BOOSTS
+
+    position: dict[str, int] = {}
+    docs: list[dict] = []
+    rows: list[np.ndarray] = []
+    contributions: list[np.ndarray] = []
+    for results, weight in zip(ranked_lists, weights):
+        if not results:
+            continue
+        row = np.empty(len(results), dtype=np.int64)
+        for rank, doc in enumerate(results):
+            key = _doc_key(doc)
+            i = position.get(key)
+            if i is None:
+                i = position[key] = len(docs)
+                docs.append(doc)
+            row[rank] = i
+        rows.append(row)
+        contributions.append(weight / (k + np.arange(len(results), dtype=np.float64)))
+
+    if not docs:
+        return []
+    scores = np.zeros(len(docs), dtype=np.float64)
+    np.add.at(scores, np.concatenate(rows), np.concatenate(contributions))
+    scores *= k
+    scores *= np.fromiter(
+        (boosts.get(doc.get("content_type", ""), 1.0) for doc in docs), dtype=np.float64, count=len(docs),
+    )
+
+    order = np.argsort(-scores, kind="stable")
+    if top_n is not None:
+        order = order[:top_n]
+    return [{**docs[i], "score": float(scores[i])} for i in order]
@@ -0,0 +1,151 @@
+"""車両ID → インデックス上の物理キー（版）のエイリアス
+
+再ingestは現行版を書き換えず、新しい物理キー（"{vehicle_id}__v{版番号}"）に新しい版を
+構築し、検証が済んでからエイリアスを切り替える。切り替えまでの検索は現行版を返し、
+構築に失敗しても現行版はそのまま残る。古い版は切り替え後に削除する。
+
+エイリアスは {index_dir}/{collection}_aliases.json に保存する（一時ファイル経由で置き換えるので
+切り替えはアトミック）。同じインデックスディレクトリを複数ワーカーで共有するため、
+参照時はファイルの inode / mtime / サイズが変わっていれば読み直し、更新（版番号の払い出し・
+切り替え・削除）は {path}.lock のファイルロック下で最新を読み直してから行う。
+エイリアスのない車両は、版管理導入前のデータとして車両IDそのものを物理キーとして扱う。
+"""
+
+import fcntl
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+_VERSIONED_KEY = re.compile(r"^(?P<vehicle_id>.+)__v(?P<version>\d+)$")
+
+
+def split_physical_key(physical: str) -> tuple[str, int]:
+    """物理キー → (車両ID, 版番号)。版管理導入前のキーは版番号0。"""
+    match = _VERSIONED_KEY.match(physical)
+    if match is None:
+        return physical, 0
+    return match["vehicle_id"], int(match["version"])
+
+
+class IndexAliases:
+    def __init__(self, path: str | None = None):
+        self.path = path
+        # {車両ID: {"physical": 物理キー, "reserved": 払い出し済みの最大版番号, ...}}
+        self._entries: dict[str, dict] = {}
+        self._stamp: tuple[int, int, int] | None = None
+        self._lock = threading.RLock()
+        self._refresh()
+
+    def _refresh(self):
+        """ファイルが他のワーカーに置き換えられていれば読み直す。"""
+        if not self.path:
+            return
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            self._entries, self._stamp = {}, None
+            return
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp != self._stamp:
+            with open(self.path, encoding="utf-8") as f:
+                self._entries = json.load(f)
+            self._stamp = stamp
+
+    @contextmanager
+    def _locked(self):
+        """プロセス内外で排他し、最新のファイル内容を読み込んだ状態で更新させる。"""
+        with self._lock:
+            if not self.path:
+                yield
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _resolve(self, vehicle_id: str) -> str:
+        entry = self._entries.get(vehicle_id)
+        return entry["physical"] if entry else vehicle_id
+
+    def resolve(self, vehicle_id: str) -> str:
+        """検索に使う物理キー"""
+        with self._lock:
+            self._refresh()
+            return self._resolve(vehicle_id)
+
+    def entry(self, vehicle_id: str) -> dict | None:
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(vehicle_id)
+            return dict(entry) if entry else None
+
+    def entries(self) -> dict[str, dict]:
+        with self._lock:
+            self._refresh()
+            return {vehicle_id: dict(entry) for vehicle_id, entry in self._entries.items()}
+
+    def reserve(self, vehicle_id: str) -> str:
+        """新しい版の物理キーを払い出す（他のワーカーと同時に構築しても重ならない）。"""
+        with self._locked():
+            entry = self._entries.setdefault(vehicle_id, {"physical": vehicle_id})
+            _, current = split_physical_key(entry["physical"])
+            version = max(current, entry.get("reserved", 0)) + 1
+            entry["reserved"] = version
+            self._save()
+            return f"{vehicle_id}__v{version}"
+
+    def is_live(self, physical: str) -> bool:
+        vehicle_id, _ = split_physical_key(physical)
+        return self.resolve(vehicle_id) == physical
+
+    def is_obsolete(self, physical: str) -> bool:
+        """現行版より古い版か（現行版より新しい版は他のワーカーが構築中かもしれないので False）"""
+        vehicle_id, version = split_physical_key(physical)
+        live = self.resolve(vehicle_id)
+        return physical != live and version < split_physical_key(live)[1]
+
+    def swap(self, vehicle_id: str, physical: str, **info) -> str | None:
+        """エイリアスを physical に切り替え、不要になった物理キーを返す（削除するのは呼び出し側）。
+
+        他のワーカーがより新しい版に切り替え済みなら切り替えず、physical 自身を返す。
+        """
+        with self._locked():
+            previous = self._resolve(vehicle_id)
+            if split_physical_key(previous)[1] > split_physical_key(physical)[1]:
+                return physical
+            entry = self._entries.setdefault(vehicle_id, {})
+            reserved = entry.get("reserved", 0)
+            entry.clear()
+            entry.update({
+                "physical": physical,
+                "reserved": reserved,
+                "updated_at": datetime.now(timezone.utc).isoformat(),
+                **info,
+            })
+            self._save()
+            return previous if previous != physical else None
+
+    def remove(self, vehicle_id: str) -> str:
+        """エイリアスを削除し、削除前の物理キーを返す。"""
+        with self._locked():
+            physical = self._resolve(vehicle_id)
+            if self._entries.pop(vehicle_id, None) is not None:
+                self._save()
+            return physical
+
+    def _save(self):
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+        st = os.stat(self.path)
+        self._stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
@@ -0,0 +1,688 @@
+"""VehicleManualStore のストレージバックエンド
+
+- chroma: ChromaDBのHNSWコレクション。既定は全車両を1コレクションに格納して vehicle_id の
+          where フィルタで絞り込む（従来方式）。per_vehicle=True では車両ごとに1コレクション
+          （シャード）を持ち、フィルタなしの小さなグラフを検索する。
+- flat:   車両ごとに float32 行列とメタデータ配列を保持し、内積の厳密top-kで検索する。
+          quantization="float16"/"int8" では圧縮表現だけを常駐させて候補を絞り、
+          メモリマップした float32 原本で再スコアする（app/rag/quantization.py）
+
+1車両のマニュアルは数千チャンク程度なので、flat の総当たり内積は
+where付きHNSWより高速でレイテンシも安定する。永続化は車両ごとの .npy + JSON。
+どちらも同じ IndexHit を返すため、VehicleManualStore の検索結果の形式は変わらない。
+
+シャードは初回アクセス時（またはセッションの車両選択時の prefetch）に読み込み、
+memory_budget_bytes を超えたら最も長く使われていないものから解放する。
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from app.rag.quantization import QUANTIZATIONS, QuantizedMatrix, rescored_top_k
+
+logger = logging.getLogger(__name__)
+
+INDEX_BACKENDS = ("chroma", "flat")
+
+
+@dataclass
+class IndexHit:
+    id: str
+    document: str
+    metadata: dict = field(default_factory=dict)
+    score: float = 0.0  # コサイン類似度（ベクトル検索以外は0）
+
+
+def _merge_top(per_source: list[list[list[IndexHit]]], n_queries: int, n_results: int) -> list[list[IndexHit]]:
+    """複数シャード/車両のクエリごとのtop-kをスコアでマージする。"""
+    merged: list[list[IndexHit]] = [[] for _ in range(n_queries)]
+    for results in per_source:
+        for q, hits in enumerate(results):
+            merged[q].extend(hits)
+    if len(per_source) <= 1:
+        return merged
+    return [sorted(hits, key=lambda h: h.score, reverse=True)[:n_results] for hits in merged]
+
+
+class ChromaIndexBackend:
+    """ChromaDB を使うバックエンド（共有コレクション or 車両ごとのシャード）"""
+
+    name = "chroma"
+    add_batch_size = 50  # 1回の add に渡すチャンク数の上限
+
+    def __init__(
+        self,
+        persist_dir: str,
+        collection_name: str,
+        per_vehicle: bool = False,
+        memory_budget_bytes: int = 0,
+    ):
+        import chromadb
+
+        if memory_budget_bytes > 0:
+            # 使われていないセグメント（HNSW）をLRUでメモリから解放させる
+            from chromadb.config import Settings as ChromaSettings
+
+            self._client = chromadb.PersistentClient(
+                path=persist_dir,
+                settings=ChromaSettings(
+                    chroma_segment_cache_policy="LRU",
+                    chroma_memory_limit_bytes=memory_budget_bytes,
+                ),
+            )
+        else:
+            self._client = chromadb.PersistentClient(path=persist_dir)
+        self._collection_name = collection_name
+        self._per_vehicle = per_vehicle
+        self._shards: dict = {}
+        self._lock = threading.Lock()
+        if not per_vehicle:
+            self._collection = self._client.get_or_create_collection(
+                name=collection_name,
+                metadata={"hnsw:space": "cosine"},
+            )
+
+    def _shard_name(self, vehicle_id: str) -> str:
+        # コレクション名は3〜63文字の英数字・_・- のみ。サニタイズ後の衝突を避けるためハッシュを付ける
+        safe = re.sub(r"[^A-Za-z0-9_-]", "_", vehicle_id)[:20]
+        digest = hashlib.sha1(vehicle_id.encode("utf-8")).hexdigest()[:8]
+        return f"{self._collection_name}__{safe}_{digest}"
+
+    def _shard(self, vehicle_id: str, create: bool = False):
+        with self._lock:
+            if vehicle_id in self._shards:
+                return self._shards[vehicle_id]
+            name = self._shard_name(vehicle_id)
+            if create:
+                collection = self._client.get_or_create_collection(
+                    name=name,
+                    metadata={"hnsw:space": "cosine", "vehicle_id": vehicle_id},
+                )
+            else:
+                try:
+                    collection = self._client.get_collection(name=name)
+                except Exception:
+                    return None  # 未ingestの車両
+            self._shards[vehicle_id] = collection
+            return collection
+
+    def _all_shards(self) -> list:
+        prefix = f"{self._collection_name}__"
+        vehicle_ids = [
+            (c.metadata or {}).get("vehicle_id")
+            for c in self._client.list_collections()
+            if c.name.startswith(prefix)
+        ]
+        return [shard for v in vehicle_ids if v and (shard := self._shard(v)) is not None]
+
+    def _collections(self, vehicle_id: str | None) -> list:
+        if not self._per_vehicle:
+            return [self._collection]
+        if vehicle_id is None:
+            return self._all_shards()
+        shard = self._shard(vehicle_id)
+        return [shard] if shard is not None else []
+
+    def _where(self, vehicle_id: str | None, **conditions) -> dict | None:
+        # シャードは1車両分なので vehicle_id のフィルタは不要
+        clauses = [{"vehicle_id": vehicle_id}] if vehicle_id and not self._per_vehicle else []
+        clauses.extend({k: v} for k, v in conditions.items())
+        if not clauses:
+            return None
+        if len(clauses) == 1:
+            return clauses[0]
+        return {"$and": clauses}
+
+    def add(
+        self,
+        vehicle_id: str,
+        ids: list[str],
+        embeddings: np.ndarray,
+        documents: list[str],
+        metadatas: list[dict],
+    ):
+        collection = self._shard(vehicle_id, create=True) if self._per_vehicle else self._collection
+        collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def query(
+        self,
+        query_embeddings: np.ndarray,
+        vehicle_id: str | None = None,
+        n_results: int = 5,
+        warning_only: bool = False,
+    ) -> list[list[IndexHit]]:
+        kwargs: dict = {"query_embeddings": query_embeddings, "n_results": n_results}
+        where = self._where(vehicle_id, **({"has_warning": True} if warning_only else {}))
+        if where:
+            kwargs["where"] = where
+
+        per_source = []
+        for collection in self._collections(vehicle_id):
+            results = collection.query(**kwargs)
+            per_source.append([
+                [
+                    IndexHit(id=i, document=doc, metadata=meta, score=1 - dist)
+                    for i, doc, meta, dist in zip(ids, documents, metadatas, distances)
+                ]
+                for ids, documents, metadatas, distances in zip(
+                    results.get("ids", []),
+                    results.get("documents", []),
+                    results.get("metadatas", []),
+                    results.get("distances", []),
+                )
+            ])
+        return _merge_top(per_source, len(query_embeddings), n_results)
+
+    def find_containing(self, keyword: str, vehicle_id: str | None = None, limit: int = 5) -> list[IndexHit]:
+        hits: list[IndexHit] = []
+        for collection in self._collections(vehicle_id):
+            results = collection.get(
+                where=self._where(vehicle_id),
+                where_document={"$contains": keyword},
+                limit=limit - len(hits),
+                include=["documents", "metadatas"],
+            )
+            hits.extend(
+                IndexHit(id=i, document=doc, metadata=meta)
+                for i, doc, meta in zip(results.get("ids", []), results.get("documents", []), results.get("metadatas", []))
+            )
+            if len(hits) >= limit:
+                break
+        return hits
+
+    def get_by_ids(self, ids: list[str], vehicle_id: str | None = None) -> list[IndexHit]:
+        found: dict[str, IndexHit] = {}
+        for collection in self._collections(vehicle_id):
+            results = collection.get(ids=ids, include=["documents", "metadatas"])
+            for i, doc, meta in zip(results.get("ids", []), results.get("documents") or [], results.get("metadatas") or []):
+                found[i] = IndexHit(id=i, document=doc, metadata=meta)
+        return [found[i] for i in ids if i in found]  # Chromaは順序を保証しないので並べ直す
+
+    def get_embeddings(self, ids: list[str], vehicle_id: str | None = None) -> dict[str, np.ndarray]:
+        found: dict[str, np.ndarray] = {}
+        for collection in self._collections(vehicle_id):
+            results = collection.get(ids=ids, include=["embeddings"])
+            embeddings = results.get("embeddings")
+            if embeddings is None:
+                continue
+            for i, vector in zip(results.get("ids", []), embeddings):
+                found[i] = np.asarray(vector, dtype=np.float32)
+        return found
+
+    def get(self, vehicle_id: str, content_type: str | None = None) -> list[IndexHit]:
+        conditions = {"content_type": content_type} if content_type else {}
+        hits: list[IndexHit] = []
+        for collection in self._collections(vehicle_id):
+            results = collection.get(
+                where=self._where(vehicle_id, **conditions),
+                include=["documents", "metadatas"],
+            )
+            hits.extend(
+                IndexHit(id=i, document=doc, metadata=meta)
+                for i, doc, meta in zip(results.get("ids", []), results.get("documents") or [], results.get("metadatas") or [])
+            )
+        return hits
+
+    def list_ids(self, vehicle_id: str) -> list[str]:
+        return [
+            chunk_id
+            for collection in self._collections(vehicle_id)
+            for chunk_id in collection.get(where=self._where(vehicle_id), include=[]).get("ids", [])
+        ]
+
+    def delete_ids(self, vehicle_id: str, ids: list[str]):
+        if ids:
+            for collection in self._collections(vehicle_id):
+                collection.delete(ids=ids)
+
+    def delete_vehicle(self, vehicle_id: str):
+        if not self._per_vehicle:
+            self._collection.delete(where={"vehicle_id": vehicle_id})
+            return
+        with self._lock:
+            self._shards.pop(vehicle_id, None)
+        try:
+            self._client.delete_collection(name=self._shard_name(vehicle_id))
+        except Exception:
+            pass  # 未ingestの車両
+
+    def list_vehicles(self) -> list[str]:
+        """データが保存されている車両キー（版の掃除用。共有コレクションでは全件走査になる）"""
+        if self._per_vehicle:
+            prefix = f"{self._collection_name}__"
+            return sorted(
+                vehicle_id
+                for c in self._client.list_collections()
+                if c.name.startswith(prefix) and (vehicle_id := (c.metadata or {}).get("vehicle_id"))
+            )
+        metadatas = self._collection.get(include=["metadatas"]).get("metadatas") or []
+        return sorted({m["vehicle_id"] for m in metadatas if m and m.get("vehicle_id")})
+
+    def prefetch(self, vehicle_id: str):
+        """シャードを開き、1件クエリしてHNSWをメモリに読み込んでおく。"""
+        for collection in self._collections(vehicle_id):
+            sample = collection.peek(limit=1)
+            embeddings = sample.get("embeddings")
+            if embeddings is not None and len(embeddings):
+                collection.query(query_embeddings=embeddings[:1], n_results=1, where=self._where(vehicle_id))
+
+    def count(self) -> int:
+        return sum(collection.count() for collection in self._collections(None))
+
+    def stats(self) -> dict:
+        return {
+            "per_vehicle": self._per_vehicle,
+            "open_shards": len(self._shards),
+        }
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """scores (q, n) の各行について上位k件の列インデックスをスコア降順で返す。"""
+    n = scores.shape[1]
+    if k >= n:
+        top = np.broadcast_to(np.arange(n), scores.shape)
+    else:
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class _VehicleIndex:
+    """1車両分の行列とメタデータ。行番号が ids / documents / metadatas と対応する。"""
+
+    def __init__(
+        self,
+        ids: list[str],
+        documents: list[str],
+        metadatas: list[dict],
+        embeddings: np.ndarray,
+        compact: QuantizedMatrix | None = None,
+        rescore_factor: int = 4,
+    ):
+        self.ids = ids
+        self.documents = documents
+        self.metadatas = metadatas
+        self.embeddings = embeddings  # 量子化時はメモリマップ（再スコア時に候補行だけ読む）
+        self.compact = compact
+        self.rescore_factor = rescore_factor
+        self.warning_mask = np.array([bool(m.get("has_warning")) for m in metadatas], dtype=bool)
+        self.row_of = {chunk_id: row for row, chunk_id in enumerate(ids)}
+        # 常駐メモリの概算（行列 + 本文のバイト数）。量子化時は圧縮表現だけを数える
+        matrix_bytes = compact.nbytes if compact is not None else embeddings.nbytes
+        self.nbytes = matrix_bytes + sum(len(d.encode("utf-8")) for d in documents)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def hit(self, row: int, score: float = 0.0) -> IndexHit:
+        return IndexHit(id=self.ids[row], document=self.documents[row], metadata=self.metadatas[row], score=score)
+
+    def query(self, query_embeddings: np.ndarray, n_results: int, warning_only: bool) -> list[list[IndexHit]]:
+        if self.compact is not None and not warning_only and len(self.ids):
+            top, scores = rescored_top_k(
+                query_embeddings, self.compact, self.embeddings, n_results, self.rescore_factor,
+            )
+            return [
+                [self.hit(int(row), float(score)) for row, score in zip(rows, row_scores)]
+                for rows, row_scores in zip(top, scores)
+            ]
+
+        # 警告チャンクは少数なので量子化時も float32 で厳密に計算する
+        rows = np.flatnonzero(self.warning_mask) if warning_only else None
+        matrix = self.embeddings if rows is None else self.embeddings[rows]
+        if matrix.shape[0] == 0:
+            return [[] for _ in range(query_embeddings.shape[0])]
+
+        scores = query_embeddings @ matrix.T
+        top = _top_k(scores, n_results)
+        hits = []
+        for q, cols in enumerate(top):
+            hits.append([
+                self.hit(int(col if rows is None else rows[col]), float(scores[q, col]))
+                for col in cols
+            ])
+        return hits
+
+
+_UNSAFE_PATH_CHARS = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+class FlatIndexBackend:
+    """車両ごとの float32 行列を総当たりで検索するバックエンド
+
+    ディレクトリ構成: {root_dir}/{vehicle_id}/embeddings.npy, chunks.json, meta.json
+    （量子化時は embeddings.{quantization}.npz も）
+    車両は初回アクセス時に読み込み、memory_budget_bytes（0で無制限）を超えたら
+    最も長く使われていない車両から解放する。更新のたびに該当車両のファイルを書き直す。
+    """
+
+    name = "flat"
+    add_batch_size = 0  # add のたびに車両のファイル全体を書き直すので、1版を一括で追加する
+
+    def __init__(
+        self,
+        root_dir: str,
+        memory_budget_bytes: int = 0,
+        quantization: str = "none",
+        rescore_factor: int = 4,
+    ):
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        self.root_dir = root_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        self._vehicles: OrderedDict[str, _VehicleIndex] = OrderedDict()
+        self._lock = threading.RLock()
+        os.makedirs(root_dir, exist_ok=True)
+
+    def _vehicle_dir(self, vehicle_id: str) -> str:
+        return os.path.join(self.root_dir, _UNSAFE_PATH_CHARS.sub("_", vehicle_id))
+
+    def _stored_vehicles(self) -> dict[str, int]:
+        """ディスク上の車両ID → チャンク数（meta.json から読むので行列はロードしない）"""
+        stored = {}
+        for entry in sorted(os.listdir(self.root_dir)):
+            directory = os.path.join(self.root_dir, entry)
+            meta_path = os.path.join(directory, "meta.json")
+            try:
+                if os.path.isfile(meta_path):
+                    with open(meta_path, encoding="utf-8") as f:
+                        meta = json.load(f)
+                elif os.path.isfile(os.path.join(directory, "chunks.json")):
+                    meta = self._backfill_meta(directory)
+                else:
+                    continue
+            except (OSError, ValueError, KeyError) as e:
+                logger.warning("Skipping broken flat index %s: %s", directory, e)
+                continue
+            stored[meta["vehicle_id"]] = meta["count"]
+        return stored
+
+    def _backfill_meta(self, directory: str) -> dict:
+        """meta.json 導入前のインデックス: chunks.json から作って保存しておく"""
+        with open(os.path.join(directory, "chunks.json"), encoding="utf-8") as f:
+            chunks = json.load(f)
+        meta = {"vehicle_id": chunks["vehicle_id"], "count": len(chunks["ids"])}
+        meta_tmp = os.path.join(directory, "meta.json.tmp")
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_tmp, os.path.join(directory, "meta.json"))
+        logger.info("Backfilled meta.json for flat index %s", directory)
+        return meta
+
+    def _load(self, vehicle_id: str) -> _VehicleIndex | None:
+        directory = self._vehicle_dir(vehicle_id)
+        chunks_path = os.path.join(directory, "chunks.json")
+        if not os.path.isfile(chunks_path):
+            return None
+        try:
+            with open(chunks_path, encoding="utf-8") as f:
+                chunks = json.load(f)
+            if self.quantization == "none":
+                embeddings = np.load(os.path.join(directory, "embeddings.npy"))
+                compact = None
+            else:
+                embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+                compact = self._load_compact(directory, embeddings)
+        except (OSError, ValueError) as e:
+            logger.warning("Skipping broken flat index %s: %s", directory, e)
+            return None
+        return _VehicleIndex(
+            chunks["ids"], chunks["documents"], chunks["metadatas"], embeddings, compact, self.rescore_factor,
+        )
+
+    def _compact_path(self, directory: str, quantization: str | None = None) -> str:
+        return os.path.join(directory, f"embeddings.{quantization or self.quantization}.npz")
+
+    def _load_compact(self, directory: str, embeddings: np.ndarray) -> QuantizedMatrix:
+        path = self._compact_path(directory)
+        if os.path.isfile(path):
+            compact = QuantizedMatrix.load(path, self.quantization)
+            if len(compact) == len(embeddings):
+                return compact
+        # 量子化を有効にする前のインデックス: float32 原本から作って保存しておく
+        compact = QuantizedMatrix.encode(embeddings, self.quantization)
+        tmp = path + ".tmp"
+        compact.save(tmp)
+        os.replace(tmp, path)
+        return compact
+
+    def _resident(self, vehicle_id: str) -> _VehicleIndex | None:
+        """車両のインデックスを返す（未ロードならディスクから読み込む）。"""
+        with self._lock:
+            index = self._vehicles.get(vehicle_id)
+            if index is not None:
+                self._vehicles.move_to_end(vehicle_id)
+                return index
+            index = self._load(vehicle_id)
+            if index is not None:
+                self._put(vehicle_id, index)
+            return index
+
+    def _put(self, vehicle_id: str, index: _VehicleIndex):
+        self._vehicles[vehicle_id] = index
+        self._vehicles.move_to_end(vehicle_id)
+        if self.memory_budget_bytes <= 0:
+            return
+        resident = sum(v.nbytes for v in self._vehicles.values())
+        # 直前に使った車両は残す（予算より大きくても1車両は常駐させる）
+        while resident > self.memory_budget_bytes and len(self._vehicles) > 1:
+            evicted_id, evicted = self._vehicles.popitem(last=False)
+            resident -= evicted.nbytes
+            logger.info("Evicted flat index shard %s (%.1f MB)", evicted_id, evicted.nbytes / 1024 / 1024)
+
+    def _save(self, vehicle_id: str):
+        index = self._vehicles[vehicle_id]
+        directory = self._vehicle_dir(vehicle_id)
+        os.makedirs(directory, exist_ok=True)
+
+        # 書き込み途中で落ちても前回の状態が残るよう、一時ファイル経由で置き換える
+        embeddings_tmp = os.path.join(directory, "embeddings.npy.tmp")
+        with open(embeddings_tmp, "wb") as f:
+            np.save(f, index.embeddings)
+        chunks_tmp = os.path.join(directory, "chunks.json.tmp")
+        with open(chunks_tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "vehicle_id": vehicle_id,
+                    "ids": index.ids,
+                    "documents": index.documents,
+                    "metadatas": index.metadatas,
+                },
+                f,
+                ensure_ascii=False,
+            )
+        meta_tmp = os.path.join(directory, "meta.json.tmp")
+        with open(meta_tmp, "w", encoding="utf-8") as f:
+            json.dump({"vehicle_id": vehicle_id, "count": len(index)}, f, ensure_ascii=False)
+        if index.compact is not None:
+            compact_tmp = self._compact_path(directory) + ".tmp"
+            index.compact.save(compact_tmp)
+            os.replace(compact_tmp, self._compact_path(directory))
+        # 他の量子化モードの圧縮ファイルは書き直した原本と対応しなくなるので消す
+        # （行数が同じだと _load_compact で古い符号を使ってしまう）
+        written = self.quantization if index.compact is not None else None
+        for quantization in QUANTIZATIONS:
+            stale = self._compact_path(directory, quantization)
+            if quantization not in ("none", written) and os.path.exists(stale):
+                os.remove(stale)
+        os.replace(embeddings_tmp, os.path.join(directory, "embeddings.npy"))
+        os.replace(chunks_tmp, os.path.join(directory, "chunks.json"))
+        os.replace(meta_tmp, os.path.join(directory, "meta.json"))
+        if index.compact is not None:
+            # 書き込んだ原本をメモリマップで開き直し、float32 行列を常駐させない
+            index.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+
+    def _new_index(
+        self,
+        ids: list[str],
+        documents: list[str],
+        metadatas: list[dict],
+        embeddings: np.ndarray,
+        compact: QuantizedMatrix | None = None,
+    ) -> _VehicleIndex:
+        if self.quantization != "none" and compact is None:
+            compact = QuantizedMatrix.encode(embeddings, self.quantization)
+        return _VehicleIndex(ids, documents, metadatas, embeddings, compact, self.rescore_factor)
+
+    def add(
+        self,
+        vehicle_id: str,
+        ids: list[str],
+        embeddings: np.ndarray,
+        documents: list[str],
+        metadatas: list[dict],
+    ):
+        vectors = _normalize_rows(embeddings)
+        with self._lock:
+            current = self._resident(vehicle_id)
+            if current is not None:
+                known = set(current.ids)
+                duplicated = [i for i in ids if i in known]
+                if duplicated:
+                    raise ValueError(f"Duplicate ids for {vehicle_id}: {duplicated[:5]}")
+                compact = None
+                if current.compact is not None:
+                    added = QuantizedMatrix.encode(vectors, self.quantization)
+                    compact = QuantizedMatrix(
+                        self.quantization,
+                        np.concatenate([current.compact.codes, added.codes]),
+                        None if added.scales is None else np.concatenate([current.compact.scales, added.scales]),
+                    )
+                index = self._new_index(
+                    current.ids + list(ids),
+                    current.documents + list(documents),
+                    current.metadatas + list(metadatas),
+                    np.concatenate([current.embeddings, vectors]),
+                    compact,
+                )
+            else:
+                index = self._new_index(list(ids), list(documents), list(metadatas), vectors)
+            self._put(vehicle_id, index)
+            self._save(vehicle_id)
+
+    def _targets(self, vehicle_id: str | None) -> list[_VehicleIndex]:
+        vehicle_ids = list(self._stored_vehicles()) if vehicle_id is None else [vehicle_id]
+        return [index for v in vehicle_ids if (index := self._resident(v)) is not None]
+
+    def query(
+        self,
+        query_embeddings: np.ndarray,
+        vehicle_id: str | None = None,
+        n_results: int = 5,
+        warning_only: bool = False,
+    ) -> list[list[IndexHit]]:
+        queries = _normalize_rows(np.atleast_2d(query_embeddings))
+        per_vehicle = [index.query(queries, n_results, warning_only) for index in self._targets(vehicle_id)]
+        return _merge_top(per_vehicle, queries.shape[0], n_results)
+
+    def find_containing(self, keyword: str, vehicle_id: str | None = None, limit: int = 5) -> list[IndexHit]:
+        hits: list[IndexHit] = []
+        for index in self._targets(vehicle_id):
+            for row, doc in enumerate(index.documents):
+                if keyword in doc:
+                    hits.append(index.hit(row))
+                    if len(hits) >= limit:
+                        return hits
+        return hits
+
+    def get_by_ids(self, ids: list[str], vehicle_id: str | None = None) -> list[IndexHit]:
+        indexes = self._targets(vehicle_id)
+        hits = []
+        for chunk_id in ids:
+            for index in indexes:
+                row = index.row_of.get(chunk_id)
+                if row is not None:
+                    hits.append(index.hit(row))
+                    break
+        return hits
+
+    def get_embeddings(self, ids: list[str], vehicle_id: str | None = None) -> dict[str, np.ndarray]:
+        indexes = self._targets(vehicle_id)
+        found: dict[str, np.ndarray] = {}
+        for chunk_id in ids:
+            for index in indexes:
+                row = index.row_of.get(chunk_id)
+                if row is not None:
+                    found[chunk_id] = index.embeddings[row]
+                    break
+        return found
+
+    def get(self, vehicle_id: str, content_type: str | None = None) -> list[IndexHit]:
+        return [
+            index.hit(row)
+            for index in self._targets(vehicle_id)
+            for row, meta in enumerate(index.metadatas)
+            if content_type is None or meta.get("content_type") == content_type
+        ]
+
+    def list_ids(self, vehicle_id: str) -> list[str]:
+        return [chunk_id for index in self._targets(vehicle_id) for chunk_id in index.ids]
+
+    def delete_ids(self, vehicle_id: str, ids: list[str]):
+        with self._lock:
+            index = self._resident(vehicle_id)
+            if index is None or not ids:
+                return
+            removed = set(ids)
+            keep = [row for row, chunk_id in enumerate(index.ids) if chunk_id not in removed]
+            if not keep:
+                self.delete_vehicle(vehicle_id)
+                return
+            self._put(vehicle_id, self._new_index(
+                [index.ids[row] for row in keep],
+                [index.documents[row] for row in keep],
+                [index.metadatas[row] for row in keep],
+                np.asarray(index.embeddings[keep]),
+                None if index.compact is None else index.compact.take(np.asarray(keep)),
+            ))
+            self._save(vehicle_id)
+
+    def delete_vehicle(self, vehicle_id: str):
+        with self._lock:
+            self._vehicles.pop(vehicle_id, None)
+            directory = self._vehicle_dir(vehicle_id)
+            names = ["meta.json", "embeddings.npy", "chunks.json"]
+            names += [os.path.basename(self._compact_path(directory, q)) for q in QUANTIZATIONS if q != "none"]
+            for name in names:
+                path = os.path.join(directory, name)
+                if os.path.exists(path):
+                    os.remove(path)
+            if os.path.isdir(directory) and not os.listdir(directory):
+                os.rmdir(directory)
+
+    def list_vehicles(self) -> list[str]:
+        return sorted(self._stored_vehicles())
+
+    def prefetch(self, vehicle_id: str):
+        self._resident(vehicle_id)
+
+    def count(self) -> int:
+        return sum(self._stored_vehicles().values())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "resident_vehicles": list(self._vehicles),
+                "resident_bytes": sum(v.nbytes for v in self._vehicles.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "quantization": self.quantization,
+            }
+
+
+IndexBackend = ChromaIndexBackend | FlatIndexBackend
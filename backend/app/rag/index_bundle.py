@@ -0,0 +1,223 @@
+"""車両インデックスのバンドル（エクスポート / インポート）
+
+新しいノードを立てるたびに全マニュアルを /api/admin/ingest し直すと、PDF解析・チャンク分割・
+embeddingで車両ごとに数分かかる。ingest済みノードから車両のチャンク・embedding・メタデータ・
+BM25索引を1ファイルに書き出し、新ノードでは再embeddingなしで取り込めるようにする。
+
+ファイル形式（FORMAT_VERSION = 1）:
+    MAGIC (8バイト) + マニフェスト長 (8バイト, ビッグエンディアン) + マニフェスト JSON
+    + 64バイト境界に揃えたセクション群
+    マニフェストには embedding モデル名・次元・射影設定と、各セクションの
+    offset（セクション領域先頭から）/ nbytes / sha256 を記録する。
+    embeddings セクションは float32 の生行列なので、インポート時はメモリマップで読む。
+
+CLI:
+  cd backend
+  python -m app.rag.index_bundle export honda_accord_2011 bundles/honda_accord_2011.vbundle
+  python -m app.rag.index_bundle import bundles/honda_accord_2011.vbundle
+  python -m app.rag.index_bundle inspect bundles/honda_accord_2011.vbundle
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import logging
+import os
+import struct
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"VMIDXBND"
+FORMAT_VERSION = 1
+_ALIGN = 64
+_HASH_BLOCK_BYTES = 1 << 20
+
+
+class BundleError(ValueError):
+    """バンドルが壊れている・このノードの設定と互換性がない"""
+
+
+@dataclass
+class IndexBundle:
+    manifest: dict
+    ids: list[str]
+    documents: list[str]
+    metadatas: list[dict]
+    embeddings: np.ndarray  # (count, dim) float32。read_bundle ではメモリマップ
+    bm25: bytes | None = None
+    projection: dict[str, np.ndarray] | None = None
+
+    @property
+    def vehicle_id(self) -> str:
+        return self.manifest["vehicle_id"]
+
+
+def _padding(n: int) -> int:
+    return (-n) % _ALIGN
+
+
+def _npz_bytes(arrays: dict[str, np.ndarray]) -> bytes:
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+    return buffer.getvalue()
+
+
+def write_bundle(path: str, bundle: IndexBundle):
+    """バンドルを書き出す（一時ファイル経由で置き換えるので途中で落ちても壊れない）。"""
+    embeddings = np.ascontiguousarray(bundle.embeddings, dtype=np.float32)
+    if embeddings.shape[0] != len(bundle.ids):
+        raise BundleError("embeddings rows must match ids")
+    sections: dict[str, bytes | memoryview] = {
+        "embeddings": memoryview(embeddings).cast("B"),
+        "chunks": json.dumps(
+            {"ids": bundle.ids, "documents": bundle.documents, "metadatas": bundle.metadatas},
+            ensure_ascii=False,
+        ).encode("utf-8"),
+    }
+    if bundle.bm25 is not None:
+        sections["bm25"] = bundle.bm25
+    if bundle.projection is not None:
+        sections["projection"] = _npz_bytes(bundle.projection)
+
+    layout = {}
+    offset = 0
+    for name, data in sections.items():
+        layout[name] = {
+            "offset": offset,
+            "nbytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+        offset += len(data) + _padding(len(data))
+    manifest = {
+        **bundle.manifest,
+        "format_version": FORMAT_VERSION,
+        "count": len(bundle.ids),
+        "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+        "sections": layout,
+    }
+    manifest_bytes = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+    header = MAGIC + struct.pack(">Q", len(manifest_bytes)) + manifest_bytes
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(header + b"\0" * _padding(len(header)))
+        for data in sections.values():
+            f.write(data)
+            f.write(b"\0" * _padding(len(data)))
+    os.replace(tmp, path)
+
+
+def read_manifest(path: str) -> tuple[dict, int]:
+    """(マニフェスト, セクション領域の先頭オフセット) を返す。"""
+    with open(path, "rb") as f:
+        head = f.read(len(MAGIC) + 8)
+        if len(head) < len(MAGIC) + 8 or head[: len(MAGIC)] != MAGIC:
+            raise BundleError(f"Not an index bundle: {path}")
+        (length,) = struct.unpack(">Q", head[len(MAGIC):])
+        manifest = json.loads(f.read(length).decode("utf-8"))
+    if manifest.get("format_version") != FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle format version: {manifest.get('format_version')}")
+    header_len = len(MAGIC) + 8 + length
+    return manifest, header_len + _padding(header_len)
+
+
+def _verify_section(f, start: int, section: dict, name: str):
+    digest = hashlib.sha256()
+    f.seek(start + section["offset"])
+    remaining = section["nbytes"]
+    while remaining:
+        block = f.read(min(remaining, _HASH_BLOCK_BYTES))
+        if not block:
+            break
+        digest.update(block)
+        remaining -= len(block)
+    if remaining or digest.hexdigest() != section["sha256"]:
+        raise BundleError(f"Checksum mismatch in bundle section '{name}'")
+
+
+def read_bundle(path: str, verify: bool = True) -> IndexBundle:
+    """バンドルを開く。embeddings はファイルのメモリマップ（コピーしない）。"""
+    manifest, start = read_manifest(path)
+    sections = manifest["sections"]
+
+    with open(path, "rb") as f:
+        if verify:
+            for name, section in sections.items():
+                _verify_section(f, start, section, name)
+
+        def read(name: str) -> bytes | None:
+            section = sections.get(name)
+            if section is None:
+                return None
+            f.seek(start + section["offset"])
+            return f.read(section["nbytes"])
+
+        chunks = json.loads(read("chunks").decode("utf-8"))
+        bm25 = read("bm25")
+        projection_bytes = read("projection")
+
+    count, dim = manifest["count"], manifest["dim"]
+    if count:
+        embeddings = np.memmap(
+            path, dtype=np.float32, mode="r", offset=start + sections["embeddings"]["offset"], shape=(count, dim),
+        )
+    else:
+        embeddings = np.empty((0, dim), dtype=np.float32)
+    projection = None
+    if projection_bytes is not None:
+        with np.load(io.BytesIO(projection_bytes)) as data:
+            projection = {name: data[name] for name in data.files}
+
+    return IndexBundle(
+        manifest=manifest,
+        ids=chunks["ids"],
+        documents=chunks["documents"],
+        metadatas=chunks["metadatas"],
+        embeddings=embeddings,
+        bm25=bm25,
+        projection=projection,
+    )
+
+
+async def _main():
+    parser = argparse.ArgumentParser(description="Export / import prebuilt vehicle index bundles")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_cmd = commands.add_parser("export", help="車両のインデックスをバンドルに書き出す")
+    export_cmd.add_argument("vehicle_id")
+    export_cmd.add_argument("path")
+    import_cmd = commands.add_parser("import", help="バンドルを取り込む（再embeddingなし）")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument("--no-verify", action="store_true", help="チェックサム検証を省略する")
+    inspect_cmd = commands.add_parser("inspect", help="マニフェストを表示する")
+    inspect_cmd.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "inspect":
+        print(json.dumps(read_manifest(args.path)[0], ensure_ascii=False, indent=2))
+        return
+
+    from app.rag.store_executor import store_executor
+    from app.rag.vector_store import vector_store
+
+    t0 = time.perf_counter()
+    try:
+        if args.command == "export":
+            result = await vector_store.export_bundle(args.vehicle_id, args.path)
+        else:
+            result = await vector_store.import_bundle(args.path, verify=not args.no_verify)
+    finally:
+        store_executor.shutdown()
+    logger.info("%s finished in %.1fs", args.command, time.perf_counter() - t0)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s: %(message)s")
+    asyncio.run(_main())
@@ -1,3 +1,4 @@
+from app.rag.embedder import ProgressCallback
 from app.rag.pdf_loader import pdf_loader
 from app.rag.chunker import chunker
 from app.rag.vector_store import vector_store
@@ -12,12 +13,15 @@ class IngestionPipeline:
         make: str = "",
         model: str = "",
         year: int = 0,
+        progress_callback: ProgressCallback | None = None,
     ) -> dict:
         pages = pdf_loader.load_from_bytes(pdf_bytes)
         chunks = chunker.chunk_pages(pages)
 
-        vector_store.delete_vehicle(vehicle_id)
-        await vector_store.add_chunks(chunks, vehicle_id=vehicle_id, make=make, model=model, year=year)
+        counts = await vector_store.upsert_chunks(
+            chunks, vehicle_id=vehicle_id, make=make, model=model, year=year,
+            progress_callback=progress_callback,
+        )
 
         return {
             "status": "success",
@@ -25,6 +29,9 @@ class IngestionPipeline:
             "vehicle_id": vehicle_id,
             "pages_processed": len(pages),
             "chunks_created": len(chunks),
+            "chunks_added": counts["added"],
+            "chunks_removed": counts["removed"],
+            "chunks_unchanged": counts["unchanged"],
         }
 
 
@@ -9,6 +9,7 @@ import re
 # 車両診断に頻出する名詞パターン（カタカナ語、漢字複合語）
 _KATAKANA_PATTERN = re.compile(r"[ァ-ヴー]{2,}")
 _KANJI_COMPOUND_PATTERN = re.compile(r"[一-龥]{2,}")
+_ALNUM_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9-]+")
 
 # ストップワード: 検索に使っても意味がない一般語
 _STOPWORDS = frozenset({
@@ -122,3 +123,20 @@ def extract_keywords(query: str, max_keywords: int = 5) -> list[str]:
         keywords = specific + generic
 
     return keywords[:max_keywords]
+
+
+def extract_terms(text: str) -> list[str]:
+    """本文から索引用の語を出現回数分抽出する（順序は不定）。
+
+    extract_keywords と同じ辞書・パターンを使うが、件数制限や暗黙キーワード
+    の補完は行わない。BM25索引の語彙として使う。
+    """
+    terms: list[str] = []
+    for kw in _DOMAIN_KEYWORDS:
+        terms.extend([kw] * text.count(kw))
+    for pattern, min_len in ((_KATAKANA_PATTERN, 3), (_KANJI_COMPOUND_PATTERN, 2), (_ALNUM_PATTERN, 2)):
+        for match in pattern.finditer(text):
+            word = match.group()
+            if len(word) >= min_len and word not in _STOPWORDS and word not in _DOMAIN_KEYWORDS:
+                terms.append(word)
+    return terms
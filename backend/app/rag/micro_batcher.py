@@ -0,0 +1,138 @@
+"""専用ワーカースレッドによるマイクロバッチ処理
+
+並行するコルーチンからの推論リクエストを短時間だけ待って集約し、1回のバッチ推論で処理する。
+ローカルembedding（テキスト）とcross-encoderリランカー（(クエリ, 文書) ペア）が使う。
+バッチ関数は入力と同じ順序で先頭軸に結果を並べた配列を返し、各リクエストには
+自分の入力に対応する行だけを返す。
+"""
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Generic, TypeVar
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+@dataclass
+class _BatchJob(Generic[T]):
+    items: list[T]
+    future: asyncio.Future
+    loop: asyncio.AbstractEventLoop
+
+
+def _resolve_future(future: asyncio.Future, result=None, error: BaseException | None = None):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+class MicroBatcher(Generic[T]):
+    """専用ワーカースレッドで推論リクエストをマイクロバッチ化する。
+
+    並行するコルーチンからのリクエストを最大 max_wait_ms 待って集約し、
+    1回の batch_fn で処理してから各futureを解決する。イベントループは
+    推論中もブロックされない。
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[list[T]], np.ndarray],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        name: str = "micro-batcher",
+    ):
+        self._batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max(0.0, max_wait_ms) / 1000
+        self._name = name
+        self._queue: queue.Queue[_BatchJob[T] | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+
+    async def submit(self, items: list[T]) -> np.ndarray:
+        """items をバッチ推論し、items と同じ順序の結果（先頭軸が len(items)）を返す。"""
+        if not items:
+            return np.empty((0, 0), dtype=np.float32)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._ensure_started()
+        self._queue.put(_BatchJob(items=items, future=future, loop=loop))
+        return await future
+
+    def _collect(self, first: _BatchJob[T]) -> tuple[list[_BatchJob[T]], bool]:
+        """先頭ジョブに続くジョブを締切まで集約する。戻り値の2番目は停止要求の有無。"""
+        jobs = [first]
+        n_items = len(first.items)
+        deadline = time.monotonic() + self.max_wait_seconds
+        while n_items < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                job = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if job is None:
+                return jobs, True
+            jobs.append(job)
+            n_items += len(job.items)
+        return jobs, False
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            jobs, stop = self._collect(first)
+            items = [item for job in jobs for item in job.items]
+            try:
+                outputs = self._batch_fn(items)
+            except Exception as e:
+                logger.warning("%s: batch of %d items failed: %s", self._name, len(items), e)
+                for job in jobs:
+                    job.loop.call_soon_threadsafe(_resolve_future, job.future, None, e)
+            else:
+                self.batches += 1
+                self.items += len(items)
+                offset = 0
+                for job in jobs:
+                    result = outputs[offset : offset + len(job.items)]
+                    offset += len(job.items)
+                    job.loop.call_soon_threadsafe(_resolve_future, job.future, result)
+            if stop:
+                return
+
+    def shutdown(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+        self._thread = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": self.items / self.batches if self.batches else 0.0,
+            "queue_depth": self._queue.qsize(),
+        }
@@ -0,0 +1,56 @@
+"""Maximal Marginal Relevance (MMR) による候補チャンクの多様化
+
+チャンカーの重なり付き分割（_sentence_aware_overlap）で、ほぼ同じ本文のチャンクが
+複数候補に残り、リランカーとLLMプロンプトのトークンを浪費する。保存済みembeddingを使い、
+クエリとの関連度と選択済みチャンクとの類似度のバランスで候補を選び直す。
+"""
+
+import numpy as np
+
+
+def _unit(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+def mmr_select(
+    query_embedding: np.ndarray,
+    candidate_embeddings: np.ndarray,
+    lambda_mult: float = 0.7,
+    top_n: int | None = None,
+    duplicate_threshold: float | None = None,
+) -> list[int]:
+    """MMRで選んだ候補の行番号を選択順に返す。
+
+    score_i = λ·sim(q, c_i) − (1 − λ)·max_{s∈選択済み} sim(c_i, s)
+    類似度はコサイン類似度（入力は内部でL2正規化する）。
+    duplicate_threshold を指定すると、選択済みチャンクとの類似度がそれ以上の候補は選ばない。
+    """
+    n = candidate_embeddings.shape[0]
+    if top_n is None:
+        top_n = n
+    top_n = min(top_n, n)
+    if top_n <= 0:
+        return []
+
+    candidates = _unit(candidate_embeddings)
+    relevance = candidates @ _unit(query_embedding)
+    similarity = candidates @ candidates.T
+    max_sim = np.full(n, -np.inf, dtype=np.float64)
+    available = np.ones(n, dtype=bool)
+
+    selected: list[int] = []
+    for _ in range(top_n):
+        redundancy = np.where(np.isfinite(max_sim), max_sim, 0.0)
+        scores = lambda_mult * relevance - (1.0 - lambda_mult) * redundancy
+        scores = np.where(available, scores, -np.inf)
+        best = int(np.argmax(scores))
+        if not available[best]:
+            break
+        selected.append(best)
+        available[best] = False
+        max_sim = np.maximum(max_sim, similarity[best])
+        if duplicate_threshold is not None:
+            available &= max_sim < duplicate_threshold
+    return selected
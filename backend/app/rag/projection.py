@@ -0,0 +1,120 @@
+"""embeddingの次元削減（PCA / Matryoshka型切り詰め）
+
+1024次元のe5-large/Titanベクトルを低次元に射影し、Chromaコレクションと
+HNSWグラフのメモリ・検索コストを削減する。upsert_chunks と search の両方で
+同じ射影を適用する。
+
+- pca: 初回ingest時のチャンクembeddingでPCAを学習し、射影行列を
+  コレクションの隣に .npz で永続化する（以降は同じ行列を使い続ける）。
+- truncate: 先頭 dim 次元に切り詰めて再正規化する（学習不要）。
+  Matryoshka学習済みのモデル（Titan V2等）向け。e5では精度が落ちやすい。
+
+射影後は必ずL2正規化するため、コサイン距離のコレクションとそのまま使える。
+recall@kの劣化は tests/bench/eval_projection_recall.py で計測する。
+"""
+
+import logging
+import os
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+PROJECTION_MODES = ("none", "pca", "truncate")
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.clip(norms, 1e-12, None)
+
+
+class EmbeddingProjection:
+    def __init__(self, mode: str = "none", dim: int = 256, path: str | None = None):
+        if mode not in PROJECTION_MODES:
+            raise ValueError(f"Unknown embedding projection mode: {mode}")
+        self.mode = mode
+        self.dim = dim
+        self.path = path
+        self._mean: np.ndarray | None = None
+        self._components: np.ndarray | None = None  # (dim, input_dim)
+        if mode == "pca" and path and os.path.exists(path):
+            self.load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "none"
+
+    @property
+    def needs_fit(self) -> bool:
+        return self.mode == "pca" and self._components is None
+
+    def fit(self, vectors: np.ndarray):
+        """PCAの射影行列を学習して保存する。"""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.shape[0] < self.dim:
+            raise ValueError(
+                f"PCA projection to {self.dim} dims needs at least {self.dim} chunks to fit, "
+                f"got {matrix.shape[0]}"
+            )
+        mean = matrix.mean(axis=0)
+        # 共分散の固有ベクトル = 中心化行列の右特異ベクトル
+        _, singular_values, vt = np.linalg.svd(matrix - mean, full_matrices=False)
+        self._mean = mean
+        self._components = vt[: self.dim].astype(np.float32)
+
+        explained = (singular_values[: self.dim] ** 2).sum() / (singular_values**2).sum()
+        logger.info(
+            "Fitted PCA projection %d→%d on %d vectors (explained variance %.3f)",
+            matrix.shape[1], self.dim, matrix.shape[0], explained,
+        )
+        if self.path:
+            self.save()
+
+    def transform(self, vectors: np.ndarray) -> np.ndarray:
+        """(n, input_dim) → (n, dim) に射影しL2正規化する。"""
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if self.mode == "none":
+            return matrix
+        if self.mode == "truncate":
+            return _normalize(matrix[:, : self.dim])
+        if self._components is None:
+            raise RuntimeError("PCA projection is not fitted yet")
+        return _normalize((matrix - self._mean) @ self._components.T)
+
+    def export_state(self) -> dict[str, np.ndarray] | None:
+        """学習済みPCAの平均と射影行列（インデックスバンドル用）。学習不要なモードは None。"""
+        if self._components is None:
+            return None
+        return {"mean": self._mean, "components": self._components}
+
+    def import_state(self, state: dict[str, np.ndarray]):
+        """export_state() の内容を射影として使う。学習済みで内容が異なる場合はエラー。"""
+        if self._components is not None:
+            if not (
+                np.array_equal(self._mean, state["mean"])
+                and np.array_equal(self._components, state["components"])
+            ):
+                raise ValueError("PCA projection differs from the one already fitted on this node")
+            return
+        if state["components"].shape[0] != self.dim:
+            raise ValueError(
+                f"Projection has {state['components'].shape[0]} dims, but embedding_projection_dim={self.dim}"
+            )
+        self._mean = np.asarray(state["mean"], dtype=np.float32)
+        self._components = np.asarray(state["components"], dtype=np.float32)
+        if self.path:
+            self.save()
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        np.savez(self.path, mean=self._mean, components=self._components)
+
+    def load(self):
+        data = np.load(self.path)
+        self._mean = data["mean"]
+        self._components = data["components"]
+        if self._components.shape[0] != self.dim:
+            raise ValueError(
+                f"Stored projection has {self._components.shape[0]} dims, "
+                f"but embedding_projection_dim={self.dim}"
+            )
@@ -0,0 +1,102 @@
+"""flat インデックス用のベクトル量子化（float16 / int8）と厳密再スコア
+
+インデックスのメモリは チャンク数 × 次元 × 4バイト で増える。量子化モードでは
+圧縮表現（float16 は半分、int8 は 1/4 + ベクトルごとのスケール）だけを常駐させて
+総当たりし、上位 k×rescore_factor 件の候補だけを float32 原本（メモリマップ）で
+再スコアする。返すスコアは float32 の内積そのもの。
+"""
+
+import numpy as np
+
+QUANTIZATIONS = ("none", "float16", "int8")
+
+# 圧縮表現を float32 に戻して内積を取る際の1ブロックあたりの行数（一時配列の上限）
+_SCAN_BLOCK_ROWS = 16384
+
+
+class QuantizedMatrix:
+    """L2正規化済み行列の圧縮表現。scores() は近似内積を返す。"""
+
+    def __init__(self, mode: str, codes: np.ndarray, scales: np.ndarray | None = None):
+        if mode not in QUANTIZATIONS or mode == "none":
+            raise ValueError(f"Unknown quantization: {mode}")
+        self.mode = mode
+        self.codes = codes
+        self.scales = scales
+
+    @classmethod
+    def encode(cls, matrix: np.ndarray, mode: str) -> "QuantizedMatrix":
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if mode == "float16":
+            return cls(mode, matrix.astype(np.float16))
+        if mode == "int8":
+            # ベクトルごとに最大絶対値を127に合わせる対称量子化
+            scales = np.abs(matrix).max(axis=1) / 127.0 if len(matrix) else np.empty(0, dtype=np.float32)
+            scales = np.maximum(scales, 1e-12).astype(np.float32)
+            codes = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+            return cls(mode, codes, scales)
+        raise ValueError(f"Unknown quantization: {mode}")
+
+    @property
+    def nbytes(self) -> int:
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self) -> int:
+        return self.codes.shape[0]
+
+    def take(self, rows: np.ndarray) -> "QuantizedMatrix":
+        return QuantizedMatrix(self.mode, self.codes[rows], None if self.scales is None else self.scales[rows])
+
+    def scores(self, queries: np.ndarray) -> np.ndarray:
+        """queries (q, dim) と全行の近似内積 (q, n)"""
+        n = self.codes.shape[0]
+        out = np.empty((queries.shape[0], n), dtype=np.float32)
+        for start in range(0, n, _SCAN_BLOCK_ROWS):
+            block = self.codes[start : start + _SCAN_BLOCK_ROWS].astype(np.float32)
+            out[:, start : start + block.shape[0]] = queries @ block.T
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+    def save(self, path: str):
+        arrays = {"codes": self.codes}
+        if self.scales is not None:
+            arrays["scales"] = self.scales
+        with open(path, "wb") as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path: str, mode: str) -> "QuantizedMatrix":
+        with np.load(path) as data:
+            return cls(mode, data["codes"], data["scales"] if "scales" in data.files else None)
+
+
+def rescored_top_k(
+    queries: np.ndarray,
+    compact: QuantizedMatrix,
+    full: np.ndarray,
+    k: int,
+    rescore_factor: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """圧縮表現で k×rescore_factor 件に絞り、float32 原本で再スコアした上位k件。
+
+    Returns: (rows (q, k), scores (q, k)) — 各行はスコア降順
+    """
+    n = len(compact)
+    k = min(k, n)
+    approx = compact.scores(queries)
+    n_candidates = min(n, max(k, k * rescore_factor))
+    if n_candidates >= n:
+        candidates = np.broadcast_to(np.arange(n), approx.shape)
+    else:
+        candidates = np.argpartition(-approx, n_candidates - 1, axis=1)[:, :n_candidates]
+
+    rows = np.empty((queries.shape[0], k), dtype=np.int64)
+    scores = np.empty((queries.shape[0], k), dtype=np.float32)
+    for q in range(queries.shape[0]):
+        cand = np.sort(candidates[q])  # メモリマップを前から順に読む
+        exact = np.asarray(full[cand], dtype=np.float32) @ queries[q]
+        order = np.argsort(-exact, kind="stable")[:k]
+        rows[q] = cand[order]
+        scores[q] = exact[order]
+    return rows, scores
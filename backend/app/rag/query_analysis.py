@@ -0,0 +1,51 @@
+"""1回のRAG問い合わせで使い回すクエリ解析結果
+
+RAGService.query の各ステージ（ハイブリッド検索・推論キーワード検索・リランク用クエリ・
+仕様チャンク保証・Corrective RAG）は同じ症状文からキーワード抽出・追加クエリ生成・
+クエリembeddingを個別に行っていた。QueryAnalysis に一度だけ計算して保持し、
+パイプライン全体に渡す。リクエストごとに作り、リクエストをまたいで共有しない。
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from app.rag.keyword_extractor import extract_keywords
+
+_MAX_KEYWORDS = 3
+
+
+@dataclass
+class QueryAnalysis:
+    symptom: str
+    alt_queries: list[str] | None = None  # LLMで生成した追加クエリ（None = 未生成）
+    embeddings: dict[str, np.ndarray] = field(default_factory=dict)  # クエリ → 射影済みのクエリembedding
+    _keywords: dict[str, list[str]] = field(default_factory=dict, repr=False)
+
+    def keywords_for(self, query: str) -> list[str]:
+        """クエリのキーワード（クエリごとに1回だけ抽出する）"""
+        if query not in self._keywords:
+            self._keywords[query] = extract_keywords(query, max_keywords=_MAX_KEYWORDS)
+        return self._keywords[query]
+
+    @property
+    def keywords(self) -> list[str]:
+        return self.keywords_for(self.symptom)
+
+    @property
+    def inferred_keywords(self) -> list[str]:
+        """暗黙マッピングで導出された、症状文自体に含まれないキーワード"""
+        return [kw for kw in self.keywords if kw not in self.symptom]
+
+    @property
+    def rerank_query(self) -> str:
+        """リランカー用クエリ。推論キーワードをヒントとして付加する。
+
+        keyword_extractorの暗黙マッピングで導出されたキーワード（クエリ自体に
+        含まれない語）をリランカーに伝えることで、間接的に関連するチャンク
+        （例: ヒューズ仕様表）の評価を向上させる。
+        """
+        inferred = self.inferred_keywords
+        if inferred:
+            return f"{self.symptom} (関連部品: {', '.join(inferred[:3])})"
+        return self.symptom
@@ -1,14 +1,26 @@
-"""LLMベースのRerankerモジュール
-
-gpt-4o-miniを使用して検索結果の関連度をスコアリングし、
-上位チャンクのみを返すことでContext Precisionを向上させる。
+"""Rerankerモジュール
+
+検索結果の関連度を0-10でスコアリングし（rerank_score）、上位チャンクのみを返すことで
+Context Precisionを向上させる。バックエンドは reranker_backend 設定で選ぶ:
+- "llm": アクティブLLMプロバイダー（gpt-4o-mini等）に文書リストを評価させる
+- "cross_encoder": 多言語cross-encoderをローカルCPUで実行する。LLMの往復・スロットリングが
+  なく、推論は専用ワーカースレッドでマイクロバッチ化する。確率（0-1）を10倍して
+  LLMと同じ0-10スケールにするので、Corrective RAGの閾値はそのまま使える。
 """
 
 import json
 import logging
 
+import numpy as np
+
+from app.config import settings
+from app.rag.micro_batcher import MicroBatcher
+
 logger = logging.getLogger(__name__)
 
+# rerank_scoreがこれ以下のチャンクは除外する（全件以下なら上位をそのまま返す）
+_MIN_RERANK_SCORE = 2
+
 _RERANK_PROMPT = """以下の検索クエリに対する各文書の関連度を0-10で評価してください。
 関連度の基準:
 - 10: クエリの症状に対する直接的な診断手順・対処法が記載
@@ -25,12 +37,73 @@ _RERANK_PROMPT = """以下の検索クエリに対する各文書の関連度を
 JSON配列で返してください（他のテキストは不要）: [{{"index": 0, "score": 8}}, ...]"""
 
 
+class CrossEncoderReranker:
+    """多言語cross-encoder（reranker_model）によるローカルCPUリランク
+
+    モデルは初回利用時にロードする。(クエリ, 文書) ペアの推論は MicroBatcher の
+    ワーカースレッドで行い、並行するリクエスト（別セッション・CRAGの再リランク）の
+    ペアを1回のforward passにまとめる。
+    """
+
+    def __init__(self):
+        self._model = None
+        self._batcher: MicroBatcher[tuple[str, str]] = MicroBatcher(
+            self._predict,
+            max_batch_size=settings.reranker_batch_size,
+            max_wait_ms=settings.embedding_batch_max_wait_ms,
+            name="cross-encoder-reranker",
+        )
+
+    def _load_model(self):
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+
+            logger.info(f"Loading cross-encoder reranker: {settings.reranker_model}")
+            self._model = CrossEncoder(settings.reranker_model, max_length=settings.reranker_max_length, device="cpu")
+            logger.info("Cross-encoder reranker loaded")
+        return self._model
+
+    def _predict(self, pairs: list[tuple[str, str]]) -> np.ndarray:
+        """ワーカースレッドから呼ばれる同期推論。単一ラベルのcross-encoderはsigmoid済みの確率を返す。"""
+        model = self._load_model()
+        scores = model.predict(pairs, batch_size=max(1, len(pairs)), convert_to_numpy=True, show_progress_bar=False)
+        return np.asarray(scores, dtype=np.float32).reshape(-1)
+
+    async def score(self, query: str, documents: list[str]) -> np.ndarray:
+        """各文書の rerank_score（0-10）"""
+        if not documents:
+            return np.empty(0, dtype=np.float32)
+        probabilities = await self._batcher.submit([(query, d) for d in documents])
+        return np.clip(probabilities, 0.0, 1.0) * 10.0
+
+    async def warm_up(self):
+        await self.score("ウォームアップ", ["ウォームアップ"])
+
+    def stats(self) -> dict:
+        return {"model": settings.reranker_model, "loaded": self._model is not None, **self._batcher.stats()}
+
+
+cross_encoder_reranker = CrossEncoderReranker()
+
+
+def _select(scored_chunks: list[dict], top_n: int) -> list[dict]:
+    """rerank_score降順に並べ、低スコアを除いた上位top_n件"""
+    scored_chunks.sort(key=lambda x: x["rerank_score"], reverse=True)
+    filtered = [c for c in scored_chunks if c["rerank_score"] > _MIN_RERANK_SCORE]
+    return filtered[:top_n] if filtered else scored_chunks[:top_n]
+
+
+def _document_text(chunk: dict) -> str:
+    section = chunk.get("section", "")
+    return f"{section}\n{chunk['content']}" if section else chunk["content"]
+
+
 async def rerank(
     query: str,
     chunks: list[dict],
     top_n: int = 5,
 ) -> list[dict]:
-    """gpt-4o-miniでチャンクの関連度をスコアリングし、上位を返す。
+    """チャンクの関連度をスコアリングし、上位を返す（バックエンドは reranker_backend）。
 
     Args:
         query: 検索クエリ
@@ -42,7 +115,33 @@ async def rerank(
     """
     if len(chunks) <= top_n:
         return chunks
+    if settings.reranker_backend == "cross_encoder":
+        return await _rerank_with_cross_encoder(query, chunks, top_n)
+    return await _rerank_with_llm(query, chunks, top_n)
+
 
+async def _rerank_with_cross_encoder(query: str, chunks: list[dict], top_n: int) -> list[dict]:
+    try:
+        scores = await cross_encoder_reranker.score(query, [_document_text(c) for c in chunks])
+    except Exception as e:
+        logger.warning("Cross-encoder reranker failed, falling back: %s", e)
+        return chunks[:top_n]
+
+    result = _select(
+        [{**chunk, "rerank_score": round(float(score), 2)} for chunk, score in zip(chunks, scores)],
+        top_n,
+    )
+    logger.info(
+        "Reranked %d chunks → %d with cross-encoder (top scores: %s)",
+        len(chunks),
+        len(result),
+        [c.get("rerank_score", 0) for c in result[:3]],
+    )
+    return result
+
+
+async def _rerank_with_llm(query: str, chunks: list[dict], top_n: int) -> list[dict]:
+    """gpt-4o-miniでチャンクの関連度をスコアリングし、上位を返す。"""
     from app.llm.registry import provider_registry
     provider = provider_registry.get_active()
     if not provider:
@@ -75,18 +174,14 @@ async def rerank(
             logger.warning("Reranker returned non-list: %s", content[:100])
             return chunks[:top_n]
 
-        # スコア順にソート
         score_map = {item["index"]: item["score"] for item in scores if "index" in item and "score" in item}
         scored_chunks = [
             {**chunks[idx], "rerank_score": score}
             for idx, score in score_map.items()
             if idx < len(chunks)
         ]
-        scored_chunks.sort(key=lambda x: x["rerank_score"], reverse=True)
-
-        # rerank_scoreが低い（2以下）ものは除外
-        filtered = [c for c in scored_chunks if c["rerank_score"] > 2]
-        result = filtered[:top_n] if filtered else scored_chunks[:top_n]
+        # スコア順に並べ、rerank_scoreが低い（2以下）ものは除外
+        result = _select(scored_chunks, top_n)
 
         logger.info(
             "Reranked %d chunks → %d (top scores: %s)",
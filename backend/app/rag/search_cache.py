@@ -0,0 +1,130 @@
+"""検索結果キャッシュ（車両ごとのコーパスバージョンで無効化）
+
+同じ車両では「エンジンがかからない」や警告灯など同じ症状が繰り返し聞かれるため、
+search / hybrid_search の結果を (車両, 正規化クエリ, 件数, 検索モード, インデックスの版,
+コーパスバージョン) をキーにキャッシュする。
+
+コーパスバージョンは ingest・車両削除のたびに車両単位で進める。キーにバージョンを
+含めるので、更新前に計算された結果が更新後に返ることはない。車両横断検索（vehicle_id なし）は
+どの車両が更新されても無効になるよう、全体バージョンをキーに使う。
+コーパスバージョンはプロセス内にしかないため、他のワーカーが切り替えた版でも無効になるよう
+呼び出し側が現行版の物理キー（エイリアスの解決結果）もキーに含める。
+"""
+
+import sys
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+_ALL_VEHICLES = ""
+
+
+def normalize_query(query: str) -> str:
+    """全角/半角・空白の違いだけのクエリを同じキーにする。"""
+    return " ".join(unicodedata.normalize("NFKC", query).split())
+
+
+def _estimate_bytes(results: list[list[dict]]) -> int:
+    return sum(
+        sys.getsizeof(r) + sum(sys.getsizeof(v) for v in r.values())
+        for hits in results
+        for r in hits
+    )
+
+
+class SearchResultCache:
+    """スレッドセーフな LRU + TTL の検索結果キャッシュ"""
+
+    def __init__(self, max_size: int, ttl_seconds: float):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # key -> (保存時刻, 推定バイト数, 結果)
+        self._entries: OrderedDict[tuple, tuple[float, int, list[dict]]] = OrderedDict()
+        self._versions: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def version(self, vehicle_id: str | None) -> int:
+        with self._lock:
+            return self._versions.get(vehicle_id or _ALL_VEHICLES, 0)
+
+    def key(
+        self, vehicle_id: str | None, query: str, n_results: int, mode: str, index_version: object = None,
+    ) -> tuple:
+        """キャッシュキー。検索を始める前に作ること（計算中に更新されても古い版のキーになる）。
+
+        index_version には検索するインデックスの版（物理キーなど、ハッシュ可能な値）を渡す。
+        """
+        vehicle_key = vehicle_id or _ALL_VEHICLES
+        return (vehicle_key, normalize_query(query), n_results, mode, index_version, self.version(vehicle_id))
+
+    def get(self, key: tuple) -> list[dict] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, size, results = entry
+            if self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self._bytes -= size
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # 呼び出し側が結果の dict を書き換えてもキャッシュが汚れないようにコピーを返す
+        return [dict(r) for r in results]
+
+    def put(self, key: tuple, results: list[dict]):
+        if self.max_size <= 0:
+            return
+        stored = [dict(r) for r in results]
+        size = _estimate_bytes([stored])
+        with self._lock:
+            if key[-1] != self._versions.get(key[0], 0):
+                return  # 計算中にコーパスが更新された
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (time.monotonic(), size, stored)
+            self._bytes += size
+            while len(self._entries) > self.max_size:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def bump(self, vehicle_id: str):
+        """車両のコーパスが変わったことを記録し、その車両と車両横断検索のエントリを捨てる。"""
+        with self._lock:
+            for vehicle_key in (vehicle_id, _ALL_VEHICLES):
+                self._versions[vehicle_key] = self._versions.get(vehicle_key, 0) + 1
+            stale = [k for k in self._entries if k[0] in (vehicle_id, _ALL_VEHICLES)]
+            for k in stale:
+                self._bytes -= self._entries.pop(k)[1]
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.invalidations = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "memory_bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0.0,
+                "invalidations": self.invalidations,
+                "corpus_versions": dict(self._versions),
+            }
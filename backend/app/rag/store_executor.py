@@ -0,0 +1,72 @@
+"""インデックスI/O専用の有界スレッドプール
+
+Chroma の query/get/add/delete は同期的な SQLite/HNSW 操作で、async メソッドから
+そのまま呼ぶとイベントループが止まり、同じノードの全セッションが待たされる。
+VehicleManualStore はインデックス操作をすべてこのプール経由で実行する。
+
+既定の run_in_executor プール（Bedrock呼び出し等と共有）とは分け、
+同時実行数を vector_store_io_workers で制限する。待ち行列の深さは stats() で確認できる。
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from app.config import settings
+
+
+class StoreExecutor:
+    def __init__(self, max_workers: int, name: str = "vector-store-io"):
+        self.max_workers = max(1, max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._max_queued = 0
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """fn(*args) をプールで実行し、結果を返す。"""
+        started = False
+
+        def call():
+            nonlocal started
+            with self._lock:
+                started = True
+                self._queued -= 1
+                self._running += 1
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+
+        with self._lock:
+            self._queued += 1
+            self._max_queued = max(self._max_queued, self._queued)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        except asyncio.CancelledError:
+            # 開始前にキャンセルされたジョブは実行されないので、待ち行列から外す
+            with self._lock:
+                if not started:
+                    self._queued -= 1
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "queued": self._queued,
+                "running": self._running,
+                "completed": self._completed,
+                "max_queued": self._max_queued,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)  # 書き込み中の操作は完了させる
+
+
+store_executor = StoreExecutor(settings.vector_store_io_workers)
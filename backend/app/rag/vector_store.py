@@ -1,158 +1,566 @@
+import asyncio
+import hashlib
 import logging
+import os
+import unicodedata
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
 
-import chromadb
+import numpy as np
 
 from app.config import settings
+from app.rag.batch_planner import plan_length_buckets
+from app.rag.bm25_index import BM25Index
 from app.rag.chunker import Chunk
-from app.rag.embedder import embedder
+from app.rag.embedder import ProgressCallback, embedder
+from app.rag.fusion import reciprocal_rank_fusion
+from app.rag.index_aliases import IndexAliases, split_physical_key
+from app.rag.index_bundle import BundleError, IndexBundle, read_bundle, write_bundle
+from app.rag.index_backends import ChromaIndexBackend, FlatIndexBackend, IndexBackend, IndexHit
 from app.rag.keyword_extractor import extract_keywords
+from app.rag.mmr import mmr_select
+from app.rag.projection import EmbeddingProjection
+from app.rag.query_analysis import QueryAnalysis
+from app.rag.search_cache import SearchResultCache
+from app.rag.store_executor import store_executor
 
 logger = logging.getLogger(__name__)
 
 
-def _reciprocal_rank_fusion(
-    vector_results: list[dict],
-    keyword_results: list[dict],
-    k: int = 60,
-) -> list[dict]:
-    """Reciprocal Rank Fusion (RRF) で2つの検索結果を統合する。
+def chunk_digest(page: int, text: str) -> str:
+    """ページと正規化した本文から決まるチャンクの内容ハッシュ"""
+    normalized = " ".join(unicodedata.normalize("NFKC", text).split())
+    return hashlib.sha256(f"{page}\x1f{normalized}".encode("utf-8")).hexdigest()[:24]
 
-    スコア = 1/(k + rank_vector) + 1/(k + rank_keyword)
-    contentをキーにして重複を排除し、RRFスコアで降順ソート。
+
+def chunk_id(vehicle_id: str, page: int, text: str) -> str:
+    """車両（または版の物理キー）・ページ・正規化した本文から決まる安定したチャンクID。
+
+    同じ内容のチャンクは再ingestしても同じ内容ハッシュになるため、差分更新に使える。
     """
-    scores: dict[str, float] = {}
-    docs: dict[str, dict] = {}
-
-    for rank, doc in enumerate(vector_results):
-        content_key = doc["content"][:100]  # 先頭100文字をキーに
-        scores[content_key] = scores.get(content_key, 0) + 1.0 / (k + rank)
-        if content_key not in docs:
-            docs[content_key] = doc
-
-    for rank, doc in enumerate(keyword_results):
-        content_key = doc["content"][:100]
-        scores[content_key] = scores.get(content_key, 0) + 1.0 / (k + rank)
-        if content_key not in docs:
-            docs[content_key] = doc
-
-    sorted_keys = sorted(scores, key=lambda x: scores[x], reverse=True)
-
-    # Phase 3-2: content_type ブースト
-    # troubleshooting/procedure: ×1.3（診断手順を優先）
-    # specification: ×1.15（ヒューズ表等の仕様情報も軽くブースト）
-    _BOOST_FACTORS: dict[str, float] = {
-        "troubleshooting": 1.3,
-        "procedure": 1.3,
-        "specification": 1.15,
+    return f"{vehicle_id}_{chunk_digest(page, text)}"
+
+
+def _digest_of(stored_id: str) -> str:
+    return stored_id.rsplit("_", 1)[-1]
+
+
+def _logical_id(stored_id: str) -> str:
+    """版の物理キー付きのチャンクID → 版によらない "{vehicle_id}_{内容ハッシュ}" """
+    physical, _, digest = stored_id.rpartition("_")
+    if not physical:
+        return stored_id
+    return f"{split_physical_key(physical)[0]}_{digest}"
+
+
+def _vector_mode(warning_only: bool) -> str:
+    return "vector:warning" if warning_only else "vector"
+
+
+def _to_result(hit: IndexHit, score: float) -> dict:
+    meta = hit.metadata
+    return {
+        "id": _logical_id(hit.id),
+        "content": hit.document,
+        "page": meta.get("page", 0),
+        "section": meta.get("section", ""),
+        "content_type": meta.get("content_type", ""),
+        "has_warning": meta.get("has_warning", False),
+        "score": score,
     }
-    return [
-        {
-            **docs[key],
-            "score": scores[key] * 60 * _BOOST_FACTORS.get(docs[key].get("content_type", ""), 1.0),
-        }
-        for key in sorted_keys
-        if key in docs
-    ]
 
 
 class VehicleManualStore:
     COLLECTION_NAME = "vehicle_manuals"
 
     def __init__(self):
-        self._client: chromadb.ClientAPI | None = None
-        self._collection: chromadb.Collection | None = None
+        self._backend: IndexBackend | None = None
+        self._bm25: BM25Index | None = None
+        self._prefetch_tasks: set[asyncio.Task] = set()
+        self._projection: EmbeddingProjection | None = None
+        self._aliases: IndexAliases | None = None
+        self._building: set[str] = set()  # 構築中の版の物理キー（掃除の対象外）
+        self._result_cache = SearchResultCache(
+            max_size=settings.search_cache_size,
+            ttl_seconds=settings.search_cache_ttl_seconds,
+        )
+
+    @property
+    def collection_name(self) -> str:
+        # 射影後のベクトルは次元が異なるため、別コレクションに格納する
+        if settings.embedding_projection == "none":
+            return self.COLLECTION_NAME
+        return f"{self.COLLECTION_NAME}_{settings.embedding_projection}{settings.embedding_projection_dim}"
 
     def initialize(self):
-        self._client = chromadb.PersistentClient(path=settings.chroma_persist_dir)
-        self._collection = self._client.get_or_create_collection(
-            name=self.COLLECTION_NAME,
-            metadata={"hnsw:space": "cosine"},
+        memory_budget_bytes = settings.vector_store_memory_budget_mb * 1024 * 1024
+        if settings.vector_store_backend == "flat":
+            index_dir = settings.flat_index_dir
+            self._backend = FlatIndexBackend(
+                os.path.join(index_dir, self.collection_name),
+                memory_budget_bytes=memory_budget_bytes,
+                quantization=settings.vector_store_quantization,
+                rescore_factor=settings.vector_store_rescore_factor,
+            )
+        elif settings.vector_store_backend == "chroma":
+            index_dir = settings.chroma_persist_dir
+            if settings.vector_store_quantization != "none":
+                logger.warning("vector_store_quantization is only supported by the flat backend; ignoring")
+            self._backend = ChromaIndexBackend(
+                index_dir,
+                self.collection_name,
+                per_vehicle=settings.vector_store_shard_per_vehicle,
+                memory_budget_bytes=memory_budget_bytes,
+            )
+        else:
+            raise ValueError(f"Unknown vector_store_backend: {settings.vector_store_backend}")
+        self._bm25 = BM25Index(os.path.join(index_dir, f"{self.collection_name}_bm25"))
+        self._aliases = IndexAliases(os.path.join(index_dir, f"{self.collection_name}_aliases.json"))
+        self._projection = EmbeddingProjection(
+            mode=settings.embedding_projection,
+            dim=settings.embedding_projection_dim,
+            path=os.path.join(index_dir, f"{self.collection_name}_projection.npz"),
         )
 
-    def _get_collection(self) -> chromadb.Collection:
-        if self._collection is None:
+    def _get_projection(self) -> EmbeddingProjection:
+        if self._projection is None:
+            self.initialize()
+        return self._projection  # type: ignore
+
+    def _get_backend(self) -> IndexBackend:
+        if self._backend is None:
+            self.initialize()
+        return self._backend  # type: ignore
+
+    def _get_bm25(self) -> BM25Index:
+        if self._bm25 is None:
+            self.initialize()
+        return self._bm25  # type: ignore
+
+    def _get_aliases(self) -> IndexAliases:
+        if self._aliases is None:
             self.initialize()
-        return self._collection  # type: ignore
+        return self._aliases  # type: ignore
 
-    async def add_chunks(self, chunks: list[Chunk], vehicle_id: str, make: str = "", model: str = "", year: int = 0):
-        if not chunks:
+    def _physical(self, vehicle_id: str | None) -> str | None:
+        """車両IDを現行版の物理キーに解決する（車両横断検索は None のまま）。"""
+        return self._get_aliases().resolve(vehicle_id) if vehicle_id else None
+
+    def _index_version(self, vehicle_id: str | None) -> str | tuple[str, ...]:
+        """検索結果キャッシュのキーに含める現行版（他のワーカーが版を切り替えても別のキーになる）"""
+        if vehicle_id:
+            return self._physical(vehicle_id)
+        return tuple(sorted(entry["physical"] for entry in self._get_aliases().entries().values()))
+
+    def _fetch_live(
+        self, fetch: Callable[[int], list[list[IndexHit]]], n_results: int,
+    ) -> list[list[IndexHit]]:
+        """車両横断検索の結果から構築中・削除待ちの版を除き、クエリごとに上位 n_results 件を返す。
+
+        fetch(limit) はクエリごとの上位 limit 件を返す。除いた分だけ件数が足りなければ
+        limit を倍にして取り直す（インデックスに残りがなくなった時点で打ち切る）。
+        """
+        limit = n_results
+        while True:
+            per_query = fetch(limit)
+            aliases = self._get_aliases()
+            live = [[h for h in hits if aliases.is_live(h.metadata.get("vehicle_id", ""))] for hits in per_query]
+            if all(len(kept) >= n_results or len(hits) < limit for kept, hits in zip(live, per_query)):
+                return [kept[:n_results] for kept in live]
+            limit *= 2
+
+    def _query_live(
+        self, query_embeddings: np.ndarray, physical: str | None, n_results: int, warning_only: bool,
+    ) -> list[list[IndexHit]]:
+        backend = self._get_backend()
+        if physical is not None:
+            return backend.query(query_embeddings, physical, n_results, warning_only)
+        return self._fetch_live(
+            lambda limit: backend.query(query_embeddings, None, limit, warning_only), n_results,
+        )
+
+    def _stored_id(self, logical_id: str) -> str:
+        """検索結果のチャンクID → 現行版に保存されているID"""
+        vehicle_id, _, digest = logical_id.rpartition("_")
+        if not vehicle_id:
+            return logical_id
+        return f"{self._get_aliases().resolve(vehicle_id)}_{digest}"
+
+    async def _embed_chunks(
+        self,
+        chunks: list[Chunk],
+        progress_callback: ProgressCallback | None = None,
+    ) -> np.ndarray:
+        """トークン長でバケット分けしてembeddingし、元のチャンク順の行列で返す。"""
+        texts = [c.text for c in chunks]
+        # トークナイズはCPU処理なのでイベントループを塞がないようスレッドで行う
+        lengths = await asyncio.to_thread(embedder.token_lengths, texts)
+        buckets = plan_length_buckets(
+            lengths,
+            token_budget=settings.embedding_batch_token_budget,
+            max_batch_size=settings.embedding_batch_max_size,
+        )
+        embeddings: np.ndarray | None = None
+        done = 0
+        for bucket in buckets:
+            bucket_progress = None
+            if progress_callback:
+                def bucket_progress(n: int, _total: int, offset: int = done):
+                    progress_callback(offset + n, len(chunks))
+            vectors = await embedder.embed([texts[i] for i in bucket], progress_callback=bucket_progress)
+            if embeddings is None:
+                embeddings = np.empty((len(chunks), vectors.shape[1]), dtype=np.float32)
+            embeddings[bucket] = vectors
+            done += len(bucket)
+        return embeddings  # type: ignore[return-value]
+
+    async def upsert_chunks(
+        self,
+        chunks: list[Chunk],
+        vehicle_id: str,
+        make: str = "",
+        model: str = "",
+        year: int = 0,
+        progress_callback: ProgressCallback | None = None,
+    ) -> dict:
+        """チャンクの内容ハッシュの差分で車両のインデックスを更新する。
+
+        変更があれば新しい版を別の物理キーに構築し、検証後にエイリアスを切り替える
+        （_publish_version）。未変更チャンクのベクトルは現行版からコピーし、新規チャンクだけを
+        embeddingする。切り替えまで検索は現行版を返し、失敗しても現行版は残る。
+        Returns: {"added", "removed", "unchanged"} の件数
+        """
+        backend = self._get_backend()
+        incoming: dict[str, Chunk] = {}
+        for c in chunks:
+            incoming.setdefault(chunk_digest(c.page, c.text), c)  # 同一ページの重複チャンクは1件に
+        current = self._physical(vehicle_id)
+        stored = {_digest_of(i): i for i in await store_executor.run(backend.list_ids, current)}
+
+        new_digests = [d for d in incoming if d not in stored]
+        removed = [d for d in stored if d not in incoming]
+        counts = {
+            "added": len(new_digests),
+            "removed": len(removed),
+            "unchanged": len(incoming) - len(new_digests),
+        }
+        if not new_digests and not removed:
+            return counts
+
+        async def build(physical: str) -> int:
+            digests = list(incoming)
+            if not digests:
+                return 0  # 全チャンクが消えた（テキストを抽出できないPDFなど）: 空の版に切り替える
+            kept = {d: stored[d] for d in digests if d in stored}
+            reused = await store_executor.run(backend.get_embeddings, list(kept.values()), current) if kept else {}
+            to_embed = [d for d in digests if kept.get(d) not in reused]
+            vectors: dict[str, np.ndarray] = {d: reused[kept[d]] for d in digests if kept.get(d) in reused}
+            if to_embed:
+                embedded = await self._embed_passages([incoming[d] for d in to_embed], progress_callback)
+                vectors.update(zip(to_embed, embedded))
+            await self._write_chunks(
+                physical, digests, [incoming[d] for d in digests],
+                np.stack([vectors[d] for d in digests]), make, model, year,
+            )
+            await store_executor.run(self._build_bm25, physical)
+            return len(digests)
+
+        await self._publish_version(vehicle_id, build, embedding_model=embedder.model_name)
+        return counts
+
+    async def reembed_vehicle(self, vehicle_id: str, progress_callback: ProgressCallback | None = None) -> dict:
+        """現行版の全チャンクを現在のembeddingモデルで計算し直した版に切り替える。
+
+        local_embedding_model 等を変更した後、PDFなしでバックグラウンド実行できる。
+        （共有Chromaコレクションは次元が固定のため、次元の変わるモデル変更には使えない）
+        """
+        current = self._physical(vehicle_id)
+        hits = await store_executor.run(self._get_backend().get, current)
+        if not hits:
+            raise ValueError(f"No chunks stored for vehicle: {vehicle_id}")
+        chunks = [
+            Chunk(
+                text=h.document,
+                page=h.metadata.get("page", 0),
+                section=h.metadata.get("section", ""),
+                content_type=h.metadata.get("content_type", "general"),
+                has_warning=h.metadata.get("has_warning", False),
+            )
+            for h in hits
+        ]
+        digests = [_digest_of(h.id) for h in hits]
+        meta = hits[0].metadata
+        model_name = embedder.model_name
+
+        async def build(physical: str) -> int:
+            embeddings = await self._embed_passages(chunks, progress_callback)
+            await self._write_chunks(
+                physical, digests, chunks, embeddings, meta.get("make", ""), meta.get("model", ""), meta.get("year", 0),
+            )
+            await store_executor.run(self._build_bm25, physical)
+            return len(chunks)
+
+        await self._publish_version(vehicle_id, build, embedding_model=model_name)
+        return {"vehicle_id": vehicle_id, "chunks": len(chunks), "embedding_model": model_name}
+
+    async def reembed_vehicles(self, vehicle_ids: list[str]) -> dict:
+        """複数車両を順に再embeddingする（1台の失敗で止めない。管理APIのバックグラウンド実行用）。"""
+        done: list[str] = []
+        failed: dict[str, str] = {}
+        for vehicle_id in vehicle_ids:
+            try:
+                await self.reembed_vehicle(vehicle_id)
+                done.append(vehicle_id)
+            except Exception as e:
+                logger.error("Re-embedding %s failed, keeping the current version: %s", vehicle_id, e)
+                failed[vehicle_id] = str(e)
+        return {"reembedded": done, "failed": failed}
+
+    async def list_vehicles(self) -> list[str]:
+        """インデックスに登録されている車両ID（版管理導入前の車両を含む）"""
+        keys = await store_executor.run(self._get_backend().list_vehicles)
+        aliases = self._get_aliases()
+        return sorted({split_physical_key(k)[0] for k in keys if aliases.is_live(k)})
+
+    async def _publish_version(
+        self,
+        vehicle_id: str,
+        build: Callable[[str], Awaitable[int]],
+        **info,
+    ) -> str:
+        """新しい版を別の物理キーに構築し、検証してからエイリアスを切り替える。
+
+        build(physical) は版にチャンクを書き込み、書き込んだ件数を返す。構築・検証に失敗したら
+        途中の版を削除して例外を送出する（現行版は変わらない）。切り替え後に旧版を削除する。
+        他のワーカーがより新しい版に切り替え済みなら、切り替えずにこの版を削除する。
+        """
+        aliases = self._get_aliases()
+        physical = aliases.reserve(vehicle_id)
+        self._building.add(physical)
+        try:
+            await store_executor.run(self._drop_physical, physical)  # 中断した前回の構築の残骸
+            expected = await build(physical)
+            await store_executor.run(self._validate_version, physical, expected)
+            stale = aliases.swap(vehicle_id, physical, **info)
+        except BaseException:
+            await store_executor.run(self._drop_physical, physical)
+            raise
+        finally:
+            self._building.discard(physical)
+
+        if stale == physical:
+            logger.warning("Index version %s was superseded by %s", physical, aliases.resolve(vehicle_id))
+        else:
+            self._result_cache.bump(vehicle_id)
+            logger.info("Switched %s to index version %s", vehicle_id, physical)
+        # 削除直前にエイリアスを読み直し、現行版より古い版だけを消す
+        if stale is not None and aliases.is_obsolete(stale):
+            try:
+                await store_executor.run(self._drop_physical, stale)
+            except Exception as e:
+                # 残った旧版は collect_garbage で回収できる
+                logger.warning("Failed to drop old index version %s: %s", stale, e)
+        return aliases.resolve(vehicle_id)
+
+    def _validate_version(self, physical: str, expected: int):
+        backend = self._get_backend()
+        ids = backend.list_ids(physical)
+        if len(ids) != expected:
+            raise RuntimeError(f"Index version {physical} has {len(ids)} chunks, expected {expected}")
+        if not expected:
             return
+        if not self._get_bm25().has(physical):
+            raise RuntimeError(f"Index version {physical} has no keyword index")
+        probe = backend.get_embeddings(ids[:1], physical)
+        if not backend.query(np.stack(list(probe.values())), physical, 1)[0]:
+            raise RuntimeError(f"Index version {physical} returned no results for a stored vector")
+
+    def _drop_physical(self, physical: str):
+        self._get_backend().delete_vehicle(physical)
+        self._get_bm25().delete_vehicle(physical)
 
-        collection = self._get_collection()
-        batch_size = 50
-        for i in range(0, len(chunks), batch_size):
-            batch = chunks[i : i + batch_size]
-            texts = [c.text for c in batch]
-            embeddings = await embedder.embed(texts)
-
-            ids = [f"{vehicle_id}_{i + j}" for j, _ in enumerate(batch)]
-            metadatas = [
-                {
-                    "vehicle_id": vehicle_id,
-                    "make": make,
-                    "model": model,
-                    "year": year,
-                    "page": c.page,
-                    "section": c.section,
-                    "content_type": c.content_type,
-                    "has_warning": c.has_warning,
-                }
-                for c in batch
-            ]
-
-            collection.add(
-                ids=ids,
-                embeddings=embeddings,
-                documents=texts,
-                metadatas=metadatas,
+    async def _embed_passages(
+        self,
+        chunks: list[Chunk],
+        progress_callback: ProgressCallback | None = None,
+    ) -> np.ndarray:
+        """チャンクをembeddingし、インデックスと同じ射影をかけて返す。"""
+        embeddings = await self._embed_chunks(chunks, progress_callback)
+        # 次元削減（PCAは初回ingestのembeddingで学習）
+        projection = self._get_projection()
+        if projection.needs_fit:
+            await store_executor.run(projection.fit, embeddings)
+        if projection.enabled:
+            embeddings = projection.transform(embeddings)
+        return embeddings
+
+    async def _write_chunks(
+        self,
+        physical: str,
+        digests: list[str],
+        chunks: list[Chunk],
+        embeddings: np.ndarray,
+        make: str,
+        model: str,
+        year: int,
+    ):
+        metadatas = [
+            {
+                "vehicle_id": physical,
+                "make": make,
+                "model": model,
+                "year": year,
+                "page": c.page,
+                "section": c.section,
+                "content_type": c.content_type,
+                "has_warning": c.has_warning,
+            }
+            for c in chunks
+        ]
+        await store_executor.run(
+            self._add_rows,
+            physical,
+            [f"{physical}_{d}" for d in digests],
+            embeddings,
+            [c.text for c in chunks],
+            metadatas,
+        )
+
+    def _add_rows(
+        self,
+        physical: str,
+        ids: list[str],
+        embeddings: np.ndarray,
+        documents: list[str],
+        metadatas: list[dict],
+    ):
+        """版にチャンクを書き込む（バックエンドの add_batch_size ごと。flat は1回で書く）。"""
+        backend = self._get_backend()
+        batch_size = backend.add_batch_size or max(1, len(ids))
+        for i in range(0, len(ids), batch_size):
+            backend.add(
+                physical,
+                ids[i : i + batch_size],
+                embeddings[i : i + batch_size],
+                documents[i : i + batch_size],
+                metadatas[i : i + batch_size],
             )
 
+    async def collect_garbage(self) -> dict:
+        """現行版より古い版（旧版の削除に失敗した残りなど）を削除する。
+
+        現行版より新しい版は他のワーカーが構築中の可能性があるため残す。判定は1件ごとに
+        エイリアスファイルを読み直して行う。
+        """
+
+        def collect() -> list[str]:
+            aliases = self._get_aliases()
+            dropped = []
+            for key in self._get_backend().list_vehicles():
+                if key not in self._building and aliases.is_obsolete(key):
+                    self._drop_physical(key)
+                    dropped.append(key)
+            return dropped
+
+        dropped = await store_executor.run(collect)
+        if dropped:
+            logger.info("Dropped %d unreferenced index versions: %s", len(dropped), dropped)
+        return {"dropped": dropped}
+
+    async def _query_embedding(self, query: str, analysis: QueryAnalysis | None = None) -> np.ndarray:
+        """射影済みのクエリembedding（analysis があれば同じリクエスト内で使い回す）"""
+        if analysis is not None and query in analysis.embeddings:
+            return analysis.embeddings[query]
+        query_embedding = await embedder.embed_single(query)
+        projection = self._get_projection()
+        if projection.enabled:
+            query_embedding = projection.transform(query_embedding[None, :])[0]
+        if analysis is not None:
+            analysis.embeddings[query] = query_embedding
+        return query_embedding
+
+    async def _query_embeddings(self, queries: list[str], analysis: QueryAnalysis | None = None) -> np.ndarray:
+        known = analysis.embeddings if analysis is not None else {}
+        missing = [q for q in queries if q not in known]
+        computed: dict[str, np.ndarray] = {}
+        if missing:
+            embeddings = await embedder.embed_queries(missing)
+            projection = self._get_projection()
+            if projection.enabled:
+                embeddings = projection.transform(embeddings)
+            computed = dict(zip(missing, embeddings))
+            if analysis is not None:
+                analysis.embeddings.update(computed)
+        return np.stack([known[q] if q in known else computed[q] for q in queries])
+
     async def search(
         self,
         query: str,
         vehicle_id: str | None = None,
         n_results: int = 5,
         warning_only: bool = False,
+        analysis: QueryAnalysis | None = None,
     ) -> list[dict]:
-        collection = self._get_collection()
-        query_embedding = await embedder.embed_single(query)
-
-        where_filter: dict | None = None
-        conditions = []
-        if vehicle_id:
-            conditions.append({"vehicle_id": vehicle_id})
-        if warning_only:
-            conditions.append({"has_warning": True})
-
-        if len(conditions) == 1:
-            where_filter = conditions[0]
-        elif len(conditions) > 1:
-            where_filter = {"$and": conditions}
-
-        kwargs: dict = {
-            "query_embeddings": [query_embedding],
-            "n_results": n_results,
-        }
-        if where_filter:
-            kwargs["where"] = where_filter
+        physical = self._physical(vehicle_id)
+        cache_key = self._result_cache.key(
+            vehicle_id, query, n_results, _vector_mode(warning_only), self._index_version(vehicle_id),
+        )
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            return cached
 
-        results = collection.query(**kwargs)
+        query_embedding = await self._query_embedding(query, analysis)
 
-        documents = results.get("documents", [[]])[0]
-        metadatas = results.get("metadatas", [[]])[0]
-        distances = results.get("distances", [[]])[0]
+        hits = (await store_executor.run(
+            self._query_live, query_embedding[None, :], physical, n_results, warning_only,
+        ))[0]
+        results = [_to_result(hit, hit.score) for hit in hits]
+        self._result_cache.put(cache_key, results)
+        return results
 
-        return [
-            {
-                "content": doc,
-                "page": meta.get("page", 0),
-                "section": meta.get("section", ""),
-                "content_type": meta.get("content_type", ""),
-                "has_warning": meta.get("has_warning", False),
-                "score": 1 - dist,
-            }
-            for doc, meta, dist in zip(documents, metadatas, distances)
+    async def search_many(
+        self,
+        queries: list[str],
+        vehicle_id: str | None = None,
+        n_results_per_query: int | list[int] = 5,
+        warning_only: bool = False,
+        analysis: QueryAnalysis | None = None,
+    ) -> list[list[dict]]:
+        """複数クエリをまとめてベクトル検索し、クエリごとの結果リストを返す。
+
+        embeddingは1バッチ、インデックス検索は1回の複数クエリ問い合わせで行う。
+        n_results_per_query にリストを渡すとクエリごとに件数を変えられる。
+        結果キャッシュにあるクエリは検索しない（search と同じキャッシュを共有する）。
+        """
+        if not queries:
+            return []
+        if isinstance(n_results_per_query, int):
+            n_results_per_query = [n_results_per_query] * len(queries)
+
+        mode = _vector_mode(warning_only)
+        physical = self._physical(vehicle_id)
+        index_version = self._index_version(vehicle_id)
+        cache_keys = [
+            self._result_cache.key(vehicle_id, q, n, mode, index_version) for q, n in zip(queries, n_results_per_query)
         ]
+        results: list[list[dict] | None] = [self._result_cache.get(k) for k in cache_keys]
+        missing = [i for i, r in enumerate(results) if r is None]
+        if not missing:
+            return results  # type: ignore[return-value]
+
+        query_embeddings = await self._query_embeddings([queries[i] for i in missing], analysis)
+
+        per_query_hits = await store_executor.run(
+            self._query_live,
+            query_embeddings,
+            physical,
+            max(n_results_per_query[i] for i in missing),
+            warning_only,
+        )
+        for i, hits in zip(missing, per_query_hits):
+            results[i] = [_to_result(hit, hit.score) for hit in hits[: n_results_per_query[i]]]
+            self._result_cache.put(cache_keys[i], results[i])
+        return results  # type: ignore[return-value]
 
     async def keyword_search(
         self,
@@ -160,72 +568,265 @@ class VehicleManualStore:
         vehicle_id: str | None = None,
         n_results: int = 5,
     ) -> list[dict]:
-        """ChromaDB where_document $contains によるキーワード検索"""
-        collection = self._get_collection()
-
-        where_filter: dict | None = None
-        if vehicle_id:
-            where_filter = {"vehicle_id": vehicle_id}
-
-        where_document = {"$contains": keyword}
+        """BM25索引によるキーワード検索（score はBM25スコア）
 
+        vehicle_id 未指定の場合のみ、本文の部分一致検索（固定スコア）にフォールバックする。
+        """
         try:
-            results = collection.get(
-                where=where_filter,
-                where_document=where_document,
-                limit=n_results,
-                include=["documents", "metadatas"],
-            )
+            return await store_executor.run(self._keyword_search_sync, keyword, vehicle_id, n_results)
         except Exception as e:
             logger.warning("Keyword search failed for '%s': %s", keyword, e)
             return []
 
-        documents = results.get("documents", [])
-        metadatas = results.get("metadatas", [])
-
-        return [
-            {
-                "content": doc,
-                "page": meta.get("page", 0),
-                "section": meta.get("section", ""),
-                "content_type": meta.get("content_type", ""),
-                "has_warning": meta.get("has_warning", False),
-                "score": 0.5,  # キーワード検索はスコアなし、固定値
-            }
-            for doc, meta in zip(documents, metadatas)
-        ]
+    def _keyword_search_sync(self, keyword: str, vehicle_id: str | None, n_results: int) -> list[dict]:
+        backend = self._get_backend()
+        if not vehicle_id:
+            hits = self._fetch_live(lambda limit: [backend.find_containing(keyword, limit=limit)], n_results)[0]
+            return [_to_result(hit, 0.5) for hit in hits]
+
+        physical = self._physical(vehicle_id)
+        bm25 = self._ensure_bm25(physical)
+        ranked = dict(bm25.search(keyword, physical, n_results=n_results))
+        hits = backend.get_by_ids(list(ranked), physical)
+        return [_to_result(hit, ranked[hit.id]) for hit in hits]
+
+    def _load_bm25_documents(self, physical: str) -> tuple[list[str], list[str]]:
+        hits = self._get_backend().get(physical)
+        if hits:
+            logger.info("Building BM25 index for %s (%d chunks)", physical, len(hits))
+        return [h.id for h in hits], [h.document for h in hits]
+
+    def _build_bm25(self, physical: str):
+        """版の保存済みチャンクからBM25索引を作り直す。"""
+        ids, documents = self._load_bm25_documents(physical)
+        if ids:
+            self._get_bm25().build(physical, ids, documents)
+
+    def _ensure_bm25(self, physical: str) -> BM25Index:
+        """索引導入前のデータは初回のキーワード検索時に構築する（並行呼び出しでも1回だけ）。"""
+        bm25 = self._get_bm25()
+        bm25.ensure(physical, lambda: self._load_bm25_documents(physical))
+        return bm25
 
     async def hybrid_search(
         self,
         query: str,
         vehicle_id: str | None = None,
         n_results: int = 10,
+        vector_results: list[dict] | None = None,
+        analysis: QueryAnalysis | None = None,
     ) -> list[dict]:
-        """ベクトル検索 + キーワード検索をRRFで統合するハイブリッド検索"""
-        # 1. ベクトル検索
-        vector_results = await self.search(query, vehicle_id, n_results=n_results)
+        """ベクトル検索 + キーワード検索をRRFで統合するハイブリッド検索
+
+        vector_results を渡した場合（search_many で取得済みなど）はベクトル検索を省略する。
+        その場合も結果は同じキーでキャッシュされるため、vector_results は
+        search(query, vehicle_id, n_results) と同じ結果であること。
+        """
+        cache_key = self._result_cache.key(vehicle_id, query, n_results, "hybrid", self._index_version(vehicle_id))
+        cached = self._result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # 1. ベクトル検索と各キーワード検索を並行実行
+        keywords = analysis.keywords_for(query) if analysis is not None else extract_keywords(query, max_keywords=3)
+        keyword_tasks = [self.keyword_search(kw, vehicle_id, n_results=5) for kw in keywords]
+        if vector_results is None:
+            vector_results, *per_keyword = await asyncio.gather(
+                self.search(query, vehicle_id, n_results=n_results, analysis=analysis), *keyword_tasks,
+            )
+        else:
+            per_keyword = await asyncio.gather(*keyword_tasks)
 
-        # 2. キーワード検索
-        keywords = extract_keywords(query, max_keywords=3)
-        keyword_results: list[dict] = []
-        for kw in keywords:
-            kw_results = await self.keyword_search(kw, vehicle_id, n_results=5)
-            keyword_results.extend(kw_results)
+        # 2. キーワード検索結果をキーワードの優先順に連結
+        keyword_results: list[dict] = [r for results in per_keyword for r in results]
 
         if not keyword_results:
-            return vector_results
+            merged = vector_results
+        else:
+            # 3. RRF (Reciprocal Rank Fusion) で統合
+            merged = reciprocal_rank_fusion([vector_results, keyword_results], k=60, top_n=n_results)
+        self._result_cache.put(cache_key, merged)
+        return merged
+
+    async def diversify(
+        self,
+        query: str,
+        chunks: list[dict],
+        vehicle_id: str | None = None,
+        lambda_mult: float | None = None,
+        top_n: int | None = None,
+        analysis: QueryAnalysis | None = None,
+    ) -> list[dict]:
+        """保存済みembeddingを使ったMMRで候補を選び直す（リランク前の重複除去）。
+
+        embeddingが見つからない候補（IDのない結果など）は判断できないため末尾に残す。
+        """
+        if not settings.mmr_enabled or len(chunks) <= 1:
+            return chunks
+        lambda_mult = settings.mmr_lambda if lambda_mult is None else lambda_mult
+        top_n = settings.mmr_top_n if top_n is None else top_n
+
+        ids = [self._stored_id(c["id"]) if c.get("id") else None for c in chunks]
+        stored = await store_executor.run(
+            self._get_backend().get_embeddings, [i for i in ids if i], self._physical(vehicle_id),
+        )
+        known = [n for n, i in enumerate(ids) if i in stored]
+        unknown = [chunks[n] for n, i in enumerate(ids) if i not in stored]
+        if len(known) <= 1:
+            return chunks
+
+        query_embedding = await self._query_embedding(query, analysis)
+
+        selected = mmr_select(
+            query_embedding,
+            np.stack([stored[ids[n]] for n in known]),
+            lambda_mult=lambda_mult,
+            top_n=top_n,
+            duplicate_threshold=settings.mmr_duplicate_threshold,
+        )
+        return [chunks[known[i]] for i in selected] + unknown
+
+    async def warm_up(self, vehicle_ids: list[str]):
+        """各車両のインデックスに1回ずつクエリを投げ、インデックスをメモリにロードしておく。"""
+        for vehicle_id in vehicle_ids:
+            await self.search("エンジン", vehicle_id=vehicle_id, n_results=1)
 
-        # 3. RRF (Reciprocal Rank Fusion) で統合
-        merged = _reciprocal_rank_fusion(vector_results, keyword_results, k=60)
-        return merged[:n_results]
+    async def prefetch(self, vehicle_id: str):
+        """車両のシャードを読み込んでおく（セッションで車両が選ばれた時点で呼ぶ）。"""
+        try:
+            await store_executor.run(self._get_backend().prefetch, self._physical(vehicle_id))
+        except Exception as e:
+            logger.warning("Prefetch failed for %s: %s", vehicle_id, e)
+
+    def schedule_prefetch(self, vehicle_id: str):
+        """prefetch をバックグラウンドで開始する（応答は待たせない）。"""
+        task = asyncio.get_running_loop().create_task(self.prefetch(vehicle_id))
+        self._prefetch_tasks.add(task)
+        task.add_done_callback(self._prefetch_tasks.discard)
+
+    async def get_chunks(self, vehicle_id: str, content_type: str | None = None) -> list[dict]:
+        """車両のチャンクを検索結果と同じ形式で全件返す（管理・評価用）。"""
+        hits = await store_executor.run(self._get_backend().get, self._physical(vehicle_id), content_type)
+        return [_to_result(hit, 0.0) for hit in hits]
+
+    async def delete_vehicle(self, vehicle_id: str):
+        physical = self._get_aliases().remove(vehicle_id)
+        await store_executor.run(self._drop_physical, physical)
+        self._result_cache.bump(vehicle_id)
+
+    async def export_bundle(self, vehicle_id: str, path: str) -> dict:
+        """車両のチャンク・embedding・BM25索引をバンドルファイルに書き出す。"""
+        return await store_executor.run(self._export_bundle_sync, vehicle_id, path, embedder.model_name)
+
+    def _export_bundle_sync(self, vehicle_id: str, path: str, model_name: str) -> dict:
+        backend = self._get_backend()
+        physical = self._physical(vehicle_id)
+        hits = backend.get(physical)
+        if not hits:
+            raise ValueError(f"No chunks stored for vehicle: {vehicle_id}")
+        ids = [h.id for h in hits]
+        stored = backend.get_embeddings(ids, physical)
+        bm25 = self._ensure_bm25(physical)
+
+        # バンドルには版の物理キーではなく車両IDで書き出す
+        def logical(stored_id: str) -> str:
+            return f"{vehicle_id}_{_digest_of(stored_id)}"
+
+        write_bundle(path, IndexBundle(
+            manifest={
+                "vehicle_id": vehicle_id,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "embedding_model": model_name,
+                "embedding_projection": settings.embedding_projection,
+                "embedding_projection_dim": settings.embedding_projection_dim,
+            },
+            ids=[logical(i) for i in ids],
+            documents=[h.document for h in hits],
+            metadatas=[{**h.metadata, "vehicle_id": vehicle_id} for h in hits],
+            embeddings=np.stack([stored[i] for i in ids]),
+            bm25=bm25.dump(physical, rename=logical),
+            projection=self._get_projection().export_state(),
+        ))
+        logger.info("Exported %d chunks of %s to %s", len(ids), vehicle_id, path)
+        return {"vehicle_id": vehicle_id, "chunks": len(ids), "path": path, "bytes": os.path.getsize(path)}
+
+    async def import_bundle(self, path: str, verify: bool = True) -> dict:
+        """バンドルの車両を新しい版として取り込む（embeddingは再計算しない）。既存の同じ車両は置き換える。"""
+        model_name = embedder.model_name
+        bundle = await store_executor.run(self._open_bundle, path, verify, model_name)
+
+        def build(physical: str) -> int:
+            def versioned(stored_id: str) -> str:
+                return f"{physical}_{_digest_of(stored_id)}"
+
+            self._add_rows(
+                physical,
+                [versioned(c) for c in bundle.ids],
+                bundle.embeddings,
+                bundle.documents,
+                [{**m, "vehicle_id": physical} for m in bundle.metadatas],
+            )
+            if bundle.bm25 is not None:
+                self._get_bm25().restore(physical, bundle.bm25, rename=versioned)
+            else:
+                self._build_bm25(physical)
+            return len(bundle.ids)
+
+        async def build_async(physical: str) -> int:
+            return await store_executor.run(build, physical)
+
+        await self._publish_version(bundle.vehicle_id, build_async, embedding_model=model_name)
+        logger.info("Imported %d chunks of %s from %s", len(bundle.ids), bundle.vehicle_id, path)
+        return {
+            "vehicle_id": bundle.vehicle_id,
+            "chunks": len(bundle.ids),
+            "created_at": bundle.manifest.get("created_at"),
+        }
 
-    def delete_vehicle(self, vehicle_id: str):
-        collection = self._get_collection()
-        collection.delete(where={"vehicle_id": vehicle_id})
+    def _open_bundle(self, path: str, verify: bool, model_name: str) -> IndexBundle:
+        bundle = read_bundle(path, verify=verify)
+        manifest = bundle.manifest
+        # クエリembeddingと同じ空間でなければ検索できないので、モデルと射影の一致を確認する
+        if manifest["embedding_model"] != model_name:
+            raise BundleError(
+                f"Bundle was built with {manifest['embedding_model']}, this node uses {model_name}"
+            )
+        projection = self._get_projection()
+        if manifest["embedding_projection"] != settings.embedding_projection or (
+            projection.enabled and manifest["embedding_projection_dim"] != settings.embedding_projection_dim
+        ):
+            raise BundleError(
+                f"Bundle projection {manifest['embedding_projection']}/{manifest['embedding_projection_dim']} "
+                f"does not match {settings.embedding_projection}/{settings.embedding_projection_dim}"
+            )
+        if bundle.projection is not None:
+            try:
+                projection.import_state(bundle.projection)
+            except ValueError as e:
+                raise BundleError(str(e)) from e
+        elif projection.needs_fit:
+            raise BundleError("Bundle has no fitted PCA projection")
+        return bundle
+
+    async def get_stats(self) -> dict:
+        model_name = embedder.model_name
+        versions = {
+            vehicle_id: {**entry, "stale": entry.get("embedding_model") not in (None, model_name)}
+            for vehicle_id, entry in self._get_aliases().entries().items()
+        }
+        return {
+            "total_chunks": await store_executor.run(self._get_backend().count),
+            "backend": settings.vector_store_backend,
+            "collection": self.collection_name,
+            "embedding_projection": settings.embedding_projection,
+            "shards": self._get_backend().stats(),
+            "io_executor": store_executor.stats(),
+            "search_cache": self._result_cache.stats(),
+            "versions": versions,
+        }
 
-    def get_stats(self) -> dict:
-        collection = self._get_collection()
-        return {"total_chunks": collection.count()}
+    def cache_stats(self) -> dict:
+        return self._result_cache.stats()
 
 
 vector_store = VehicleManualStore()
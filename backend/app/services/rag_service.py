@@ -1,13 +1,17 @@
+import asyncio
 import json
 import logging
+from typing import Awaitable, TypeVar
 
 from app.config import settings
-from app.rag.keyword_extractor import extract_keywords
+from app.rag.query_analysis import QueryAnalysis
 from app.rag.reranker import rerank
 from app.rag.vector_store import vector_store
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
 _ALT_QUERY_PROMPT = """車両トラブル診断のための検索クエリを生成してください。
 
 元の症状: {symptom}
@@ -42,6 +46,49 @@ async def _generate_alt_queries(symptom: str) -> list[str]:
     return []
 
 
+async def _stage(name: str, awaitable: Awaitable[T], timeout: float, default: T) -> T:
+    """ステージを待ち時間上限つきで実行する。上限を超えたら default で続行する（timeout <= 0 で無制限）。"""
+    if timeout <= 0:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("RAG stage '%s' timed out after %.1fs, continuing without it", name, timeout)
+        return default
+
+
+async def _rerank_stage(query: str, chunks: list[dict], top_n: int) -> list[dict]:
+    # 時間切れはリランカー自身の失敗時と同じく検索順の上位で代用する
+    return await _stage(
+        "rerank", rerank(query=query, chunks=chunks, top_n=top_n), settings.rag_rerank_timeout_seconds, chunks[:top_n],
+    )
+
+
+async def _alt_queries(analysis: QueryAnalysis) -> list[str]:
+    """追加クエリ（リクエスト内で1回だけ生成し、Corrective RAGでも使い回す）"""
+    if analysis.alt_queries is None:
+        analysis.alt_queries = await _stage(
+            "alt_queries", _generate_alt_queries(analysis.symptom), settings.rag_alt_query_timeout_seconds, [],
+        )
+    return analysis.alt_queries
+
+
+async def _hybrid_searches(
+    queries: list[str], vehicle_id: str | None, n_results: int, analysis: QueryAnalysis,
+) -> list[dict]:
+    """複数クエリのハイブリッド検索を並行実行し、クエリ順に連結する。"""
+    per_query = await asyncio.gather(*(
+        _stage(
+            "hybrid_search",
+            vector_store.hybrid_search(query=q, vehicle_id=vehicle_id, n_results=n_results, analysis=analysis),
+            settings.rag_search_timeout_seconds,
+            [],
+        )
+        for q in queries
+    ))
+    return [r for results in per_query for r in results]
+
+
 def _deduplicate_results(all_results: list[dict]) -> list[dict]:
     """content先頭100文字をキーに重複を除去する。"""
     seen: set[str] = set()
@@ -57,7 +104,7 @@ def _deduplicate_results(all_results: list[dict]) -> list[dict]:
 def _ensure_inferred_keyword_coverage(
     reranked: list[dict],
     candidates: list[dict],
-    symptom: str,
+    analysis: QueryAnalysis,
 ) -> list[dict]:
     """推論キーワードの仕様チャンクがリランク結果に含まれるよう保証する。
 
@@ -65,10 +112,7 @@ def _ensure_inferred_keyword_coverage(
     仕様情報（例: ヒューズ配置表）を落とすことがある。推論キーワードの
     specification型チャンクが結果にない場合、候補から1件復活させる。
     """
-    inferred_kws = [
-        kw for kw in extract_keywords(symptom, max_keywords=3)
-        if kw not in symptom
-    ]
+    inferred_kws = analysis.inferred_keywords
     if not inferred_kws:
         return reranked
 
@@ -103,21 +147,6 @@ def _ensure_inferred_keyword_coverage(
     return rescued
 
 
-def _build_rerank_query(symptom: str) -> str:
-    """リランカー用クエリを構築する。推論キーワードをヒントとして付加。
-
-    keyword_extractorの暗黙マッピングで導出されたキーワード（クエリ自体に
-    含まれない語）をリランカーに伝えることで、間接的に関連するチャンク
-    （例: ヒューズ仕様表）の評価を向上させる。
-    """
-    keywords = extract_keywords(symptom, max_keywords=3)
-    inferred = [kw for kw in keywords if kw not in symptom]
-    if inferred:
-        hint = ", ".join(inferred[:3])
-        return f"{symptom} (関連部品: {hint})"
-    return symptom
-
-
 class RAGService:
     async def query(
         self,
@@ -128,38 +157,55 @@ class RAGService:
         year: int = 0,
         n_results: int = 10,
     ) -> dict:
-        # 1. メインクエリでハイブリッド検索
-        main_results = await vector_store.hybrid_search(
-            query=symptom,
-            vehicle_id=vehicle_id,
-            n_results=n_results,
-        )
+        # 依存関係のないステージを並行実行し、ターン時間をステージの合計ではなく
+        # 最長経路（メイン検索 or 追加クエリ生成→追加クエリ検索）で抑える:
+        #   メイン系: メイン + 推論キーワードのベクトル検索（1バッチ）→ メインのハイブリッド統合
+        #   追加系:   LLMで追加クエリ2つ生成 → 追加クエリのベクトル検索（1バッチ）
+        # 追加系・CRAG再検索・リランクは待ち時間上限を超えたら結果なしとして続行する。
+        # メイン検索は回答の土台なので上限を設けず、遅くても結果を待つ。
 
-        # 2. Multi-Query: LLMで追加クエリ2つ生成して検索
-        alt_queries = await _generate_alt_queries(symptom)
-        all_results = list(main_results)
+        # キーワード・追加クエリ・クエリembeddingはリクエスト内で1回だけ計算して使い回す
+        analysis = QueryAnalysis(symptom)
 
-        for alt_q in alt_queries:
-            alt_results = await vector_store.search(
-                query=alt_q,
+        # 推論キーワード検索: 暗黙マッピングで導出された部品名で追加検索
+        # 例: "ワイパーが動かない" → "ワイパー ヒューズ" で検索してヒューズ仕様ページを取得
+        inferred_kws = analysis.inferred_keywords
+
+        async def main_branch() -> tuple[list[dict], list[dict]]:
+            searches = [(symptom, n_results)] + [(f"{symptom} {kw}", 3) for kw in inferred_kws[:2]]
+            vector_results = await vector_store.search_many(
+                [q for q, _ in searches],
                 vehicle_id=vehicle_id,
-                n_results=5,
+                n_results_per_query=[n for _, n in searches],
+                analysis=analysis,
             )
-            all_results.extend(alt_results)
-
-        # 2b. 推論キーワード検索: 暗黙マッピングで導出された部品名で追加検索
-        # 例: "ワイパーが動かない" → "ワイパー ヒューズ" で検索してヒューズ仕様ページを取得
-        inferred_kws = [
-            kw for kw in extract_keywords(symptom, max_keywords=3)
-            if kw not in symptom
-        ]
-        for kw in inferred_kws[:2]:
-            kw_results = await vector_store.search(
-                query=f"{symptom} {kw}",
+            # メインクエリはキーワード検索とRRFで統合
+            main_results = await vector_store.hybrid_search(
+                query=symptom,
                 vehicle_id=vehicle_id,
-                n_results=3,
+                n_results=n_results,
+                vector_results=vector_results[0],
+                analysis=analysis,
+            )
+            return main_results, [r for results in vector_results[1:] for r in results]
+
+        async def alt_branch() -> list[dict]:
+            alt_queries = await _alt_queries(analysis)
+            if not alt_queries:
+                return []
+            per_query = await _stage(
+                "alt_search",
+                vector_store.search_many(alt_queries, vehicle_id=vehicle_id, n_results_per_query=5, analysis=analysis),
+                settings.rag_search_timeout_seconds,
+                [],
             )
-            all_results.extend(kw_results)
+            return [r for results in per_query for r in results]
+
+        (main_results, inferred_results), alt_results = await asyncio.gather(
+            main_branch(),
+            alt_branch(),
+        )
+        all_results = list(main_results) + alt_results + inferred_results
 
         # 3. 重複除去 + スコア閾値フィルタ（Phase 3-3: 0.3→0.45に引き上げ）
         unique = _deduplicate_results(all_results)
@@ -171,18 +217,20 @@ class RAGService:
                 "sources": [],
             }
 
+        # 3b. MMRで重なり分割による重複に近いチャンクを間引く
+        diverse = await vector_store.diversify(symptom, candidates, vehicle_id=vehicle_id, analysis=analysis)
+
         # 4. Rerankで上位N件に絞る（推論キーワードをヒントとして付加）
-        rerank_query = _build_rerank_query(symptom)
-        reranked = await rerank(query=rerank_query, chunks=candidates, top_n=7)
+        reranked = await _rerank_stage(analysis.rerank_query, diverse, top_n=7)
 
         # 4b. 推論キーワードの専用チャンク保証（rerankerで落ちた仕様チャンクを復活）
         reranked = _ensure_inferred_keyword_coverage(
-            reranked, candidates, symptom,
+            reranked, candidates, analysis,
         )
 
         # 5. Phase 3-1: Corrective RAG — rerank_scoreに基づく3段階ゲート
         reranked = await self._corrective_rag_gate(
-            reranked, symptom, vehicle_id, n_results,
+            reranked, analysis, vehicle_id, n_results,
         )
 
         sources = [
@@ -204,12 +252,14 @@ class RAGService:
     async def _corrective_rag_gate(
         self,
         reranked: list[dict],
-        symptom: str,
+        analysis: QueryAnalysis,
         vehicle_id: str | None,
         n_results: int,
     ) -> list[dict]:
         """Corrective RAG: rerank_scoreに基づく3段階ゲート。
 
+        追加クエリは最初の検索で生成したもの（analysis.alt_queries）を使い回す。
+
         - score >= 7: Correct → そのまま使用
         - score 4-6: Ambiguous → クエリ分解して再検索
         - score < 4: Incorrect → リライトして再検索（1回のみ）
@@ -229,21 +279,14 @@ class RAGService:
                 "CRAG Ambiguous gate (max_rerank_score=%.1f): attempting query decomposition",
                 max_score,
             )
-            alt_queries = await _generate_alt_queries(symptom)
+            alt_queries = await _alt_queries(analysis)
             if alt_queries:
-                additional_results = []
-                for alt_q in alt_queries:
-                    alt_results = await vector_store.hybrid_search(
-                        query=alt_q,
-                        vehicle_id=vehicle_id,
-                        n_results=5,
-                    )
-                    additional_results.extend(alt_results)
+                additional_results = await _hybrid_searches(alt_queries, vehicle_id, 5, analysis)
 
                 if additional_results:
                     combined = list(reranked) + _deduplicate_results(additional_results)
                     combined = _deduplicate_results(combined)
-                    re_reranked = await rerank(query=symptom, chunks=combined, top_n=7)
+                    re_reranked = await _rerank_stage(analysis.symptom, combined, top_n=7)
                     return re_reranked
 
             return reranked
@@ -253,19 +296,12 @@ class RAGService:
             "CRAG Incorrect gate (max_rerank_score=%.1f): attempting query rewrite",
             max_score,
         )
-        alt_queries = await _generate_alt_queries(symptom)
+        alt_queries = await _alt_queries(analysis)
         if not alt_queries:
             return reranked
 
-        # リライトクエリで再検索
-        rewrite_results = []
-        for alt_q in alt_queries:
-            results = await vector_store.hybrid_search(
-                query=alt_q,
-                vehicle_id=vehicle_id,
-                n_results=n_results,
-            )
-            rewrite_results.extend(results)
+        # リライトクエリで再検索（クエリ間は並行）
+        rewrite_results = await _hybrid_searches(alt_queries, vehicle_id, n_results, analysis)
 
         if not rewrite_results:
             return reranked
@@ -275,7 +311,7 @@ class RAGService:
         if not candidates:
             return reranked
 
-        re_reranked = await rerank(query=symptom, chunks=candidates, top_n=5)
+        re_reranked = await _rerank_stage(analysis.symptom, candidates, top_n=5)
         # リライト結果がオリジナルより良い場合のみ採用
         new_max = max(r.get("rerank_score", 0) for r in re_reranked) if re_reranked else 0
         if new_max > max_score:
@@ -30,6 +30,9 @@ class VehicleService:
         results.sort(key=lambda x: x.score, reverse=True)
         return results[:limit]
 
+    def list_all(self) -> list[Vehicle]:
+        return list(self._vehicles)
+
     def get_by_id(self, vehicle_id: str) -> Vehicle | None:
         for v in self._vehicles:
             if v.id == vehicle_id:
@@ -0,0 +1,114 @@
+"""起動時のバックグラウンドウォームアップとreadiness管理
+
+デプロイ直後の最初のチャットが、embeddingモデルの遅延ロード・
+Chroma HNSWの初回ロード・LLMクライアント構築をまとめて負担しないよう、
+lifespan開始時にバックグラウンドで事前実行する。
+
+/api/health の ready フィールドでロードバランサーに状態を伝える。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from app.config import settings
+from app.llm.registry import provider_registry
+from app.rag.embedder import embedder
+from app.rag.reranker import cross_encoder_reranker
+from app.rag.vector_store import vector_store
+from app.services.vehicle_service import vehicle_service
+
+logger = logging.getLogger(__name__)
+
+
+async def _warm_embedding_model():
+    await embedder.warm_up()
+
+
+async def _warm_reranker():
+    if settings.reranker_backend == "cross_encoder":
+        await cross_encoder_reranker.warm_up()
+
+
+async def _warm_vector_index():
+    await vector_store.warm_up([v.id for v in vehicle_service.list_all()])
+
+
+async def _warm_llm_client():
+    active = provider_registry.get_active()
+    if active:
+        active.warm_up()
+
+
+class WarmupService:
+    """ウォームアップの実行と状態保持。
+
+    status: pending → warming → ready / degraded
+    degraded は一部コンポーネントが失敗した状態。その場合も遅延ロード経路で
+    リクエストは処理できるため、ready フラグは True にする。
+    """
+
+    def __init__(self):
+        self.status = "pending"
+        self.components: dict[str, dict] = {}
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self._task: asyncio.Task | None = None
+        self._steps: list[tuple[str, Callable[[], Awaitable[None]]]] = [
+            ("embedding_model", _warm_embedding_model),
+            ("reranker", _warm_reranker),
+            ("vector_index", _warm_vector_index),
+            ("llm_client", _warm_llm_client),
+        ]
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("ready", "degraded")
+
+    def start(self) -> asyncio.Task:
+        """バックグラウンドタスクとしてウォームアップを開始する。"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+        return self._task
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def run(self):
+        self.status = "warming"
+        self.started_at = time.time()
+        self.components = {name: {"status": "pending"} for name, _ in self._steps}
+
+        for name, step in self._steps:
+            self.components[name]["status"] = "warming"
+            t0 = time.perf_counter()
+            try:
+                await step()
+            except Exception as e:
+                logger.warning("Warm-up step '%s' failed: %s", name, e)
+                self.components[name] = {"status": "failed", "error": str(e)}
+                continue
+            elapsed = time.perf_counter() - t0
+            self.components[name] = {"status": "ready", "seconds": round(elapsed, 2)}
+            logger.info("Warm-up step '%s' finished in %.2fs", name, elapsed)
+
+        failed = any(c["status"] == "failed" for c in self.components.values())
+        self.status = "degraded" if failed else "ready"
+        self.finished_at = time.time()
+
+    def snapshot(self) -> dict:
+        return {
+            "status": self.status,
+            "components": self.components,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+warmup_service = WarmupService()
@@ -0,0 +1,79 @@
+"""
+embedding受け渡しのアロケーション比較マイクロベンチマーク
+
+ingest時の「モデル出力 → VehicleManualStore → Chroma」の受け渡しについて、
+旧実装（ベクトルごとに .tolist() でPythonのfloatリストに変換し、Chroma側で
+再びndarrayに戻す）と、現行実装（float32のC連続ndarrayをそのまま渡す）の
+Pythonオブジェクト割り当て量・ピークメモリ・所要時間を比較する。
+
+モデル推論自体は計測対象外（乱数行列で代用）。
+
+使い方:
+  cd backend
+  python -m tests.bench.bench_embedding_allocations
+  python -m tests.bench.bench_embedding_allocations --chunks 2000 --dim 1024 --batch 50
+"""
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def _legacy_path(batch: np.ndarray) -> np.ndarray:
+    lists = [e.tolist() for e in batch]  # LocalEmbedder.embed の旧実装
+    return np.array(lists, dtype=np.float32)  # Chroma側での再変換
+
+
+def _numpy_path(batch: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(batch, dtype=np.float32)
+
+
+def _measure(fn, batches: list[np.ndarray]) -> dict:
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    total_allocated = 0
+    for batch in batches:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        fn(batch)
+        _, peak = tracemalloc.get_traced_memory()
+        total_allocated += peak - before
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "seconds": elapsed,
+        "allocated_mb": total_allocated / 1024 / 1024,
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding hand-off allocation benchmark")
+    parser.add_argument("--chunks", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--batch", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    batches = [
+        rng.standard_normal((min(args.batch, args.chunks - i), args.dim), dtype=np.float32)
+        for i in range(0, args.chunks, args.batch)
+    ]
+
+    legacy = _measure(_legacy_path, batches)
+    numpy_native = _measure(_numpy_path, batches)
+
+    floats_per_batch = args.batch * args.dim
+    print(f"chunks={args.chunks} dim={args.dim} batch={args.batch}")
+    print(f"Python float objects per batch (legacy): {floats_per_batch:,}")
+    print()
+    print(f"{'path':<14}{'time (ms)':>12}{'allocated (MB)':>17}{'peak (MB)':>12}")
+    for name, r in (("legacy list", legacy), ("numpy", numpy_native)):
+        print(f"{name:<14}{r['seconds'] * 1000:>12.1f}{r['allocated_mb']:>17.1f}{r['peak_mb']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+ローカルembeddingバックエンド比較ベンチマーク（torch vs ONNX int8）
+
+multilingual-e5-large-instruct を sentence-transformers (embedding_provider="local")
+と ONNX Runtime int8 量子化版 (embedding_provider="local_onnx") で実行し、
+以下を比較する:
+
+- クエリ1件あたりのレイテンシ (p50 / p95)
+- passageバッチのスループット
+- 常駐メモリ (RSS, モデルロード後のピーク)
+- コサイン一致度: 同一テキストに対する両バックエンドのベクトルの cos 類似度
+
+互換性チェック:
+  ONNX版のベクトルを既存コレクション（torch版でingest済み）に対して使う前提のため、
+  cos類似度の平均 >= 0.99 かつ最小 >= 0.98 を合格ラインとする。
+  不合格の場合は終了コード1を返す。
+
+各バックエンドは別プロセスで計測し、RSSが互いに干渉しないようにする。
+
+使い方:
+  cd backend
+  # 1. 量子化ONNXモデルをエクスポート（要: pip install "optimum[onnxruntime]"）
+  python -m tests.bench.bench_onnx_embedder export
+  # 2. 比較ベンチマーク
+  python -m tests.bench.bench_onnx_embedder compare
+  python -m tests.bench.bench_onnx_embedder compare --repeat 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tests.ragas.test_cases import TEST_CASES
+
+AGREEMENT_MEAN_THRESHOLD = 0.99
+AGREEMENT_MIN_THRESHOLD = 0.98
+
+_SAMPLE_PASSAGES = [
+    "ブレーキ警告灯が点灯したとき: ブレーキ液の量を点検し、MINより下の場合は販売店で点検を受けてください。",
+    "エンジンが始動しないときは、バッテリーの電圧とスマートキーの電池残量を確認してください。",
+    "オーバーヒートしたときは安全な場所に停車し、エンジンをかけたままボンネットを開けて冷却してください。",
+    "ワイパーが作動しないときは、ヒューズボックスのワイパーヒューズ (30A) を点検してください。",
+    "タイヤ空気圧警告灯が点灯した場合は、すべてのタイヤの空気圧を指定値に調整してください。",
+]
+
+
+def _rss_mb() -> float:
+    """現在のプロセスのRSS (MB)。Linuxの /proc を優先し、なければ ru_maxrss。"""
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def export_model(model_name: str, out_dir: str):
+    """HuggingFaceモデルをONNXにエクスポートし、動的int8量子化する。"""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    with tempfile.TemporaryDirectory() as fp32_dir:
+        print(f"Exporting {model_name} to ONNX...")
+        model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+        model.save_pretrained(fp32_dir)
+
+        print("Quantizing (dynamic int8, per-channel)...")
+        quantizer = ORTQuantizer.from_pretrained(fp32_dir)
+        qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=True)
+        quantizer.quantize(save_dir=out_dir, quantization_config=qconfig)
+
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(out_dir)
+    print(f"Saved quantized model to {out_dir}")
+
+
+async def _measure(backend_name: str, repeat: int, vectors_path: str) -> dict:
+    from app.rag.embedder import LocalEmbedder, LocalOnnxEmbedder
+
+    queries = [tc["symptom"] for tc in TEST_CASES]
+    rss_before = _rss_mb()
+    backend = LocalOnnxEmbedder() if backend_name == "local_onnx" else LocalEmbedder()
+
+    t0 = time.perf_counter()
+    await backend.embed_query("ウォームアップ")
+    load_seconds = time.perf_counter() - t0
+    rss_loaded = _rss_mb()
+
+    latencies = []
+    for _ in range(repeat):
+        for q in queries:
+            t = time.perf_counter()
+            await backend.embed_query(q)
+            latencies.append((time.perf_counter() - t) * 1000)
+
+    t = time.perf_counter()
+    passages = await backend.embed(_SAMPLE_PASSAGES * 10)
+    passage_seconds = time.perf_counter() - t
+
+    query_vectors = [await backend.embed_query(q) for q in queries]
+    np.save(vectors_path, np.vstack([np.stack(query_vectors), passages[: len(_SAMPLE_PASSAGES)]]))
+
+    return {
+        "backend": backend_name,
+        "load_seconds": round(load_seconds, 2),
+        "query_latency_ms_p50": round(float(np.percentile(latencies, 50)), 2),
+        "query_latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+        "passages_per_second": round(len(_SAMPLE_PASSAGES) * 10 / passage_seconds, 1),
+        "rss_model_mb": round(rss_loaded - rss_before, 1),
+        "rss_peak_mb": round(_rss_mb(), 1),
+    }
+
+
+def _run_child(backend_name: str, repeat: int, vectors_path: str) -> dict:
+    cmd = [
+        sys.executable, "-m", "tests.bench.bench_onnx_embedder", "_measure",
+        "--backend", backend_name, "--repeat", str(repeat), "--vectors", vectors_path,
+    ]
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True, cwd=os.path.join(os.path.dirname(__file__), "..", ".."))
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def compare(repeat: int) -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        torch_path = os.path.join(tmp, "local.npy")
+        onnx_path = os.path.join(tmp, "local_onnx.npy")
+        results = [
+            _run_child("local", repeat, torch_path),
+            _run_child("local_onnx", repeat, onnx_path),
+        ]
+        a = np.load(torch_path)
+        b = np.load(onnx_path)
+
+    cosines = (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+    agreement = {
+        "cosine_mean": round(float(cosines.mean()), 4),
+        "cosine_min": round(float(cosines.min()), 4),
+    }
+    passed = (
+        agreement["cosine_mean"] >= AGREEMENT_MEAN_THRESHOLD
+        and agreement["cosine_min"] >= AGREEMENT_MIN_THRESHOLD
+    )
+
+    keys = [k for k in results[0] if k != "backend"]
+    print(f"{'metric':<26}{'local':>14}{'local_onnx':>14}")
+    for key in keys:
+        print(f"{key:<26}{results[0][key]:>14}{results[1][key]:>14}")
+    print()
+    print(f"cosine agreement: mean={agreement['cosine_mean']} min={agreement['cosine_min']} "
+          f"({'PASS' if passed else 'FAIL'}: mean>={AGREEMENT_MEAN_THRESHOLD}, min>={AGREEMENT_MIN_THRESHOLD})")
+    return 0 if passed else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local embedding backend benchmark")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_export = sub.add_parser("export", help="export int8-quantized ONNX model")
+    p_export.add_argument("--model", default=None)
+    p_export.add_argument("--out", default=None)
+
+    p_compare = sub.add_parser("compare", help="compare latency/RSS/cosine agreement")
+    p_compare.add_argument("--repeat", type=int, default=20)
+
+    p_measure = sub.add_parser("_measure")
+    p_measure.add_argument("--backend", required=True)
+    p_measure.add_argument("--repeat", type=int, default=20)
+    p_measure.add_argument("--vectors", required=True)
+
+    args = parser.parse_args()
+    from app.config import settings
+
+    if args.command == "export":
+        export_model(args.model or settings.local_embedding_model, args.out or settings.local_onnx_model_dir)
+    elif args.command == "compare":
+        sys.exit(compare(args.repeat))
+    else:
+        result = asyncio.run(_measure(args.backend, args.repeat, args.vectors))
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
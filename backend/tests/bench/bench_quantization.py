@@ -0,0 +1,134 @@
+"""
+量子化ベクトル（vector_store_quantization）の recall@k / レイテンシ ベンチマーク
+
+合成コーパス（クラスタ構造を持つL2正規化ベクトル）について、float32 の総当たり
+厳密top-kを正解とし、float16 / int8 の圧縮表現で top-k×rescore_factor 件に絞ってから
+float32 原本で再スコアした結果の recall@k・クエリあたりレイテンシ・常駐メモリを比較する。
+クエリはコーパス中のベクトルにノイズを加えたもの。
+
+既定は 100万チャンク × 1024次元（float32 原本だけで約4GB）。メモリが足りない場合は
+--chunks / --dim を小さくする。--mmap を付けると原本を一時ファイルに書き出し、
+FlatIndexBackend と同じくメモリマップから再スコアする。
+
+使い方:
+  cd backend
+  python -m tests.bench.bench_quantization
+  python -m tests.bench.bench_quantization --chunks 200000 --dim 1024 --queries 50
+  python -m tests.bench.bench_quantization --rescore-factors 2 4 8 --mmap
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from app.rag.index_backends import _top_k
+from app.rag.quantization import QuantizedMatrix, rescored_top_k
+
+_GENERATE_BLOCK_ROWS = 65536
+
+
+def _synthetic_corpus(n: int, dim: int, n_clusters: int, seed: int) -> np.ndarray:
+    """クラスタ中心 + ノイズのL2正規化ベクトル（ブロック単位で生成してピークメモリを抑える）"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+    corpus = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, _GENERATE_BLOCK_ROWS):
+        rows = min(_GENERATE_BLOCK_ROWS, n - start)
+        block = centers[rng.integers(0, n_clusters, rows)]
+        block += rng.standard_normal((rows, dim), dtype=np.float32) * 0.8
+        block /= np.linalg.norm(block, axis=1, keepdims=True)
+        corpus[start : start + rows] = block
+    return corpus
+
+
+def _queries(corpus: np.ndarray, n: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed + 1)
+    queries = corpus[rng.integers(0, len(corpus), n)] + rng.standard_normal((n, corpus.shape[1])).astype(np.float32) * 0.05
+    return queries / np.linalg.norm(queries, axis=1, keepdims=True)
+
+
+def _exact_search(corpus: np.ndarray, queries: np.ndarray, k: int) -> tuple[np.ndarray, list[float]]:
+    results = []
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        results.append(_top_k((corpus @ q)[None, :], k)[0])
+        latencies.append(time.perf_counter() - t0)
+    return np.stack(results), latencies
+
+
+def _quantized_search(
+    compact: QuantizedMatrix, full: np.ndarray, queries: np.ndarray, k: int, rescore_factor: int,
+) -> tuple[np.ndarray, list[float]]:
+    results = []
+    latencies = []
+    for q in queries:
+        t0 = time.perf_counter()
+        rows, _ = rescored_top_k(q[None, :], compact, full, k, rescore_factor)
+        latencies.append(time.perf_counter() - t0)
+        results.append(rows[0])
+    return np.stack(results), latencies
+
+
+def _recall(expected: np.ndarray, actual: np.ndarray) -> float:
+    return float(np.mean([len(set(e) & set(a)) / len(e) for e, a in zip(expected, actual)]))
+
+
+def _ms(latencies: list[float], pct: float) -> float:
+    return float(np.percentile(latencies, pct) * 1000)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized vector storage recall/latency benchmark")
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=["float16", "int8"])
+    parser.add_argument("--rescore-factors", nargs="+", type=int, default=[4])
+    parser.add_argument("--mmap", action="store_true", help="float32原本をメモリマップから再スコアする")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Generating {args.chunks:,} x {args.dim} corpus ...")
+    corpus = _synthetic_corpus(args.chunks, args.dim, args.clusters, args.seed)
+    queries = _queries(corpus, args.queries, args.seed)
+
+    full = corpus
+    tmp_dir = None
+    if args.mmap:
+        tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmp_dir.name, "embeddings.npy")
+        np.save(path, corpus)
+        full = np.load(path, mmap_mode="r")
+
+    expected, baseline_latencies = _exact_search(corpus, queries, args.k)
+    print(f"\n{'mode':<10} {'rescore':>7} {'recall@' + str(args.k):>10} {'p50 ms':>9} {'p95 ms':>9} {'resident MB':>12}")
+    print(
+        f"{'float32':<10} {'-':>7} {1.0:>10.4f} {_ms(baseline_latencies, 50):>9.2f} "
+        f"{_ms(baseline_latencies, 95):>9.2f} {corpus.nbytes / 1024 / 1024:>12.1f}"
+    )
+
+    for mode in args.modes:
+        compact = QuantizedMatrix.encode(corpus, mode)
+        for factor in args.rescore_factors:
+            actual, latencies = _quantized_search(compact, full, queries, args.k, factor)
+            print(
+                f"{mode:<10} {factor:>7} {_recall(expected, actual):>10.4f} {_ms(latencies, 50):>9.2f} "
+                f"{_ms(latencies, 95):>9.2f} {compact.nbytes / 1024 / 1024:>12.1f}"
+            )
+
+    if tmp_dir is not None:
+        del full
+        tmp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+次元削減（embedding_projection）の recall@k 評価スクリプト
+
+指定車両のingest済みチャンクを全次元でembeddingし、tests/ragas/test_cases.py の
+症状クエリについて「全次元での厳密top-k」を正解として、各射影設定での
+top-k がどれだけ一致するか（recall@k）を計測する。あわせてベクトル1件あたりの
+メモリと総当たり検索時間の比率も表示する。
+
+チャンクembeddingは embedding ストア経由で取得するため、ingest済みなら再計算されない。
+
+使い方:
+  cd backend
+  python -m tests.bench.eval_projection_recall
+  python -m tests.bench.eval_projection_recall --dims 128 256 512 --k 10
+  python -m tests.bench.eval_projection_recall --vehicle-id honda_accord_2011 --modes pca
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", ".."))
+
+from tests.ragas.test_cases import TEST_CASES, VEHICLE_ID
+from app.rag.embedder import embedder
+from app.rag.projection import EmbeddingProjection
+from app.rag.vector_store import vector_store
+
+
+def _top_k(queries: np.ndarray, docs: np.ndarray, k: int) -> tuple[np.ndarray, float]:
+    t0 = time.perf_counter()
+    scores = queries @ docs.T
+    top = np.argpartition(-scores, kth=min(k, docs.shape[0] - 1), axis=1)[:, :k]
+    return top, time.perf_counter() - t0
+
+
+def _recall(truth: np.ndarray, approx: np.ndarray) -> float:
+    hits = [len(set(t) & set(a)) / len(t) for t, a in zip(truth, approx)]
+    return float(np.mean(hits))
+
+
+async def evaluate(vehicle_id: str, modes: list[str], dims: list[int], k: int):
+    documents = [chunk["content"] for chunk in await vector_store.get_chunks(vehicle_id)]
+    if not documents:
+        print(f"No chunks found for vehicle_id={vehicle_id}")
+        return
+
+    print(f"Embedding {len(documents)} chunks and {len(TEST_CASES)} queries (full dimension)...")
+    doc_vectors = np.asarray(await embedder.embed(documents), dtype=np.float32)
+    query_vectors = np.asarray(
+        [await embedder.embed_query(tc["symptom"]) for tc in TEST_CASES], dtype=np.float32,
+    )
+    full_dim = doc_vectors.shape[1]
+    truth, full_seconds = _top_k(query_vectors, doc_vectors, k)
+
+    print()
+    print(f"{'mode':<10}{'dim':>6}{f'recall@{k}':>12}{'memory':>10}{'search':>10}")
+    print(f"{'full':<10}{full_dim:>6}{1.0:>12.3f}{'1.00x':>10}{'1.00x':>10}")
+    for mode in modes:
+        for dim in dims:
+            if dim >= full_dim:
+                continue
+            projection = EmbeddingProjection(mode=mode, dim=dim)
+            if projection.needs_fit:
+                if len(documents) < dim:
+                    print(f"{mode:<10}{dim:>6}  skipped (needs >= {dim} chunks to fit)")
+                    continue
+                projection.fit(doc_vectors)
+            approx, seconds = _top_k(
+                projection.transform(query_vectors), projection.transform(doc_vectors), k,
+            )
+            memory_ratio = f"{dim / full_dim:.2f}x"
+            search_ratio = f"{seconds / full_seconds:.2f}x" if full_seconds else "-"
+            print(f"{mode:<10}{dim:>6}{_recall(truth, approx):>12.3f}{memory_ratio:>10}{search_ratio:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding projection recall@k evaluation")
+    parser.add_argument("--vehicle-id", default=VEHICLE_ID)
+    parser.add_argument("--modes", nargs="+", default=["pca", "truncate"])
+    parser.add_argument("--dims", nargs="+", type=int, default=[128, 256, 512])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(evaluate(args.vehicle_id, args.modes, args.dims, args.k))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,17 @@
 """Shared fixtures for backend unit tests."""
 import json
+from contextlib import ExitStack
 from dataclasses import dataclass
-from unittest.mock import AsyncMock
+from typing import Callable, Iterator
+from unittest.mock import AsyncMock, patch
 
+import numpy as np
 import pytest
 
 from app.models.session import SessionState, ChatStep
 from app.models.chat import ChatRequest
 from app.llm.base import LLMResponse
+from app.rag.vector_store import VehicleManualStore
 
 
 @dataclass
@@ -80,3 +84,89 @@ def make_llm_response(**overrides) -> dict:
     }
     base.update(overrides)
     return base
+
+
+def length_vector(text: str) -> list[float]:
+    """Default fake embedding: the text length plus a constant component."""
+    return [float(len(text)), 1.0]
+
+
+class FakeEmbedder:
+    """Deterministic stand-in for app.rag.embedder.embedder in vector store tests.
+
+    vector_fn maps a text to its embedding. Calls are recorded so tests can check
+    what was (re-)embedded; set fail=True to make passage embedding raise.
+    """
+
+    def __init__(
+        self,
+        vector_fn: Callable[[str], list[float]] = length_vector,
+        model_name: str = "fake-model",
+        fail: bool = False,
+    ):
+        self.vector_fn = vector_fn
+        self.model_name = model_name
+        self.fail = fail
+        self.embedded: list[str] = []
+        self.batches: list[list[str]] = []
+        self.single_calls: list[str] = []
+        self.query_batches: list[list[str]] = []
+
+    @property
+    def query_calls(self) -> int:
+        return len(self.single_calls) + sum(len(b) for b in self.query_batches)
+
+    def token_lengths(self, texts):
+        return [len(t) for t in texts]
+
+    def _vectors(self, texts) -> np.ndarray:
+        return np.array([self.vector_fn(t) for t in texts], dtype=np.float32)
+
+    async def embed(self, texts, progress_callback=None):
+        if self.fail:
+            raise RuntimeError("embedding server down")
+        self.embedded.extend(texts)
+        self.batches.append(list(texts))
+        if progress_callback:
+            progress_callback(len(texts), len(texts))
+        return self._vectors(texts)
+
+    async def embed_single(self, text):
+        self.single_calls.append(text)
+        return self._vectors([text])[0]
+
+    async def embed_queries(self, texts):
+        self.query_batches.append(list(texts))
+        return self._vectors(texts)
+
+
+@pytest.fixture
+def fake_embedder() -> Iterator[FakeEmbedder]:
+    """FakeEmbedder patched in as the vector store's embedder."""
+    fake = FakeEmbedder()
+    with patch("app.rag.vector_store.embedder", fake):
+        yield fake
+
+
+@pytest.fixture
+def make_store(tmp_path) -> Iterator[Callable[..., VehicleManualStore]]:
+    """Factory for initialized VehicleManualStores whose index lives under tmp_path.
+
+    Stores created with the same name share one index directory, like workers on one node.
+    The settings patched for the latest store stay in effect until the test ends.
+    """
+    with ExitStack() as stack:
+
+        def make(backend: str = "flat", name: str = "") -> VehicleManualStore:
+            directory = str(tmp_path / name) if name else str(tmp_path)
+            for key, value in (
+                ("vector_store_backend", backend),
+                ("flat_index_dir", directory),
+                ("chroma_persist_dir", directory),
+            ):
+                stack.enter_context(patch(f"app.rag.vector_store.settings.{key}", value))
+            store = VehicleManualStore()
+            store.initialize()
+            return store
+
+        yield make
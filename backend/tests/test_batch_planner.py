@@ -0,0 +1,97 @@
+"""Tests for length-bucketed embedding batches during ingestion."""
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.rag.batch_planner import estimate_token_length, plan_length_buckets
+from app.rag.chunker import Chunk
+from app.rag.embedder import LocalEmbedder
+from app.rag.vector_store import VehicleManualStore
+
+
+class TestPlanLengthBuckets:
+    def test_every_index_planned_once(self):
+        lengths = [5, 300, 12, 7, 250, 40]
+        buckets = plan_length_buckets(lengths, token_budget=600)
+        assert sorted(i for b in buckets for i in b) == list(range(len(lengths)))
+
+    def test_padded_cost_within_budget(self):
+        lengths = [10, 500, 20, 15, 480, 30, 25, 490]
+        for bucket in plan_length_buckets(lengths, token_budget=1000):
+            if len(bucket) > 1:
+                assert len(bucket) * max(lengths[i] for i in bucket) <= 1000
+
+    def test_short_and_long_chunks_are_separated(self):
+        lengths = [10, 500, 10, 500, 10]
+        buckets = plan_length_buckets(lengths, token_budget=1000)
+        assert buckets == [[0, 2, 4], [1, 3]]
+
+    def test_oversized_item_gets_own_bucket(self):
+        buckets = plan_length_buckets([5, 2000, 5], token_budget=100)
+        assert [1] in buckets
+
+    def test_max_batch_size(self):
+        buckets = plan_length_buckets([1] * 10, token_budget=10_000, max_batch_size=4)
+        assert [len(b) for b in buckets] == [4, 4, 2]
+
+    def test_empty(self):
+        assert plan_length_buckets([], token_budget=100) == []
+
+
+class TestEmbedChunksOrder:
+    @pytest.mark.asyncio
+    async def test_results_restored_to_document_order(self, fake_embedder):
+        texts = ["a" * 300, "b" * 3, "c" * 250, "d" * 5, "e" * 4]
+        chunks = [Chunk(text=t, page=1) for t in texts]
+        progress: list[tuple[int, int]] = []
+
+        with patch("app.rag.vector_store.settings.embedding_batch_token_budget", 600):
+            embeddings = await VehicleManualStore()._embed_chunks(
+                chunks, progress_callback=lambda d, t: progress.append((d, t)),
+            )
+
+        assert embeddings[:, 0].tolist() == [float(len(t)) for t in texts]
+        assert len(fake_embedder.batches) > 1
+        assert sorted(fake_embedder.batches[0]) == ["b" * 3, "d" * 5, "e" * 4]
+        assert progress[-1] == (5, 5)
+
+    @pytest.mark.asyncio
+    async def test_token_lengths_counted_off_event_loop(self, fake_embedder):
+        threads: list[threading.Thread] = []
+
+        def token_lengths(texts):
+            threads.append(threading.current_thread())
+            return [len(t) for t in texts]
+
+        fake_embedder.token_lengths = token_lengths
+        await VehicleManualStore()._embed_chunks([Chunk(text="abc", page=1)])
+
+        assert threads and threads[0] is not threading.main_thread()
+
+
+class _FakeTokenizer:
+    def __call__(self, texts, add_special_tokens=True):
+        return {"input_ids": [list(range(len(t))) for t in texts]}
+
+
+class TestLocalTokenLengths:
+    def test_uses_separate_tokenizer_from_worker(self):
+        local = LocalEmbedder()
+        local._model = MagicMock(max_seq_length=12)
+        local._model.tokenizer = _FakeTokenizer()
+        try:
+            assert local.token_lengths(["ab", "x" * 20]) == [11, 12]
+        finally:
+            local._batcher.shutdown()
+
+        assert local._length_tokenizer is not None
+        assert local._length_tokenizer is not local._model.tokenizer
+
+    def test_estimates_before_model_loads(self):
+        local = LocalEmbedder()
+        try:
+            assert local.token_lengths(["ab"]) == [estimate_token_length("ab")]
+        finally:
+            local._batcher.shutdown()
+        assert local._length_tokenizer is None
@@ -0,0 +1,102 @@
+"""Tests for concurrent, throttling-aware Bedrock embedding."""
+import asyncio
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.rag.embedder import BedrockEmbedder
+
+
+class _ThrottlingError(Exception):
+    def __init__(self):
+        super().__init__("Rate exceeded")
+        self.response = {"Error": {"Code": "ThrottlingException"}}
+
+
+class _FakeBedrock(BedrockEmbedder):
+    _BACKOFF_BASE_SECONDS = 0.001
+
+    def __init__(self, throttle_first: int = 0):
+        super().__init__()
+        self._lock = threading.Lock()
+        self._throttle_remaining = throttle_first
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def _invoke(self, text: str, input_type: str = "search_document") -> list[float]:
+        with self._lock:
+            if self._throttle_remaining > 0:
+                self._throttle_remaining -= 1
+                raise _ThrottlingError()
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        time.sleep(0.005)
+        with self._lock:
+            self.in_flight -= 1
+        return [float(len(text))]
+
+
+class TestBedrockEmbedderConcurrency:
+    @pytest.mark.asyncio
+    async def test_results_preserve_input_order(self):
+        emb = _FakeBedrock()
+        texts = ["a" * i for i in range(1, 30)]
+        result = await emb.embed(texts)
+        assert result.dtype == np.float32
+        assert result.tolist() == [[float(len(t))] for t in texts]
+
+    @pytest.mark.asyncio
+    async def test_in_flight_bounded_by_setting(self):
+        emb = _FakeBedrock()
+        emb._max_concurrency = emb._concurrency = 3
+        await emb.embed([str(i) for i in range(20)])
+        assert 1 < emb.peak_in_flight <= 3
+
+    @pytest.mark.asyncio
+    async def test_throttling_retries_and_reduces_concurrency(self):
+        emb = _FakeBedrock(throttle_first=2)
+        emb._max_concurrency = emb._concurrency = 8
+        result = await emb.embed(["x", "yy"])
+        assert result.tolist() == [[1.0], [2.0]]
+        assert emb._concurrency < 8
+
+    @pytest.mark.asyncio
+    async def test_non_throttling_error_is_raised(self):
+        emb = _FakeBedrock()
+
+        def broken(text, input_type="search_document"):
+            raise ValueError("bad request")
+
+        emb._invoke = broken
+        with pytest.raises(ValueError):
+            await emb.embed(["x"])
+
+    @pytest.mark.asyncio
+    async def test_error_stops_remaining_workers(self):
+        emb = _FakeBedrock()
+        emb._max_concurrency = emb._concurrency = 4
+        invoked: list[str] = []
+        invoke = emb._invoke
+
+        def failing(text, input_type="search_document"):
+            invoked.append(text)
+            if text == "bad":
+                raise ValueError("bad request")
+            return invoke(text, input_type)
+
+        emb._invoke = failing
+        with pytest.raises(ValueError):
+            await emb.embed(["bad"] + [str(i) for i in range(40)])
+        started = len(invoked)
+        await asyncio.sleep(0.05)
+
+        assert len(invoked) == started < 41
+
+    @pytest.mark.asyncio
+    async def test_progress_callback_reports_each_text(self):
+        emb = _FakeBedrock()
+        progress: list[tuple[int, int]] = []
+        await emb.embed(["a", "b", "c"], progress_callback=lambda d, t: progress.append((d, t)))
+        assert sorted(progress) == [(1, 3), (2, 3), (3, 3)]
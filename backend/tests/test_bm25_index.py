@@ -0,0 +1,144 @@
+"""BM25キーワード索引のテスト"""
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from app.rag.bm25_index import BM25Index, tokenize
+from app.rag.chunker import Chunk
+from app.rag.vector_store import chunk_id
+
+_DOCS = [
+    "ブレーキ液の量を点検してください。",
+    "エンジンオイルを交換する手順。エンジンを停止してから作業する。",
+    "ブレーキ警告灯が点灯したら、ブレーキ液とブレーキパッドを点検する。",
+    "タイヤ空気圧は指定値に調整してください。",
+]
+
+
+class TestTokenize:
+    def test_bigrams_and_terms(self):
+        terms = tokenize("ブレーキ液")
+        assert "ブレ" in terms
+        assert "キ液" in terms
+        assert "w:ブレーキ" in terms
+
+    def test_no_bigram_across_separators(self):
+        assert "液、" not in tokenize("液、量")
+        assert "液量" not in tokenize("液、量")
+
+    def test_nfkc_and_lowercase(self):
+        assert "ab" in tokenize("ＡＢＳ警告灯")
+        assert "w:abs" in tokenize("ＡＢＳ警告灯")
+
+
+class TestBM25Index:
+    def _index(self, tmp_path) -> BM25Index:
+        index = BM25Index(str(tmp_path))
+        index.add("v1", [f"v1_{i}" for i in range(len(_DOCS))], _DOCS)
+        return index
+
+    def test_ranked_by_relevance(self, tmp_path):
+        results = self._index(tmp_path).search("ブレーキ", "v1", n_results=5)
+
+        ids = [chunk_id for chunk_id, _ in results]
+        assert ids[:2] == ["v1_2", "v1_0"]  # 出現回数の多いチャンクが上位
+        assert "v1_3" not in ids
+        scores = [score for _, score in results]
+        assert scores == sorted(scores, reverse=True)
+        assert all(score > 0 for score in scores)
+
+    def test_n_results_limit(self, tmp_path):
+        assert len(self._index(tmp_path).search("点検", "v1", n_results=1)) == 1
+
+    def test_no_match(self, tmp_path):
+        index = self._index(tmp_path)
+        assert index.search("ワイパー", "v1") == []
+        assert index.search("ブレーキ", "unknown") == []
+
+    def test_persisted_and_reloaded(self, tmp_path):
+        expected = self._index(tmp_path).search("エンジンオイル", "v1")
+
+        reloaded = BM25Index(str(tmp_path))
+        assert reloaded.has("v1")
+        assert reloaded.search("エンジンオイル", "v1") == expected
+
+    def test_add_extends_existing_vehicle(self, tmp_path):
+        index = self._index(tmp_path)
+        index.add("v1", ["v1_4"], ["ワイパーのヒューズを点検する"])
+
+        assert [i for i, _ in index.search("ワイパー", "v1")] == ["v1_4"]
+        assert [i for i, _ in BM25Index(str(tmp_path)).search("ワイパー", "v1")] == ["v1_4"]
+
+    def test_build_replaces_existing_vehicle(self, tmp_path):
+        index = self._index(tmp_path)
+        index.build("v1", ["v1_4"], ["ワイパーのヒューズを点検する"])
+
+        assert index.search("ブレーキ", "v1") == []
+        assert [i for i, _ in BM25Index(str(tmp_path)).search("ワイパー", "v1")] == ["v1_4"]
+
+    def test_concurrent_ensure_builds_once(self, tmp_path):
+        index = BM25Index(str(tmp_path))
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.05)
+            return [f"v1_{i}" for i in range(len(_DOCS))], _DOCS
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            built = list(pool.map(lambda _: index.ensure("v1", loader), range(4)))
+
+        assert calls == [1]
+        assert sorted(built) == [False, False, False, True]
+        assert len(BM25Index(str(tmp_path))._get("v1").doc_len) == len(_DOCS)
+
+    def test_delete_vehicle(self, tmp_path):
+        index = self._index(tmp_path)
+        index.delete_vehicle("v1")
+
+        assert not index.has("v1")
+        assert not BM25Index(str(tmp_path)).has("v1")
+
+
+class TestKeywordSearch:
+    @pytest.mark.asyncio
+    async def test_bm25_scores_and_lazy_build(self, tmp_path, fake_embedder, make_store):
+        chunks = [Chunk(text=t, page=i + 1) for i, t in enumerate(_DOCS)]
+        store = make_store()
+        await store.upsert_chunks(chunks, vehicle_id="v1")
+        results = await store.keyword_search("ブレーキ", vehicle_id="v1")
+
+        # 索引導入前のデータ: BM25ファイルがなくても検索時に構築される
+        os.remove(os.path.join(tmp_path, "vehicle_manuals_bm25", f"{store._physical('v1')}.npz"))
+        rebuilt = await make_store().keyword_search("ブレーキ", vehicle_id="v1")
+
+        assert [r["page"] for r in results][:2] == [3, 1]
+        assert results[0]["score"] > results[1]["score"]
+        assert results[0]["id"] == chunk_id("v1", 3, _DOCS[2])
+        assert rebuilt == results
+
+    @pytest.mark.asyncio
+    async def test_concurrent_searches_build_legacy_index_once(self, tmp_path, fake_embedder, make_store):
+        chunks = [Chunk(text=t, page=i + 1) for i, t in enumerate(_DOCS)]
+        store = make_store()
+        await store.upsert_chunks(chunks, vehicle_id="v1")
+        physical = store._physical("v1")
+        os.remove(os.path.join(tmp_path, "vehicle_manuals_bm25", f"{physical}.npz"))
+
+        fresh = make_store()
+        backend = fresh._get_backend()
+        get = backend.get
+
+        def slow_get(*args, **kwargs):
+            time.sleep(0.05)  # 構築中に他の検索が索引の有無を確認する
+            return get(*args, **kwargs)
+
+        with patch.object(backend, "get", slow_get):
+            await asyncio.gather(*(fresh.keyword_search(q, vehicle_id="v1") for q in ["ブレーキ", "エンジン", "タイヤ"]))
+
+        postings = BM25Index(os.path.join(tmp_path, "vehicle_manuals_bm25"))._get(physical)
+        assert len(postings.ids) == len(_DOCS)
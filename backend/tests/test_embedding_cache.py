@@ -0,0 +1,83 @@
+"""Tests for the query embedding LRU/TTL cache."""
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.rag.embedder import Embedder, EmbeddingCache
+
+
+class _CountingBackend:
+    name = "fake"
+    model_name = "fake-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def embed_query(self, text: str) -> list[float]:
+        self.calls += 1
+        return [float(len(text)), 1.0]
+
+
+class TestEmbeddingCache:
+    def test_hit_and_miss_counters(self):
+        cache = EmbeddingCache(max_size=4, ttl_seconds=60)
+        assert cache.get(("a",)) is None
+        cache.put(("a",), [1.0])
+        assert cache.get(("a",)) == [1.0]
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+
+    def test_lru_eviction(self):
+        cache = EmbeddingCache(max_size=2, ttl_seconds=60)
+        cache.put(("a",), [1.0])
+        cache.put(("b",), [2.0])
+        cache.get(("a",))  # a を最近使用に
+        cache.put(("c",), [3.0])
+        assert cache.get(("b",)) is None
+        assert cache.get(("a",)) == [1.0]
+        assert cache.get(("c",)) == [3.0]
+
+    def test_ttl_expiry(self):
+        cache = EmbeddingCache(max_size=2, ttl_seconds=10)
+        with patch("app.rag.embedder.time.monotonic", return_value=100.0):
+            cache.put(("a",), [1.0])
+        with patch("app.rag.embedder.time.monotonic", return_value=111.0):
+            assert cache.get(("a",)) is None
+        assert cache.stats()["size"] == 0
+
+    def test_zero_size_disables_cache(self):
+        cache = EmbeddingCache(max_size=0, ttl_seconds=60)
+        cache.put(("a",), [1.0])
+        assert cache.get(("a",)) is None
+
+
+class TestEmbedderQueryCache:
+    @pytest.mark.asyncio
+    async def test_repeated_query_hits_cache(self):
+        emb = Embedder()
+        backend = _CountingBackend()
+        emb._backend = backend
+
+        first = await emb.embed_single("エンジンがかからない")
+        second = await emb.embed_query("エンジンがかからない")
+
+        assert first is second
+        assert first.dtype == np.float32
+        assert not first.flags.writeable
+        assert backend.calls == 1
+        assert emb.cache_stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_key_includes_model_name(self):
+        emb = Embedder()
+        backend = _CountingBackend()
+        emb._backend = backend
+
+        await emb.embed_query("ブレーキ")
+        backend.model_name = "other-model"
+        await emb.embed_query("ブレーキ")
+
+        assert backend.calls == 2
@@ -0,0 +1,80 @@
+"""Tests for the shared embedding server and its Unix-socket client."""
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+from app.rag.embedder import LocalServerEmbedder
+from app.rag.embedding_server import EmbeddingServer
+
+
+class _FakeLocalBackend:
+    model_name = "fake-e5"
+
+    def __init__(self):
+        self.calls: list[tuple[str, list[str]]] = []
+
+    async def embed(self, texts):
+        self.calls.append(("passage", list(texts)))
+        return np.array([[float(len(t)), 0.0] for t in texts], dtype=np.float32)
+
+    async def embed_queries(self, texts):
+        self.calls.append(("query", list(texts)))
+        if "boom" in texts:
+            raise RuntimeError("model failure")
+        return np.array([[0.0, float(len(t))] for t in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def socket_path():
+    directory = tempfile.mkdtemp(prefix="emb-")
+    yield os.path.join(directory, "e.sock")
+
+
+class TestEmbeddingServer:
+    @pytest.mark.asyncio
+    async def test_query_and_passage_roundtrip(self, socket_path):
+        backend = _FakeLocalBackend()
+        server = EmbeddingServer(socket_path, backend)
+        await server.start()
+        try:
+            client = LocalServerEmbedder(socket_path=socket_path)
+            query = await client.embed_query("ブレーキ")
+            passages = await client.embed(["あ", "いいい"])
+            batch = await client.embed_queries(["a", "bb"])
+        finally:
+            await server.stop()
+
+        assert query.tolist() == [0.0, 4.0]
+        assert passages.dtype == np.float32
+        assert passages.tolist() == [[1.0, 0.0], [3.0, 0.0]]
+        assert batch.shape == (2, 2)
+        assert backend.calls[0] == ("query", ["ブレーキ"])
+        assert not os.path.exists(socket_path)
+
+    @pytest.mark.asyncio
+    async def test_connection_is_reused(self, socket_path):
+        server = EmbeddingServer(socket_path, _FakeLocalBackend())
+        await server.start()
+        try:
+            client = LocalServerEmbedder(socket_path=socket_path)
+            await client.embed_query("a")
+            first = client._idle[0]
+            await client.embed_query("b")
+            assert client._idle[0] is first
+        finally:
+            await server.stop()
+
+    @pytest.mark.asyncio
+    async def test_server_error_is_raised_on_client(self, socket_path):
+        server = EmbeddingServer(socket_path, _FakeLocalBackend())
+        await server.start()
+        try:
+            client = LocalServerEmbedder(socket_path=socket_path)
+            with pytest.raises(RuntimeError, match="model failure"):
+                await client.embed_query("boom")
+            # エラー後も同じ接続で続行できる
+            assert (await client.embed_query("ok")).tolist() == [0.0, 2.0]
+        finally:
+            await server.stop()
@@ -0,0 +1,121 @@
+"""Tests for the persistent content-addressed embedding store."""
+import numpy as np
+import pytest
+
+from app.rag.embedder import Embedder
+from app.rag.embedding_store import EmbeddingStore, content_key
+
+
+class _PassageBackend:
+    name = "fake"
+    model_name = "fake-model"
+
+    def __init__(self):
+        self.embedded: list[str] = []
+
+    async def embed(self, texts: list[str], progress_callback=None) -> list[list[float]]:
+        self.embedded.extend(texts)
+        return [[float(len(t)), 0.5] for t in texts]
+
+
+class TestContentKey:
+    def test_key_depends_on_model_prefix_and_text(self):
+        base = content_key("m", "passage", "text")
+        assert base == content_key("m", "passage", "text")
+        assert base != content_key("m2", "passage", "text")
+        assert base != content_key("m", "query", "text")
+        assert base != content_key("m", "passage", "text2")
+
+
+class TestEmbeddingStore:
+    def test_roundtrip_and_reload(self, tmp_path):
+        store = EmbeddingStore(str(tmp_path))
+        store.put_many("m", "passage", ["a", "b"], np.array([[1.0, 2.0], [3.0, 4.0]]))
+        b, missing, a = store.get_many("m", "passage", ["b", "x", "a"])
+        assert missing is None
+        assert b.tolist() == [3.0, 4.0]
+        assert a.tolist() == [1.0, 2.0]
+
+        reopened = EmbeddingStore(str(tmp_path))
+        assert [v.tolist() for v in reopened.get_many("m", "passage", ["a", "b"])] == [[1.0, 2.0], [3.0, 4.0]]
+        assert reopened.stats() == {"m": 2}
+
+    def test_duplicate_texts_stored_once(self, tmp_path):
+        store = EmbeddingStore(str(tmp_path))
+        store.put_many("m", "passage", ["a", "a"], [[1.0, 2.0], [1.0, 2.0]])
+        store.put_many("m", "passage", ["a"], [[1.0, 2.0]])
+        assert store.stats() == {"m": 1}
+
+    def test_float16_storage(self, tmp_path):
+        store = EmbeddingStore(str(tmp_path), dtype="float16")
+        store.put_many("m", "passage", ["a"], np.array([[0.5, 0.25]]))
+        (vector,) = store.get_many("m", "passage", ["a"])
+        assert vector.dtype == np.float32
+        assert vector.tolist() == [0.5, 0.25]
+
+    def test_dim_mismatch_raises(self, tmp_path):
+        store = EmbeddingStore(str(tmp_path))
+        store.put_many("m", "passage", ["a"], [[1.0, 2.0]])
+        with pytest.raises(ValueError):
+            store.put_many("m", "passage", ["b"], [[1.0, 2.0, 3.0]])
+
+
+class TestCrashRecovery:
+    def test_orphan_rows_truncated_on_reopen(self, tmp_path):
+        store = EmbeddingStore(str(tmp_path))
+        store.put_many("m", "passage", ["a"], np.array([[1.0, 1.0]]))
+        # ベクトルを書いた直後・キーを追記する前に落ちた状態
+        with open(tmp_path / "m" / "vectors.bin", "ab") as f:
+            f.write(np.array([[9.0, 9.0]], dtype=np.float32).tobytes())
+
+        EmbeddingStore(str(tmp_path)).put_many("m", "passage", ["b"], np.array([[0.0, 1.0]]))
+        reopened = EmbeddingStore(str(tmp_path))
+
+        assert [v.tolist() for v in reopened.get_many("m", "passage", ["a", "b"])] == [[1.0, 1.0], [0.0, 1.0]]
+        assert (tmp_path / "m" / "vectors.bin").stat().st_size == 2 * 2 * 4
+
+    def test_partial_key_line_discarded(self, tmp_path):
+        store = EmbeddingStore(str(tmp_path))
+        store.put_many("m", "passage", ["a"], np.array([[1.0, 1.0]]))
+        with open(tmp_path / "m" / "keys.txt", "a", encoding="utf-8") as f:
+            f.write("deadbeef")  # 改行前に落ちたキー
+
+        reopened = EmbeddingStore(str(tmp_path))
+        reopened.put_many("m", "passage", ["b"], np.array([[0.0, 1.0]]))
+
+        assert [v.tolist() for v in EmbeddingStore(str(tmp_path)).get_many("m", "passage", ["a", "b"])] == [
+            [1.0, 1.0], [0.0, 1.0],
+        ]
+
+
+class TestSharedWriters:
+    def test_two_stores_append_to_one_directory(self, tmp_path):
+        # 別プロセスのワーカーに相当する、索引を共有しない2つのストア
+        worker_a = EmbeddingStore(str(tmp_path))
+        worker_b = EmbeddingStore(str(tmp_path))
+        worker_a.put_many("m", "passage", ["a"], np.array([[1.0, 0.0]]))
+        worker_b.put_many("m", "passage", ["b"], np.array([[0.0, 1.0]]))
+        worker_a.put_many("m", "passage", ["c"], np.array([[1.0, 1.0]]))
+
+        for store in (worker_a, worker_b, EmbeddingStore(str(tmp_path))):
+            assert [v.tolist() for v in store.get_many("m", "passage", ["a", "b", "c"])] == [
+                [1.0, 0.0], [0.0, 1.0], [1.0, 1.0],
+            ]
+
+
+class TestEmbedderReusesStoredPassages:
+    @pytest.mark.asyncio
+    async def test_only_changed_chunks_are_embedded(self, tmp_path):
+        emb = Embedder()
+        emb._passage_store = EmbeddingStore(str(tmp_path))
+        backend = _PassageBackend()
+        emb._backend = backend
+
+        first = await emb.embed(["チャンク1", "チャンク2"])
+        backend.embedded.clear()
+        second = await emb.embed(["チャンク1", "チャンク2 改訂", "チャンク1"])
+
+        assert backend.embedded == ["チャンク2 改訂"]
+        assert np.array_equal(second[0], first[0])
+        assert np.array_equal(second[2], first[0])
+        assert second.shape == (3, 2)
@@ -0,0 +1,157 @@
+"""FlatIndexBackend（NumPy総当たりインデックス）と VehicleManualStore のバックエンド切替のテスト"""
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.rag.chunker import Chunk
+from app.rag.index_backends import ChromaIndexBackend, FlatIndexBackend, _top_k
+from app.rag.vector_store import VehicleManualStore, chunk_id
+
+
+def _meta(vehicle_id: str, page: int, has_warning: bool = False, content_type: str = "general") -> dict:
+    return {
+        "vehicle_id": vehicle_id,
+        "page": page,
+        "section": f"s{page}",
+        "content_type": content_type,
+        "has_warning": has_warning,
+    }
+
+
+def _populate(backend, vehicle_id: str = "v1", n: int = 6):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, 8)).astype(np.float32)
+    backend.add(
+        vehicle_id,
+        ids=[f"{vehicle_id}_{i}" for i in range(n)],
+        embeddings=vectors,
+        documents=[f"doc {i} {'ブレーキ' if i % 2 else 'エンジン'}" for i in range(n)],
+        metadatas=[_meta(vehicle_id, i, has_warning=i % 3 == 0) for i in range(n)],
+    )
+    return vectors
+
+
+class TestTopK:
+    def test_sorted_descending(self):
+        scores = np.array([[0.1, 0.9, 0.5, 0.7], [0.4, 0.3, 0.2, 0.1]], dtype=np.float32)
+        assert _top_k(scores, 2).tolist() == [[1, 3], [0, 1]]
+
+    def test_k_larger_than_rows(self):
+        scores = np.array([[0.2, 0.8]], dtype=np.float32)
+        assert _top_k(scores, 5).tolist() == [[1, 0]]
+
+
+class TestFlatIndexBackend:
+    def test_exact_nearest_neighbor(self, tmp_path):
+        backend = FlatIndexBackend(str(tmp_path))
+        vectors = _populate(backend)
+
+        hits = backend.query(vectors[[4]], vehicle_id="v1", n_results=3)[0]
+
+        assert len(hits) == 3
+        assert hits[0].id == "v1_4"
+        assert hits[0].score == pytest.approx(1.0, abs=1e-5)
+        assert [h.score for h in hits] == sorted((h.score for h in hits), reverse=True)
+
+    def test_vehicle_filter(self, tmp_path):
+        backend = FlatIndexBackend(str(tmp_path))
+        vectors = _populate(backend, "v1")
+        _populate(backend, "v2")
+
+        hits = backend.query(vectors[[0]], vehicle_id="v2", n_results=10)[0]
+        assert {h.metadata["vehicle_id"] for h in hits} == {"v2"}
+        assert backend.query(vectors[[0]], vehicle_id="unknown")[0] == []
+
+    def test_warning_only(self, tmp_path):
+        backend = FlatIndexBackend(str(tmp_path))
+        vectors = _populate(backend)
+
+        hits = backend.query(vectors[[1]], vehicle_id="v1", n_results=10, warning_only=True)[0]
+        assert {h.id for h in hits} == {"v1_0", "v1_3"}
+
+    def test_find_containing_and_get(self, tmp_path):
+        backend = FlatIndexBackend(str(tmp_path))
+        _populate(backend)
+        backend.add("v1", ["v1_x"], np.ones((1, 8), dtype=np.float32), ["仕様表"], [_meta("v1", 9, content_type="specification")])
+
+        assert [h.id for h in backend.find_containing("ブレーキ", "v1", limit=2)] == ["v1_1", "v1_3"]
+        assert [h.id for h in backend.get("v1", content_type="specification")] == ["v1_x"]
+        assert len(backend.get("v1")) == 7
+
+    def test_duplicate_ids_rejected(self, tmp_path):
+        backend = FlatIndexBackend(str(tmp_path))
+        _populate(backend)
+        with pytest.raises(ValueError):
+            backend.add("v1", ["v1_0"], np.ones((1, 8), dtype=np.float32), ["x"], [_meta("v1", 0)])
+
+    def test_persisted_and_reloaded(self, tmp_path):
+        backend = FlatIndexBackend(str(tmp_path))
+        vectors = _populate(backend)
+
+        reloaded = FlatIndexBackend(str(tmp_path))
+        assert reloaded.count() == 6
+        assert reloaded.query(vectors[[2]], vehicle_id="v1", n_results=1)[0][0].id == "v1_2"
+
+    def test_delete_vehicle(self, tmp_path):
+        backend = FlatIndexBackend(str(tmp_path))
+        _populate(backend, "v1")
+        _populate(backend, "v2")
+
+        backend.delete_vehicle("v1")
+
+        assert backend.count() == 6
+        assert FlatIndexBackend(str(tmp_path)).get("v1") == []
+
+
+class TestBackendParity:
+    def test_flat_matches_chroma_ranking(self, tmp_path):
+        flat = FlatIndexBackend(str(tmp_path / "flat"))
+        chroma = ChromaIndexBackend(str(tmp_path / "chroma"), "parity_test")
+        vectors = _populate(flat)
+        _populate(chroma)
+
+        for q in range(len(vectors)):
+            flat_hits = flat.query(vectors[[q]], vehicle_id="v1", n_results=3)[0]
+            chroma_hits = chroma.query(vectors[[q]], vehicle_id="v1", n_results=3)[0]
+            assert [h.id for h in flat_hits] == [h.id for h in chroma_hits]
+            assert [h.score for h in flat_hits] == pytest.approx([h.score for h in chroma_hits], abs=1e-4)
+
+
+def _keyword_vector(text: str) -> list[float]:
+    """「ブレーキ」を含むかどうかで向きが決まる2次元embedding"""
+    return [1.0, 0.0] if "ブレーキ" in text else [0.0, 1.0]
+
+
+class TestVehicleManualStoreFlat:
+    @pytest.mark.asyncio
+    async def test_search_result_format(self, fake_embedder, make_store):
+        chunks = [
+            Chunk(text="ブレーキ液を点検する", page=3, section="点検", content_type="procedure", has_warning=True),
+            Chunk(text="エンジンオイルの交換", page=7, section="整備", content_type="procedure"),
+        ]
+        fake_embedder.vector_fn = _keyword_vector
+        store = make_store()
+        await store.upsert_chunks(chunks, vehicle_id="v1")
+        results = await store.search("ブレーキが効かない", vehicle_id="v1", n_results=2)
+        keyword_results = await store.keyword_search("オイル", vehicle_id="v1")
+        stats = await store.get_stats()
+
+        assert results[0] == {
+            "id": chunk_id("v1", 3, "ブレーキ液を点検する"),
+            "content": "ブレーキ液を点検する",
+            "page": 3,
+            "section": "点検",
+            "content_type": "procedure",
+            "has_warning": True,
+            "score": pytest.approx(1.0),
+        }
+        assert [r["content"] for r in keyword_results] == ["エンジンオイルの交換"]
+        assert keyword_results[0]["score"] > 0
+        assert stats["backend"] == "flat"
+        assert stats["total_chunks"] == 2
+
+    def test_unknown_backend_rejected(self):
+        with patch("app.rag.vector_store.settings.vector_store_backend", "faiss"):
+            with pytest.raises(ValueError):
+                VehicleManualStore().initialize()
@@ -0,0 +1,67 @@
+"""Reciprocal Rank Fusion（NumPy実装）のテスト"""
+import pytest
+
+from app.rag.fusion import reciprocal_rank_fusion
+
+
+def _doc(doc_id: str, content_type: str = "general", score: float = 0.5) -> dict:
+    return {"id": doc_id, "content": f"本文 {doc_id}", "page": 1, "section": "",
+            "content_type": content_type, "has_warning": False, "score": score}
+
+
+class TestReciprocalRankFusion:
+    def test_two_lists_match_rrf_formula(self):
+        vector = [_doc("a"), _doc("b"), _doc("c")]
+        keyword = [_doc("c"), _doc("d")]
+
+        fused = reciprocal_rank_fusion([vector, keyword], k=60)
+
+        scores = {d["id"]: d["score"] for d in fused}
+        assert scores["a"] == pytest.approx(1.0)
+        assert scores["c"] == pytest.approx(60 / 62 + 1.0)
+        assert scores["d"] == pytest.approx(60 / 61)
+        assert [d["id"] for d in fused] == ["c", "a", "b", "d"]  # b と d は同点で先に現れた b が先
+
+    def test_content_type_boost(self):
+        fused = reciprocal_rank_fusion([[_doc("a"), _doc("b", content_type="procedure")]])
+
+        assert [d["id"] for d in fused] == ["b", "a"]
+        assert fused[0]["score"] == pytest.approx(60 / 61 * 1.3)
+
+    def test_many_lists_with_weights(self):
+        lists = [[_doc("a"), _doc("b")], [_doc("b"), _doc("a")], [_doc("b")]]
+
+        unweighted = reciprocal_rank_fusion(lists)
+        weighted = reciprocal_rank_fusion(lists, weights=[3.0, 1.0, 0.0])
+
+        assert unweighted[0]["id"] == "b"
+        assert weighted[0]["id"] == "a"
+        assert weighted[0]["score"] == pytest.approx(3.0 + 60 / 61)
+
+    def test_top_n_and_stable_ties(self):
+        fused = reciprocal_rank_fusion([[_doc("a")], [_doc("b")], [_doc("c")]], top_n=2)
+
+        assert [d["id"] for d in fused] == ["a", "b"]
+
+    def test_inputs_not_mutated(self):
+        vector = [_doc("a", score=0.8)]
+
+        fused = reciprocal_rank_fusion([vector, []])
+
+        assert vector[0]["score"] == 0.8
+        assert fused[0] is not vector[0]
+        assert fused[0]["content"] == vector[0]["content"]
+
+    def test_falls_back_to_content_key_without_id(self):
+        first = {"content": "同じ本文", "content_type": ""}
+        second = {"content": "同じ本文", "content_type": ""}
+
+        fused = reciprocal_rank_fusion([[first], [second]])
+
+        assert len(fused) == 1
+        assert fused[0]["score"] == pytest.approx(2.0)
+
+    def test_empty_and_invalid_weights(self):
+        assert reciprocal_rank_fusion([[], []]) == []
+        with pytest.raises(ValueError):
+            reciprocal_rank_fusion([[_doc("a")]], weights=[1.0, 2.0])
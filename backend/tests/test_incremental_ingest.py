@@ -0,0 +1,131 @@
+"""内容ハッシュのチャンクIDによる差分ingestのテスト"""
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.rag.chunker import Chunk
+from app.rag.index_backends import ChromaIndexBackend, FlatIndexBackend
+from app.rag.ingest import IngestionPipeline
+from app.rag.vector_store import chunk_id
+
+
+class TestChunkId:
+    def test_stable_and_normalized(self):
+        assert chunk_id("v1", 3, "ブレーキ液 を点検") == chunk_id("v1", 3, "ブレーキ液\n  を点検 ")
+        assert chunk_id("v1", 3, "ＡＢＳ警告灯") == chunk_id("v1", 3, "ABS警告灯")
+
+    def test_depends_on_vehicle_and_page(self):
+        base = chunk_id("v1", 3, "ブレーキ液を点検")
+        assert chunk_id("v2", 3, "ブレーキ液を点検") != base
+        assert chunk_id("v1", 4, "ブレーキ液を点検") != base
+        assert base.startswith("v1_")
+
+
+def _chunks(texts: list[str]) -> list[Chunk]:
+    return [Chunk(text=t, page=i + 1) for i, t in enumerate(texts)]
+
+
+class TestUpsertChunks:
+    @pytest.fixture
+    def env(self, fake_embedder, make_store):
+        return make_store(), fake_embedder
+
+    @pytest.mark.asyncio
+    async def test_reingest_unchanged_embeds_nothing(self, env):
+        store, fake = env
+        texts = ["ブレーキ液の点検", "エンジンオイルの交換", "ワイパーのヒューズ"]
+
+        first = await store.upsert_chunks(_chunks(texts), vehicle_id="v1")
+        fake.embedded.clear()
+        second = await store.upsert_chunks(_chunks(texts), vehicle_id="v1")
+
+        assert first == {"added": 3, "removed": 0, "unchanged": 0}
+        assert second == {"added": 0, "removed": 0, "unchanged": 3}
+        assert fake.embedded == []
+
+    @pytest.mark.asyncio
+    async def test_diff_adds_new_and_removes_vanished(self, env):
+        store, fake = env
+        await store.upsert_chunks(_chunks(["ブレーキ液の点検", "エンジンオイルの交換", "ワイパーのヒューズ"]), vehicle_id="v1")
+        fake.embedded.clear()
+
+        counts = await store.upsert_chunks(
+            _chunks(["ブレーキ液の点検", "エンジンオイルの交換", "タイヤ空気圧の調整"]), vehicle_id="v1",
+        )
+
+        assert counts == {"added": 1, "removed": 1, "unchanged": 2}
+        assert fake.embedded == ["タイヤ空気圧の調整"]
+        contents = sorted(c["content"] for c in await store.get_chunks("v1"))
+        assert contents == ["エンジンオイルの交換", "タイヤ空気圧の調整", "ブレーキ液の点検"]
+        assert await store.keyword_search("ワイパー", vehicle_id="v1") == []
+        assert [r["content"] for r in await store.keyword_search("タイヤ", vehicle_id="v1")] == ["タイヤ空気圧の調整"]
+
+    @pytest.mark.asyncio
+    async def test_old_version_served_until_swap(self, env):
+        store, _ = env
+        await store.upsert_chunks(_chunks(["旧チャンク"]), vehicle_id="v1")
+        old_physical = store._physical("v1")
+        seen_during_build: list[list[str]] = []
+        original = store._validate_version
+
+        def spy(physical, expected):
+            seen_during_build.append([h.document for h in store._get_backend().get(store._physical("v1"))])
+            original(physical, expected)
+
+        with patch.object(store, "_validate_version", spy):
+            await store.upsert_chunks(_chunks(["新チャンク"]), vehicle_id="v1")
+
+        assert seen_during_build == [["旧チャンク"]]
+        assert [c["content"] for c in await store.get_chunks("v1")] == ["新チャンク"]
+        assert store._get_backend().list_ids(old_physical) == []
+
+    @pytest.mark.asyncio
+    async def test_duplicate_chunks_collapsed(self, env):
+        store, _ = env
+        chunks = [Chunk(text="注意", page=1), Chunk(text="注意", page=1), Chunk(text="注意", page=2)]
+
+        counts = await store.upsert_chunks(chunks, vehicle_id="v1")
+
+        assert counts == {"added": 2, "removed": 0, "unchanged": 0}
+
+
+class TestBackendDiffOperations:
+    @pytest.mark.parametrize("kind", ["flat", "chroma"])
+    def test_list_and_delete_ids(self, tmp_path, kind):
+        if kind == "flat":
+            backend = FlatIndexBackend(str(tmp_path))
+        else:
+            backend = ChromaIndexBackend(str(tmp_path), "diff_test")
+        for vehicle_id in ("v1", "v2"):
+            backend.add(
+                vehicle_id,
+                [f"{vehicle_id}_a", f"{vehicle_id}_b"],
+                np.eye(2, dtype=np.float32),
+                ["a", "b"],
+                [{"vehicle_id": vehicle_id, "page": 1}, {"vehicle_id": vehicle_id, "page": 2}],
+            )
+
+        backend.delete_ids("v1", ["v1_a"])
+
+        assert sorted(backend.list_ids("v1")) == ["v1_b"]
+        assert sorted(backend.list_ids("v2")) == ["v2_a", "v2_b"]
+
+
+class TestIngestionResponse:
+    @pytest.mark.asyncio
+    async def test_reports_diff_counts(self):
+        counts = {"added": 2, "removed": 1, "unchanged": 5}
+
+        async def fake_upsert(chunks, **kwargs):
+            return counts
+
+        with patch("app.rag.ingest.pdf_loader.load_from_bytes", return_value=[object()]), \
+             patch("app.rag.ingest.chunker.chunk_pages", return_value=_chunks(["a"] * 7)), \
+             patch("app.rag.ingest.vector_store.upsert_chunks", fake_upsert):
+            result = await IngestionPipeline().ingest(b"%PDF", "manual.pdf", "v1")
+
+        assert result["chunks_created"] == 7
+        assert result["chunks_added"] == 2
+        assert result["chunks_removed"] == 1
+        assert result["chunks_unchanged"] == 5
@@ -0,0 +1,187 @@
+"""インデックスバンドル（エクスポート / インポート）のテスト"""
+import asyncio
+import shutil
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import admin
+from app.rag.chunker import Chunk
+from app.rag.index_bundle import BundleError, IndexBundle, read_bundle, read_manifest, write_bundle
+from app.rag.projection import EmbeddingProjection
+
+
+def _bundle(n: int = 3, dim: int = 4) -> IndexBundle:
+    return IndexBundle(
+        manifest={"vehicle_id": "v1", "embedding_model": "m"},
+        ids=[f"v1_{i}" for i in range(n)],
+        documents=[f"本文{i}" for i in range(n)],
+        metadatas=[{"vehicle_id": "v1", "page": i} for i in range(n)],
+        embeddings=np.arange(n * dim, dtype=np.float32).reshape(n, dim),
+        bm25=b"bm25-bytes",
+        projection={"mean": np.zeros(dim, dtype=np.float32), "components": np.eye(2, dim, dtype=np.float32)},
+    )
+
+
+class TestBundleFile:
+    def test_roundtrip_memory_maps_embeddings(self, tmp_path):
+        path = str(tmp_path / "v1.vbundle")
+        original = _bundle()
+
+        write_bundle(path, original)
+        loaded = read_bundle(path)
+
+        assert isinstance(loaded.embeddings, np.memmap)
+        np.testing.assert_array_equal(loaded.embeddings, original.embeddings)
+        assert loaded.ids == original.ids
+        assert loaded.documents == original.documents
+        assert loaded.metadatas == original.metadatas
+        assert loaded.bm25 == b"bm25-bytes"
+        np.testing.assert_array_equal(loaded.projection["components"], original.projection["components"])
+        assert loaded.manifest["count"] == 3
+        assert loaded.manifest["dim"] == 4
+        assert read_manifest(path)[0]["vehicle_id"] == "v1"
+
+    def test_corruption_detected(self, tmp_path):
+        path = tmp_path / "v1.vbundle"
+        write_bundle(str(path), _bundle())
+        data = bytearray(path.read_bytes())
+        data[-70] ^= 0xFF  # セクション領域の末尾付近を書き換える
+        path.write_bytes(bytes(data))
+
+        with pytest.raises(BundleError):
+            read_bundle(str(path))
+
+    def test_not_a_bundle(self, tmp_path):
+        path = tmp_path / "x.vbundle"
+        path.write_bytes(b"%PDF-1.7 not a bundle")
+        with pytest.raises(BundleError):
+            read_bundle(str(path))
+
+
+_TEXTS = ["ブレーキ液の点検", "エンジンオイルの交換", "ワイパーのヒューズ"]
+
+
+class TestStoreBundle:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("target_backend", ["flat", "chroma"])
+    async def test_export_then_import_without_reembedding(self, tmp_path, target_backend, fake_embedder, make_store):
+        path = str(tmp_path / "v1.vbundle")
+        source = make_store(name="source")
+        await source.upsert_chunks([Chunk(text=t, page=i) for i, t in enumerate(_TEXTS)], vehicle_id="v1")
+        exported = await source.export_bundle("v1", path)
+        fake_embedder.embedded.clear()
+
+        target = make_store(target_backend, name="target")
+        imported = await target.import_bundle(path)
+
+        assert exported["chunks"] == imported["chunks"] == 3
+        assert fake_embedder.embedded == []
+        expected = await source.search("ブレーキ", vehicle_id="v1")
+        actual = await target.search("ブレーキ", vehicle_id="v1")
+        assert [r["id"] for r in actual] == [r["id"] for r in expected]
+        assert [r["score"] for r in actual] == pytest.approx([r["score"] for r in expected], abs=1e-5)
+        keyword = await target.keyword_search("ワイパー", vehicle_id="v1")
+        assert [r["content"] for r in keyword] == ["ワイパーのヒューズ"]
+
+    @pytest.mark.asyncio
+    async def test_import_replaces_vehicle_and_invalidates_cache(self, tmp_path, fake_embedder, make_store):
+        path = str(tmp_path / "v1.vbundle")
+        source = make_store(name="source")
+        await source.upsert_chunks([Chunk(text="新しい本文", page=1)], vehicle_id="v1")
+        await source.export_bundle("v1", path)
+
+        target = make_store(name="target")
+        await target.upsert_chunks([Chunk(text="古い本文", page=1)], vehicle_id="v1")
+        assert [r["content"] for r in await target.search("本文", vehicle_id="v1")] == ["古い本文"]
+
+        await target.import_bundle(path)
+
+        assert [r["content"] for r in await target.search("本文", vehicle_id="v1")] == ["新しい本文"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("target_backend,expected_adds", [("flat", 1), ("chroma", 3)])
+    async def test_import_written_in_backend_batches(self, tmp_path, target_backend, expected_adds, fake_embedder, make_store):
+        path = str(tmp_path / "v1.vbundle")
+        source = make_store(name="source")
+        await source.upsert_chunks([Chunk(text=f"本文{i}", page=i) for i in range(120)], vehicle_id="v1")
+        await source.export_bundle("v1", path)
+
+        target = make_store(target_backend, name="target")
+        index = target._get_backend()
+        with patch.object(index, "add", wraps=index.add) as add:
+            await target.import_bundle(path)
+
+        assert add.call_count == expected_adds
+        assert len(index.list_ids(target._physical("v1"))) == 120
+
+    @pytest.mark.asyncio
+    async def test_rejects_different_embedding_model(self, tmp_path, fake_embedder, make_store):
+        path = str(tmp_path / "v1.vbundle")
+        source = make_store(name="source")
+        await source.upsert_chunks([Chunk(text="本文", page=1)], vehicle_id="v1")
+        await source.export_bundle("v1", path)
+
+        fake_embedder.model_name = "other-model"
+        with pytest.raises(BundleError):
+            await make_store(name="target").import_bundle(path)
+
+    @pytest.mark.asyncio
+    async def test_export_unknown_vehicle(self, tmp_path, fake_embedder, make_store):
+        with pytest.raises(ValueError):
+            await make_store(name="source").export_bundle("missing", str(tmp_path / "x.vbundle"))
+
+
+class TestProjectionState:
+    def test_import_state_installs_and_checks(self, tmp_path):
+        state = {"mean": np.zeros(4, dtype=np.float32), "components": np.eye(2, 4, dtype=np.float32)}
+        projection = EmbeddingProjection(mode="pca", dim=2, path=str(tmp_path / "p.npz"))
+
+        projection.import_state(state)
+
+        assert not projection.needs_fit
+        assert EmbeddingProjection(mode="pca", dim=2, path=str(tmp_path / "p.npz")).export_state() is not None
+        with pytest.raises(ValueError):
+            projection.import_state({**state, "components": np.eye(2, 4, k=1, dtype=np.float32)})
+
+
+class TestAdminEndpoints:
+    def test_export_and_import_over_http(self, fake_embedder, make_store):
+        app = FastAPI()
+        app.include_router(admin.router, prefix="/api")
+        client = TestClient(app)
+
+        source = make_store(name="source")
+        asyncio.run(source.upsert_chunks([Chunk(text=t, page=i) for i, t in enumerate(_TEXTS)], vehicle_id="v1"))
+        with patch.object(admin, "vector_store", source):
+            response = client.get("/api/admin/index-bundle/export", params={"vehicle_id": "v1"})
+            missing = client.get("/api/admin/index-bundle/export", params={"vehicle_id": "nope"})
+        assert response.status_code == 200
+        assert missing.status_code == 404
+
+        target = make_store(name="target")
+        copy_loops = []
+        original_copy = shutil.copyfileobj
+
+        def copyfileobj(src, dst):
+            copy_loops.append(asyncio._get_running_loop())
+            original_copy(src, dst)
+
+        with patch.object(admin, "vector_store", target), \
+             patch("app.api.admin.shutil.copyfileobj", copyfileobj):
+            imported = client.post(
+                "/api/admin/index-bundle/import",
+                files={"file": ("v1.vbundle", response.content, "application/octet-stream")},
+            )
+            broken = client.post(
+                "/api/admin/index-bundle/import",
+                files={"file": ("x.vbundle", b"garbage", "application/octet-stream")},
+            )
+
+        assert imported.status_code == 200
+        assert imported.json()["chunks"] == 3
+        assert broken.status_code == 400
+        assert copy_loops == [None, None]  # アップロードはイベントループ外で書き出す
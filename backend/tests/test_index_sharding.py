@@ -0,0 +1,144 @@
+"""車両単位のシャード（遅延ロード・LRU解放）のテスト"""
+import asyncio
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+import pytest
+
+from app.chat_flow.step1_vehicle_id import handle_vehicle_id
+from app.models.chat import ChatRequest
+from app.models.session import SessionState
+from app.rag.index_aliases import IndexAliases
+from app.rag.index_backends import ChromaIndexBackend, FlatIndexBackend
+from app.rag.vector_store import VehicleManualStore
+from app.services.vehicle_service import vehicle_service
+
+
+def _add_vehicle(backend, vehicle_id: str, n: int = 4, dim: int = 8, seed: int = 0) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    backend.add(
+        vehicle_id,
+        [f"{vehicle_id}_{i}" for i in range(n)],
+        vectors,
+        [f"{vehicle_id} doc {i}" for i in range(n)],
+        [{"vehicle_id": vehicle_id, "page": i, "has_warning": i == 0} for i in range(n)],
+    )
+    return vectors
+
+
+class TestFlatResidency:
+    def test_loaded_lazily(self, tmp_path):
+        vectors = _add_vehicle(FlatIndexBackend(str(tmp_path)), "v1")
+
+        backend = FlatIndexBackend(str(tmp_path))
+        assert backend.stats()["resident_vehicles"] == []
+        assert backend.count() == 4  # meta.json だけで数えられる
+        assert backend.stats()["resident_vehicles"] == []
+
+        hits = backend.query(vectors[[1]], vehicle_id="v1", n_results=1)[0]
+        assert hits[0].id == "v1_1"
+        assert backend.stats()["resident_vehicles"] == ["v1"]
+
+    def test_index_without_meta_is_listed_and_backfilled(self, tmp_path):
+        vectors = _add_vehicle(FlatIndexBackend(str(tmp_path)), "v1")
+        _add_vehicle(FlatIndexBackend(str(tmp_path)), "v2", n=2, seed=1)
+        (tmp_path / "v1" / "meta.json").unlink()  # meta.json 導入前に作ったインデックス
+
+        backend = FlatIndexBackend(str(tmp_path))
+        assert backend.list_vehicles() == ["v1", "v2"]
+        assert backend.count() == 6
+        assert (tmp_path / "v1" / "meta.json").is_file()
+
+        hits = backend.query(vectors[[1]], vehicle_id=None, n_results=1)[0]
+        assert hits[0].id == "v1_1"
+
+    def test_lru_eviction_under_budget(self, tmp_path):
+        writer = FlatIndexBackend(str(tmp_path))
+        vectors = {v: _add_vehicle(writer, v, seed=i) for i, v in enumerate(["v1", "v2", "v3"])}
+        shard_bytes = writer.stats()["resident_bytes"] // 3
+
+        backend = FlatIndexBackend(str(tmp_path), memory_budget_bytes=shard_bytes * 2 + 1)
+        for v in ("v1", "v2", "v3"):
+            backend.prefetch(v)
+        assert backend.stats()["resident_vehicles"] == ["v2", "v3"]
+
+        # 解放済みの車両もディスクから読み直して正しく検索できる
+        hits = backend.query(vectors["v1"][[2]], vehicle_id="v1", n_results=1)[0]
+        assert hits[0].id == "v1_2"
+        assert backend.stats()["resident_vehicles"] == ["v3", "v1"]
+        assert backend.stats()["resident_bytes"] <= backend.memory_budget_bytes
+
+    def test_single_shard_larger_than_budget_stays_resident(self, tmp_path):
+        backend = FlatIndexBackend(str(tmp_path), memory_budget_bytes=1)
+        _add_vehicle(backend, "v1")
+        _add_vehicle(backend, "v2")
+        assert backend.stats()["resident_vehicles"] == ["v2"]
+        assert len(backend.get("v1")) == 4
+
+
+class TestChromaPerVehicleShards:
+    def test_routing_and_isolation(self, tmp_path):
+        backend = ChromaIndexBackend(str(tmp_path), "shard_test", per_vehicle=True)
+        v1 = _add_vehicle(backend, "honda_accord_2011", seed=1)
+        _add_vehicle(backend, "toyota/prius 2020", seed=2)
+
+        hits = backend.query(v1[[3]], vehicle_id="honda_accord_2011", n_results=10)[0]
+        assert {h.metadata["vehicle_id"] for h in hits} == {"honda_accord_2011"}
+        assert hits[0].id == "honda_accord_2011_3"
+
+        warning_hits = backend.query(v1[[3]], vehicle_id="honda_accord_2011", n_results=10, warning_only=True)[0]
+        assert [h.id for h in warning_hits] == ["honda_accord_2011_0"]
+
+        # 車両横断検索は全シャードをマージする
+        cross = backend.query(v1[[3]], vehicle_id=None, n_results=8)[0]
+        assert len(cross) == 8
+        assert cross[0].id == "honda_accord_2011_3"
+        assert backend.count() == 8
+
+        assert backend.query(v1[[0]], vehicle_id="unknown")[0] == []
+        assert backend.get_by_ids(["toyota/prius 2020_1"], "toyota/prius 2020")[0].document == "toyota/prius 2020 doc 1"
+
+    def test_delete_vehicle_drops_collection(self, tmp_path):
+        backend = ChromaIndexBackend(str(tmp_path), "shard_test", per_vehicle=True)
+        _add_vehicle(backend, "v1")
+        _add_vehicle(backend, "v2")
+        backend.prefetch("v1")
+
+        backend.delete_vehicle("v1")
+
+        assert backend.list_ids("v1") == []
+        assert sorted(backend.list_ids("v2")) == ["v2_0", "v2_1", "v2_2", "v2_3"]
+        assert backend.count() == 4
+
+    def test_memory_budget_enables_lru_segment_cache(self, tmp_path):
+        backend = ChromaIndexBackend(str(tmp_path), "shard_test", per_vehicle=True, memory_budget_bytes=64 * 1024 * 1024)
+        vectors = _add_vehicle(backend, "v1")
+        assert backend.query(vectors[[0]], vehicle_id="v1", n_results=1)[0][0].id == "v1_0"
+
+
+class TestPrefetchOnVehicleSelection:
+    @pytest.mark.asyncio
+    async def test_schedule_prefetch_runs_in_background(self):
+        store = VehicleManualStore()
+        backend = MagicMock()
+        store._backend = backend
+        store._aliases = IndexAliases()
+
+        store.schedule_prefetch("v1")
+        await asyncio.gather(*store._prefetch_tasks)
+        await asyncio.sleep(0)  # 完了コールバックでタスク集合から外れる
+
+        backend.prefetch.assert_called_once_with("v1")
+        assert not store._prefetch_tasks
+
+    @pytest.mark.asyncio
+    async def test_step1_prefetches_selected_vehicle(self):
+        vehicle = vehicle_service.list_all()[0]
+        session = SessionState(session_id="s1")
+        request = ChatRequest(action="select_vehicle", action_value=vehicle.id)
+
+        with patch("app.chat_flow.step1_vehicle_id.vector_store") as mock_vs:
+            await handle_vehicle_id(session, request)
+
+        mock_vs.schedule_prefetch.assert_called_once_with(vehicle.id)
+        assert session.vehicle_id == vehicle.id
@@ -0,0 +1,92 @@
+"""Tests for cross-request micro-batching on a dedicated worker thread."""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.rag.micro_batcher import MicroBatcher
+
+
+class _RecordingEncoder:
+    def __init__(self, delay: float = 0.0):
+        self.calls: list[list[str]] = []
+        self.threads: set[str] = set()
+        self._delay = delay
+
+    def __call__(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(list(texts))
+        self.threads.add(threading.current_thread().name)
+        if self._delay:
+            time.sleep(self._delay)
+        return [[float(len(t))] for t in texts]
+
+
+class TestMicroBatcher:
+    @pytest.mark.asyncio
+    async def test_concurrent_requests_share_one_batch(self):
+        encoder = _RecordingEncoder()
+        batcher = MicroBatcher(encoder, max_batch_size=64, max_wait_ms=50)
+        texts = [f"query: {'x' * i}" for i in range(1, 21)]
+
+        results = await asyncio.gather(*(batcher.submit([t]) for t in texts))
+        batcher.shutdown()
+
+        assert [r[0][0] for r in results] == [float(len(t)) for t in texts]
+        assert len(encoder.calls) < len(texts)
+        assert sum(len(c) for c in encoder.calls) == len(texts)
+
+    @pytest.mark.asyncio
+    async def test_runs_off_the_event_loop_thread(self):
+        encoder = _RecordingEncoder()
+        batcher = MicroBatcher(encoder, max_batch_size=4, max_wait_ms=1, name="test-worker")
+
+        await batcher.submit(["a"])
+        batcher.shutdown()
+
+        assert encoder.threads == {"test-worker"}
+
+    @pytest.mark.asyncio
+    async def test_max_batch_size_caps_collection(self):
+        encoder = _RecordingEncoder(delay=0.02)
+        batcher = MicroBatcher(encoder, max_batch_size=2, max_wait_ms=50)
+
+        await asyncio.gather(*(batcher.submit([str(i)]) for i in range(6)))
+        batcher.shutdown()
+
+        assert all(len(c) <= 2 for c in encoder.calls)
+
+    @pytest.mark.asyncio
+    async def test_encode_error_propagates_to_all_waiters(self):
+        def failing(texts):
+            raise RuntimeError("boom")
+
+        batcher = MicroBatcher(failing, max_batch_size=8, max_wait_ms=20)
+        results = await asyncio.gather(
+            batcher.submit(["a"]), batcher.submit(["b"]), return_exceptions=True,
+        )
+        batcher.shutdown()
+
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    @pytest.mark.asyncio
+    async def test_empty_submit_returns_immediately(self):
+        batcher = MicroBatcher(_RecordingEncoder())
+        assert len(await batcher.submit([])) == 0
+
+    @pytest.mark.asyncio
+    async def test_batches_non_text_items(self):
+        calls: list[list[tuple[str, str]]] = []
+
+        def score(pairs):
+            calls.append(list(pairs))
+            return [float(len(q) + len(d)) for q, d in pairs]
+
+        batcher = MicroBatcher(score, max_batch_size=8, max_wait_ms=50)
+        first, second = await asyncio.gather(
+            batcher.submit([("q", "ab"), ("q", "abc")]), batcher.submit([("qq", "a")]),
+        )
+        batcher.shutdown()
+
+        assert (list(first), list(second)) == ([3.0, 4.0], [3.0])
+        assert len(calls) == 1
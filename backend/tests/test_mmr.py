@@ -0,0 +1,113 @@
+"""MMRによる候補チャンクの多様化のテスト"""
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+from app.rag.chunker import Chunk
+from app.rag.index_backends import ChromaIndexBackend, FlatIndexBackend
+from app.rag.mmr import mmr_select
+from app.services.rag_service import RAGService
+
+
+class TestMmrSelect:
+    def setup_method(self):
+        self.query = np.array([1.0, 0.0, 0.0])
+        # 0 と 1 はほぼ同じ向き（重なり分割の重複）、2 は関連度がやや低いが別の内容
+        self.candidates = np.array([
+            [0.95, 0.31, 0.0],
+            [0.94, 0.33, 0.0],
+            [0.80, 0.0, 0.60],
+        ])
+
+    def test_lambda_one_is_relevance_order(self):
+        assert mmr_select(self.query, self.candidates, lambda_mult=1.0) == [0, 1, 2]
+
+    def test_prefers_diverse_candidate_over_near_duplicate(self):
+        assert mmr_select(self.query, self.candidates, lambda_mult=0.5) == [0, 2, 1]
+
+    def test_duplicate_threshold_drops_near_duplicates(self):
+        selected = mmr_select(self.query, self.candidates, lambda_mult=1.0, duplicate_threshold=0.99)
+        assert selected == [0, 2]
+
+    def test_top_n(self):
+        assert mmr_select(self.query, self.candidates, top_n=1) == [0]
+        assert mmr_select(self.query, np.empty((0, 3))) == []
+
+    def test_inputs_need_not_be_normalized(self):
+        assert mmr_select(self.query * 5, self.candidates * 3, lambda_mult=0.5) == [0, 2, 1]
+
+
+class TestBackendGetEmbeddings:
+    @pytest.mark.parametrize("kind", ["flat", "chroma"])
+    def test_returns_stored_vectors_by_id(self, tmp_path, kind):
+        if kind == "flat":
+            backend = FlatIndexBackend(str(tmp_path))
+        else:
+            backend = ChromaIndexBackend(str(tmp_path), "mmr_test")
+        vectors = np.array([[1.0, 0.0], [0.0, 1.0]], dtype=np.float32)
+        backend.add("v1", ["a", "b"], vectors, ["A", "B"], [{"vehicle_id": "v1"}, {"vehicle_id": "v1"}])
+
+        found = backend.get_embeddings(["b", "missing"], "v1")
+
+        assert list(found) == ["b"]
+        assert found["b"] == pytest.approx(vectors[1])
+
+
+_AXES = {"ブ": [1.0, 0.0, 0.0], "ワ": [0.0, 1.0, 0.0]}
+
+
+def _axis_vector(text: str) -> np.ndarray:
+    """本文の先頭文字で向きが決まるダミーembedding"""
+    return np.array(_AXES.get(text[0], [0.0, 0.0, 1.0]), dtype=np.float32) + 0.01 * len(text)
+
+
+class TestDiversify:
+    @pytest.fixture
+    def store(self, fake_embedder, make_store):
+        fake_embedder.vector_fn = _axis_vector
+        return make_store()
+
+    @pytest.mark.asyncio
+    async def test_drops_overlapping_chunks(self, store):
+        texts = ["ブレーキ液の点検手順", "ブレーキ液の点検手順。", "ワイパーのヒューズ"]
+        await store.upsert_chunks([Chunk(text=t, page=1) for t in texts], vehicle_id="v1")
+        chunks = await store.get_chunks("v1")
+        extra = {"content": "IDのない結果", "score": 0.5}
+
+        result = await store.diversify("ブレーキ", chunks + [extra], vehicle_id="v1")
+
+        contents = [c["content"] for c in result]
+        assert len([c for c in contents if c.startswith("ブレーキ")]) == 1
+        assert "ワイパーのヒューズ" in contents
+        assert contents[-1] == "IDのない結果"
+
+    @pytest.mark.asyncio
+    async def test_disabled(self, store):
+        chunks = [{"id": "x", "content": "a"}, {"id": "y", "content": "b"}]
+        with patch("app.rag.vector_store.settings.mmr_enabled", False):
+            assert await store.diversify("q", chunks, vehicle_id="v1") is chunks
+
+
+class TestRAGServiceDiversifiesBeforeRerank:
+    @pytest.mark.asyncio
+    async def test_rerank_receives_diversified_candidates(self):
+        chunks = [
+            {"id": f"v1_{i}", "content": f"チャンク{i}", "page": i, "section": "",
+             "content_type": "", "has_warning": False, "score": 0.9}
+            for i in range(3)
+        ]
+        mock_vs = AsyncMock()
+        mock_vs.search_many.return_value = [chunks]
+        mock_vs.hybrid_search.return_value = chunks
+        mock_vs.diversify.side_effect = lambda query, candidates, **kwargs: candidates[:1]
+        mock_rerank = AsyncMock(side_effect=lambda query, chunks, top_n: [{**c, "rerank_score": 8} for c in chunks])
+
+        with patch("app.services.rag_service.vector_store", mock_vs), \
+             patch("app.services.rag_service._generate_alt_queries", AsyncMock(return_value=[])), \
+             patch("app.services.rag_service.rerank", mock_rerank):
+            result = await RAGService().query("エンジンがかからない", vehicle_id="v1")
+
+        assert mock_vs.diversify.call_args.args[1] == chunks
+        assert mock_rerank.call_args.kwargs["chunks"] == chunks[:1]
+        assert [s["page"] for s in result["sources"]] == [0]
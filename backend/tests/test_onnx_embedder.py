@@ -0,0 +1,56 @@
+"""Tests for the ONNX Runtime local embedder pooling."""
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.rag.embedder import LocalOnnxEmbedder
+
+
+class _FakeTokenizer:
+    def encode_batch(self, texts):
+        # 1件目は3トークン、2件目は2トークン + パディング
+        return [
+            SimpleNamespace(ids=[0, 5, 2], attention_mask=[1, 1, 1]),
+            SimpleNamespace(ids=[0, 2, 1], attention_mask=[1, 1, 0]),
+        ][: len(texts)]
+
+
+class _FakeSession:
+    def run(self, outputs, feeds):
+        assert set(feeds) == {"input_ids", "attention_mask"}
+        hidden = np.array([
+            [[1.0, 0.0], [3.0, 0.0], [2.0, 0.0]],
+            [[0.0, 2.0], [0.0, 4.0], [100.0, 100.0]],  # パディング位置は無視される
+        ], dtype=np.float32)
+        return [hidden[: feeds["input_ids"].shape[0]]]
+
+
+class TestLocalOnnxEmbedder:
+    def test_mean_pooling_ignores_padding_and_normalizes(self):
+        emb = LocalOnnxEmbedder()
+        emb._model = _FakeSession()
+        emb._tokenizer = _FakeTokenizer()
+
+        vectors = emb._encode(["query: a", "query: b"])
+
+        assert vectors.dtype == np.float32
+        assert np.allclose(vectors, [[1.0, 0.0], [0.0, 1.0]])
+
+    def test_model_name_separates_store_keys(self):
+        assert LocalOnnxEmbedder().model_name.endswith("#onnx-int8")
+
+    @pytest.mark.asyncio
+    async def test_embed_query_uses_query_prefix(self):
+        emb = LocalOnnxEmbedder()
+        seen: list[str] = []
+
+        def fake_encode(texts):
+            seen.extend(texts)
+            return [[1.0] for _ in texts]
+
+        emb._batcher._batch_fn = fake_encode
+        await emb.embed_query("エンジン")
+        emb._batcher.shutdown()
+
+        assert seen == ["query: エンジン"]
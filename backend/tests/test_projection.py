@@ -0,0 +1,59 @@
+"""Tests for embedding dimensionality reduction."""
+import numpy as np
+import pytest
+
+from app.rag.projection import EmbeddingProjection
+
+
+def _random_unit_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    m = rng.normal(size=(n, dim)).astype(np.float32)
+    return m / np.linalg.norm(m, axis=1, keepdims=True)
+
+
+class TestEmbeddingProjection:
+    def test_none_is_identity(self):
+        vectors = _random_unit_vectors(4, 8)
+        projection = EmbeddingProjection(mode="none")
+        assert not projection.enabled
+        assert np.array_equal(projection.transform(vectors), vectors)
+
+    def test_truncate_keeps_prefix_and_normalizes(self):
+        projection = EmbeddingProjection(mode="truncate", dim=2)
+        out = projection.transform([[3.0, 4.0, 10.0]])
+        assert np.allclose(out, [[0.6, 0.8]])
+        assert not projection.needs_fit
+
+    def test_pca_fit_transform_shapes_and_norms(self):
+        vectors = _random_unit_vectors(50, 16)
+        projection = EmbeddingProjection(mode="pca", dim=4)
+        assert projection.needs_fit
+        projection.fit(vectors)
+        out = projection.transform(vectors)
+        assert out.shape == (50, 4)
+        assert np.allclose(np.linalg.norm(out, axis=1), 1.0, atol=1e-5)
+
+    def test_pca_requires_enough_samples(self):
+        projection = EmbeddingProjection(mode="pca", dim=8)
+        with pytest.raises(ValueError):
+            projection.fit(_random_unit_vectors(4, 16))
+
+    def test_pca_persisted_and_reloaded(self, tmp_path):
+        path = str(tmp_path / "proj.npz")
+        vectors = _random_unit_vectors(30, 12)
+        first = EmbeddingProjection(mode="pca", dim=3, path=path)
+        first.fit(vectors)
+
+        reloaded = EmbeddingProjection(mode="pca", dim=3, path=path)
+        assert not reloaded.needs_fit
+        assert np.allclose(reloaded.transform(vectors), first.transform(vectors))
+
+    def test_reload_with_different_dim_fails(self, tmp_path):
+        path = str(tmp_path / "proj.npz")
+        EmbeddingProjection(mode="pca", dim=3, path=path).fit(_random_unit_vectors(30, 12))
+        with pytest.raises(ValueError):
+            EmbeddingProjection(mode="pca", dim=4, path=path)
+
+    def test_unknown_mode_rejected(self):
+        with pytest.raises(ValueError):
+            EmbeddingProjection(mode="umap")
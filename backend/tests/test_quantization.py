@@ -0,0 +1,124 @@
+"""量子化（float16/int8）した flat インデックスと厳密再スコアのテスト"""
+import os
+
+import numpy as np
+import pytest
+
+from app.rag.index_backends import FlatIndexBackend
+from app.rag.quantization import QuantizedMatrix, rescored_top_k
+
+
+def _unit_rows(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    matrix = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return matrix / np.linalg.norm(matrix, axis=1, keepdims=True)
+
+
+class TestQuantizedMatrix:
+    @pytest.mark.parametrize("mode,ratio", [("float16", 2), ("int8", 4)])
+    def test_compact_size_and_approximation(self, mode, ratio):
+        matrix = _unit_rows(500, 64)
+        queries = _unit_rows(3, 64, seed=1)
+
+        compact = QuantizedMatrix.encode(matrix, mode)
+
+        assert compact.codes.nbytes * ratio == matrix.nbytes
+        np.testing.assert_allclose(compact.scores(queries), queries @ matrix.T, atol=0.02)
+
+    def test_save_load_roundtrip(self, tmp_path):
+        compact = QuantizedMatrix.encode(_unit_rows(10, 8), "int8")
+        path = str(tmp_path / "codes.npz")
+
+        compact.save(path)
+        loaded = QuantizedMatrix.load(path, "int8")
+
+        np.testing.assert_array_equal(loaded.codes, compact.codes)
+        np.testing.assert_array_equal(loaded.scales, compact.scales)
+
+    def test_unknown_mode(self):
+        with pytest.raises(ValueError):
+            QuantizedMatrix.encode(_unit_rows(2, 4), "int4")
+
+
+class TestRescoredTopK:
+    def test_matches_exact_search_and_returns_float32_scores(self):
+        matrix = _unit_rows(2000, 32)
+        queries = _unit_rows(5, 32, seed=2)
+        exact = queries @ matrix.T
+        expected = np.argsort(-exact, axis=1)[:, :10]
+
+        rows, scores = rescored_top_k(queries, QuantizedMatrix.encode(matrix, "int8"), matrix, 10, 4)
+
+        recall = np.mean([len(set(r) & set(e)) / 10 for r, e in zip(rows, expected)])
+        assert recall >= 0.95
+        np.testing.assert_allclose(scores, np.take_along_axis(exact, rows, axis=1), rtol=1e-5)
+        assert np.all(np.diff(scores, axis=1) <= 0)
+
+
+def _add(backend, vehicle_id, vectors, warning_rows=(), offset=0):
+    backend.add(
+        vehicle_id,
+        [f"{vehicle_id}_{offset + i}" for i in range(len(vectors))],
+        vectors,
+        [f"doc {i}" for i in range(len(vectors))],
+        [{"vehicle_id": vehicle_id, "page": i, "has_warning": i in warning_rows} for i in range(len(vectors))],
+    )
+
+
+class TestQuantizedFlatBackend:
+    @pytest.mark.parametrize("mode", ["float16", "int8"])
+    def test_results_match_float32_backend(self, tmp_path, mode):
+        vectors = _unit_rows(300, 32)
+        queries = _unit_rows(4, 32, seed=3)
+        baseline = FlatIndexBackend(str(tmp_path / "f32"))
+        quantized = FlatIndexBackend(str(tmp_path / mode), quantization=mode)
+        for backend in (baseline, quantized):
+            _add(backend, "v1", vectors[:200], warning_rows={3, 7})
+            _add(backend, "v1", vectors[200:], offset=200)
+            backend.delete_ids("v1", ["v1_5"])
+
+        for warning_only in (False, True):
+            expected = baseline.query(queries, "v1", n_results=5, warning_only=warning_only)
+            actual = quantized.query(queries, "v1", n_results=5, warning_only=warning_only)
+            assert [[h.id for h in hits] for hits in actual] == [[h.id for h in hits] for hits in expected]
+            np.testing.assert_allclose(
+                [[h.score for h in hits] for hits in actual],
+                [[h.score for h in hits] for hits in expected],
+                rtol=1e-5,
+            )
+
+        stats = quantized.stats()
+        assert stats["quantization"] == mode
+        assert stats["resident_bytes"] < baseline.stats()["resident_bytes"]
+
+    def test_reload_memory_maps_originals_and_builds_missing_codes(self, tmp_path):
+        vectors = _unit_rows(50, 16)
+        _add(FlatIndexBackend(str(tmp_path)), "v1", vectors)  # 量子化なしで作成済みのインデックス
+
+        backend = FlatIndexBackend(str(tmp_path), quantization="int8")
+        hits = backend.query(vectors[[7]], "v1", n_results=1)[0]
+
+        assert hits[0].id == "v1_7"
+        assert os.path.isfile(tmp_path / "v1" / "embeddings.int8.npz")
+        assert isinstance(backend._vehicles["v1"].embeddings, np.memmap)
+        assert backend.get_embeddings(["v1_7"], "v1")["v1_7"] == pytest.approx(vectors[7], abs=1e-6)
+
+        backend.delete_vehicle("v1")
+        assert not os.path.exists(tmp_path / "v1")
+
+    def test_codes_rebuilt_after_unquantized_rewrite(self, tmp_path):
+        vectors = _unit_rows(20, 16)
+        _add(FlatIndexBackend(str(tmp_path), quantization="int8"), "v1", vectors)
+        # 量子化なしのワーカーが同じ行数のまま中身を書き換える
+        plain = FlatIndexBackend(str(tmp_path))
+        plain.delete_ids("v1", ["v1_0"])
+        replacement = _unit_rows(1, 16, seed=9)
+        _add(plain, "v1", replacement, offset=100)
+
+        assert not os.path.exists(tmp_path / "v1" / "embeddings.int8.npz")
+        hits = FlatIndexBackend(str(tmp_path), quantization="int8").query(replacement, "v1", n_results=1)[0]
+        assert hits[0].id == "v1_100"
+        assert hits[0].score == pytest.approx(1.0, abs=1e-5)
+
+    def test_unknown_quantization(self, tmp_path):
+        with pytest.raises(ValueError):
+            FlatIndexBackend(str(tmp_path), quantization="int4")
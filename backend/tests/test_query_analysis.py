@@ -0,0 +1,85 @@
+"""リクエスト単位のクエリ解析（QueryAnalysis）の使い回しのテスト"""
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.rag import query_analysis
+from app.rag.chunker import Chunk
+from app.rag.query_analysis import QueryAnalysis
+from app.services.rag_service import RAGService
+
+
+class TestQueryAnalysis:
+    def test_inferred_keywords_and_rerank_query(self):
+        analysis = QueryAnalysis("ワイパーが動かない")
+
+        assert "ヒューズ" in analysis.inferred_keywords
+        assert all(kw not in analysis.symptom for kw in analysis.inferred_keywords)
+        assert analysis.rerank_query.startswith("ワイパーが動かない (関連部品: ")
+
+    def test_rerank_query_without_inferred_keywords(self):
+        assert QueryAnalysis("ブレーキ").rerank_query == "ブレーキ"
+
+    def test_keywords_extracted_once_per_query(self):
+        analysis = QueryAnalysis("ワイパーが動かない")
+        with patch.object(query_analysis, "extract_keywords", wraps=query_analysis.extract_keywords) as spy:
+            analysis.keywords_for("ワイパーが動かない")
+            analysis.inferred_keywords
+            analysis.rerank_query
+            analysis.keywords_for("ヒューズ切れ")
+
+        assert [c.args[0] for c in spy.call_args_list] == ["ワイパーが動かない", "ヒューズ切れ"]
+
+
+def _vector(text):
+    return [float("ワイパー" in text), float("ヒューズ" in text), 0.1]
+
+
+class TestStoreReusesQueryEmbeddings:
+    @pytest.mark.asyncio
+    async def test_search_and_diversify_reuse_batch_embeddings(self, fake_embedder, make_store):
+        fake_embedder.vector_fn = _vector
+        store = make_store()
+        await store.upsert_chunks(
+            [Chunk(text=t, page=i) for i, t in enumerate(["ワイパーのヒューズ", "ワイパーゴム", "ヒューズ一覧"])],
+            vehicle_id="v1",
+        )
+        analysis = QueryAnalysis("ワイパーが動かない")
+
+        results = await store.search_many(
+            ["ワイパーが動かない", "ワイパーが動かない ヒューズ"], vehicle_id="v1", analysis=analysis,
+        )
+        await store.hybrid_search("ワイパーが動かない ヒューズ", vehicle_id="v1", n_results=3, analysis=analysis)
+        await store.diversify("ワイパーが動かない", results[0], vehicle_id="v1", analysis=analysis)
+
+        assert fake_embedder.query_batches == [["ワイパーが動かない", "ワイパーが動かない ヒューズ"]]
+        assert fake_embedder.single_calls == []
+
+
+class TestRAGServiceSharesAnalysis:
+    @pytest.mark.asyncio
+    async def test_crag_gate_reuses_alt_queries(self):
+        chunk = {"id": "v1_0", "content": "ワイパーのヒューズ", "page": 1, "section": "",
+                 "content_type": "specification", "has_warning": False, "score": 0.9}
+        mock_vs = AsyncMock()
+        mock_vs.search_many.side_effect = lambda queries, **kwargs: [[chunk] for _ in queries]
+        mock_vs.hybrid_search.return_value = [chunk]
+        mock_vs.diversify.side_effect = lambda query, chunks, **kwargs: chunks
+        generate = AsyncMock(return_value=["a", "b"])
+
+        async def ambiguous_rerank(query, chunks, top_n):
+            return [{**c, "rerank_score": 5} for c in chunks[:top_n]]
+
+        with patch("app.services.rag_service.vector_store", mock_vs), \
+             patch("app.services.rag_service._generate_alt_queries", generate), \
+             patch("app.services.rag_service.rerank", ambiguous_rerank), \
+             patch.object(query_analysis, "extract_keywords", wraps=query_analysis.extract_keywords) as spy:
+            await RAGService().query("ワイパーが動かない", vehicle_id="v1")
+
+        generate.assert_awaited_once()
+        # Ambiguousゲートの再検索は生成済みの追加クエリを使う
+        crag_queries = [c.kwargs["query"] for c in mock_vs.hybrid_search.call_args_list[1:]]
+        assert crag_queries == ["a", "b"]
+        analyses = {id(c.kwargs["analysis"]) for c in mock_vs.hybrid_search.call_args_list}
+        assert len(analyses) == 1
+        assert [c.args[0] for c in spy.call_args_list] == ["ワイパーが動かない"]
@@ -0,0 +1,112 @@
+"""RAGService.query のステージ並行実行と待ち時間上限のテスト"""
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.services.rag_service import RAGService
+
+_CHUNK = {"id": "v1_0", "content": "ワイパーのヒューズ", "page": 1, "section": "",
+          "content_type": "specification", "has_warning": False, "score": 0.9}
+_ALT_CHUNK = {**_CHUNK, "id": "v1_1", "content": "ワイパーモーターの点検", "page": 2}
+
+
+def _store(search_delay: float = 0.0, hybrid_delay: float = 0.0) -> AsyncMock:
+    mock_vs = AsyncMock()
+
+    async def search_many(queries, **kwargs):
+        await asyncio.sleep(search_delay)
+        if queries[0] == "alt":
+            return [[_ALT_CHUNK]]
+        return [[_CHUNK]] + [[] for _ in queries[1:]]
+
+    async def hybrid_search(**kwargs):
+        await asyncio.sleep(hybrid_delay)
+        return [_CHUNK]
+
+    mock_vs.search_many.side_effect = search_many
+    mock_vs.hybrid_search.side_effect = hybrid_search
+    mock_vs.diversify.side_effect = lambda query, chunks, **kwargs: chunks
+    return mock_vs
+
+
+def _slow_alt_queries(delay: float):
+    async def generate(symptom):
+        await asyncio.sleep(delay)
+        return ["alt"]
+    return generate
+
+
+async def _keep_order(query, chunks, top_n):
+    return [{**c, "rerank_score": 8} for c in chunks[:top_n]]
+
+
+class TestConcurrentStages:
+    @pytest.mark.asyncio
+    async def test_main_search_overlaps_alt_query_generation(self):
+        mock_vs = _store(search_delay=0.1, hybrid_delay=0.1)
+        with patch("app.services.rag_service.vector_store", mock_vs), \
+             patch("app.services.rag_service._generate_alt_queries", _slow_alt_queries(0.2)), \
+             patch("app.services.rag_service.rerank", _keep_order):
+            t0 = time.perf_counter()
+            result = await RAGService().query("ワイパーが動かない", vehicle_id="v1")
+            elapsed = time.perf_counter() - t0
+
+        # 直列なら 0.1 + 0.1 + 0.2 + 0.1 = 0.5秒。最長経路（生成0.2 + 追加検索0.1）で終わる
+        assert elapsed < 0.4
+        assert [s["page"] for s in result["sources"]] == [1, 2]
+
+
+class TestStageTimeouts:
+    @pytest.mark.asyncio
+    async def test_slow_alt_queries_are_skipped(self):
+        mock_vs = _store()
+        with patch("app.services.rag_service.vector_store", mock_vs), \
+             patch("app.services.rag_service._generate_alt_queries", _slow_alt_queries(5.0)), \
+             patch("app.services.rag_service.rerank", _keep_order), \
+             patch("app.services.rag_service.settings.rag_alt_query_timeout_seconds", 0.05):
+            t0 = time.perf_counter()
+            result = await RAGService().query("ワイパーが動かない", vehicle_id="v1")
+
+        assert time.perf_counter() - t0 < 1.0
+        assert [s["page"] for s in result["sources"]] == [1]
+        assert mock_vs.search_many.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_slow_main_search_is_awaited(self):
+        mock_vs = _store(hybrid_delay=0.3)
+        with patch("app.services.rag_service.vector_store", mock_vs), \
+             patch("app.services.rag_service._generate_alt_queries", AsyncMock(return_value=["alt"])), \
+             patch("app.services.rag_service.rerank", _keep_order), \
+             patch("app.services.rag_service.settings.rag_search_timeout_seconds", 0.05):
+            result = await RAGService().query("ワイパーが動かない", vehicle_id="v1")
+
+        # 検索の上限を超えてもメイン検索の結果は捨てない
+        assert [s["page"] for s in result["sources"]] == [1, 2]
+
+    @pytest.mark.asyncio
+    async def test_slow_alt_search_is_skipped(self):
+        mock_vs = _store(search_delay=0.3)
+        with patch("app.services.rag_service.vector_store", mock_vs), \
+             patch("app.services.rag_service._generate_alt_queries", AsyncMock(return_value=["alt"])), \
+             patch("app.services.rag_service.rerank", _keep_order), \
+             patch("app.services.rag_service.settings.rag_search_timeout_seconds", 0.05):
+            result = await RAGService().query("ワイパーが動かない", vehicle_id="v1")
+
+        assert [s["page"] for s in result["sources"]] == [1]
+
+    @pytest.mark.asyncio
+    async def test_slow_rerank_keeps_search_order(self):
+        async def slow_rerank(query, chunks, top_n):
+            await asyncio.sleep(5.0)
+            return []
+
+        mock_vs = _store()
+        with patch("app.services.rag_service.vector_store", mock_vs), \
+             patch("app.services.rag_service._generate_alt_queries", AsyncMock(return_value=["alt"])), \
+             patch("app.services.rag_service.rerank", slow_rerank), \
+             patch("app.services.rag_service.settings.rag_rerank_timeout_seconds", 0.05):
+            result = await RAGService().query("ワイパーが動かない", vehicle_id="v1")
+
+        assert [s["page"] for s in result["sources"]] == [1, 2]
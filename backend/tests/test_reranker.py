@@ -0,0 +1,96 @@
+"""リランカーのバックエンド切り替え（LLM / ローカルcross-encoder）のテスト"""
+import threading
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+from app.rag import reranker
+from app.rag.reranker import CrossEncoderReranker, rerank
+
+
+class _FakeCrossEncoder:
+    """文書に「ヒューズ」を含めば高確率を返すダミーモデル"""
+
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.threads: set[str] = set()
+        self.calls: list[list[tuple[str, str]]] = []
+
+    def predict(self, pairs, batch_size=32, convert_to_numpy=True, show_progress_bar=False):
+        if self.fail:
+            raise RuntimeError("model missing")
+        self.threads.add(threading.current_thread().name)
+        self.calls.append(list(pairs))
+        return np.array([0.95 if "ヒューズ" in doc else 0.1 for _, doc in pairs], dtype=np.float32)
+
+
+def _chunks(contents: list[str]) -> list[dict]:
+    return [
+        {"id": f"v1_{i}", "content": c, "page": i, "section": "", "content_type": "general", "score": 0.5}
+        for i, c in enumerate(contents)
+    ]
+
+
+@pytest.fixture
+def cross_encoder():
+    instance = CrossEncoderReranker()
+    instance._model = _FakeCrossEncoder()
+    with patch.object(reranker, "cross_encoder_reranker", instance), \
+         patch("app.rag.reranker.settings.reranker_backend", "cross_encoder"):
+        yield instance
+    instance._batcher.shutdown()
+
+
+class TestCrossEncoderBackend:
+    @pytest.mark.asyncio
+    async def test_scores_on_llm_scale_and_runs_off_event_loop(self, cross_encoder):
+        chunks = _chunks(["ワイパーの使い方", "ヒューズ一覧表", "タイヤ交換", "ワイパーのヒューズ"])
+
+        result = await rerank("ワイパーが動かない", chunks, top_n=2)
+
+        assert [c["content"] for c in result] == ["ヒューズ一覧表", "ワイパーのヒューズ"]
+        assert [c["rerank_score"] for c in result] == [pytest.approx(9.5), pytest.approx(9.5)]
+        assert cross_encoder._model.threads == {"cross-encoder-reranker"}
+        assert len(cross_encoder._model.calls) == 1  # 全ペアを1回の推論で
+
+    @pytest.mark.asyncio
+    async def test_low_scores_kept_when_nothing_passes(self, cross_encoder):
+        result = await rerank("ワイパーが動かない", _chunks(["a", "b", "c"]), top_n=2)
+
+        assert [c["rerank_score"] for c in result] == [pytest.approx(1.0), pytest.approx(1.0)]
+
+    @pytest.mark.asyncio
+    async def test_model_failure_falls_back_to_search_order(self, cross_encoder):
+        cross_encoder._model.fail = True
+        chunks = _chunks(["a", "b", "c"])
+
+        assert await rerank("q", chunks, top_n=2) == chunks[:2]
+
+    @pytest.mark.asyncio
+    async def test_section_prefixed_to_document(self, cross_encoder):
+        chunks = _chunks(["a", "b", "c"])
+        chunks[0]["section"] = "ヒューズ"
+
+        result = await rerank("q", chunks, top_n=1)
+
+        assert result[0]["id"] == "v1_0"
+        assert cross_encoder._model.calls[0][0] == ("q", "ヒューズ\na")
+
+
+class TestBackendSelection:
+    @pytest.mark.asyncio
+    async def test_llm_backend_by_default(self):
+        chunks = _chunks(["a", "b", "c"])
+        with patch.object(reranker, "_rerank_with_llm", AsyncMock(return_value=chunks[:1])) as llm, \
+             patch.object(reranker, "_rerank_with_cross_encoder", AsyncMock()) as local:
+            assert await rerank("q", chunks, top_n=1) == chunks[:1]
+
+        llm.assert_awaited_once()
+        local.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_skips_when_few_chunks(self, cross_encoder):
+        chunks = _chunks(["a"])
+        assert await rerank("q", chunks, top_n=3) == chunks
+        assert cross_encoder._model.calls == []
@@ -0,0 +1,142 @@
+"""検索結果キャッシュとコーパスバージョンによる無効化のテスト"""
+import pytest
+
+from app.rag.chunker import Chunk
+from app.rag.search_cache import SearchResultCache, normalize_query
+
+
+def _result(content: str) -> dict:
+    return {"id": content, "content": content, "page": 1, "section": "",
+            "content_type": "", "has_warning": False, "score": 0.9}
+
+
+class TestSearchResultCache:
+    def test_hit_after_put_with_normalized_query(self):
+        cache = SearchResultCache(max_size=8, ttl_seconds=0)
+        cache.put(cache.key("v1", "エンジンが かからない", 5, "hybrid"), [_result("a")])
+
+        assert cache.get(cache.key("v1", " エンジンが　かからない ", 5, "hybrid")) == [_result("a")]
+        assert cache.get(cache.key("v1", "エンジンが かからない", 10, "hybrid")) is None
+        assert cache.get(cache.key("v1", "エンジンが かからない", 5, "vector")) is None
+        assert cache.get(cache.key("v2", "エンジンが かからない", 5, "hybrid")) is None
+
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 3
+        assert stats["memory_bytes"] > 0
+
+    def test_normalize_query(self):
+        assert normalize_query("ＡＢＳ  警告灯\n") == "ABS 警告灯"
+
+    def test_bump_invalidates_vehicle_and_cross_vehicle_entries(self):
+        cache = SearchResultCache(max_size=8, ttl_seconds=0)
+        for vehicle_id in ("v1", "v2", None):
+            cache.put(cache.key(vehicle_id, "q", 5, "vector"), [_result(str(vehicle_id))])
+
+        cache.bump("v1")
+
+        assert cache.get(cache.key("v1", "q", 5, "vector")) is None
+        assert cache.get(cache.key(None, "q", 5, "vector")) is None
+        assert cache.get(cache.key("v2", "q", 5, "vector")) == [_result("v2")]
+        assert cache.stats()["size"] == 1
+
+    def test_result_computed_before_bump_is_not_stored(self):
+        cache = SearchResultCache(max_size=8, ttl_seconds=0)
+        key = cache.key("v1", "q", 5, "vector")
+        cache.bump("v1")  # 検索中にingestが完了した
+
+        cache.put(key, [_result("stale")])
+
+        assert cache.stats()["size"] == 0
+        assert cache.get(cache.key("v1", "q", 5, "vector")) is None
+
+    def test_lru_eviction_and_memory_accounting(self):
+        cache = SearchResultCache(max_size=2, ttl_seconds=0)
+        for q in ("a", "b", "c"):
+            cache.put(cache.key("v1", q, 5, "vector"), [_result(q)])
+
+        assert cache.get(cache.key("v1", "a", 5, "vector")) is None
+        assert cache.stats()["size"] == 2
+        cache.bump("v1")
+        assert cache.stats()["memory_bytes"] == 0
+
+    def test_returned_results_are_copies(self):
+        cache = SearchResultCache(max_size=8, ttl_seconds=0)
+        key = cache.key("v1", "q", 5, "vector")
+        cache.put(key, [_result("a")])
+
+        cache.get(key)[0]["score"] = 0.0
+
+        assert cache.get(key)[0]["score"] == 0.9
+
+    def test_disabled_when_size_zero(self):
+        cache = SearchResultCache(max_size=0, ttl_seconds=0)
+        cache.put(cache.key("v1", "q", 5, "vector"), [_result("a")])
+        assert cache.get(cache.key("v1", "q", 5, "vector")) is None
+
+
+class TestVectorStoreCaching:
+    @pytest.fixture
+    def env(self, fake_embedder, make_store):
+        return make_store(), fake_embedder
+
+    @pytest.mark.asyncio
+    async def test_repeated_search_served_from_cache(self, env):
+        store, fake = env
+        await store.upsert_chunks([Chunk(text="エンジンがかからない時の確認", page=1)], vehicle_id="v1")
+
+        first = await store.hybrid_search("エンジンがかからない", vehicle_id="v1", n_results=5)
+        calls = fake.query_calls
+        second = await store.hybrid_search("エンジンがかからない", vehicle_id="v1", n_results=5)
+
+        assert second == first
+        assert fake.query_calls == calls
+        assert store.cache_stats()["hits"] >= 1
+
+    @pytest.mark.asyncio
+    async def test_search_many_only_embeds_uncached_queries(self, env):
+        store, fake = env
+        await store.upsert_chunks([Chunk(text="ブレーキ警告灯", page=1)], vehicle_id="v1")
+        await store.search("ブレーキ", vehicle_id="v1", n_results=3)
+        calls = fake.query_calls
+
+        results = await store.search_many(["ブレーキ", "警告灯"], vehicle_id="v1", n_results_per_query=3)
+
+        assert fake.query_calls == calls + 1
+        assert [r["content"] for r in results[0]] == ["ブレーキ警告灯"]
+
+    @pytest.mark.asyncio
+    async def test_ingest_and_delete_invalidate(self, env):
+        store, _ = env
+        await store.upsert_chunks([Chunk(text="旧マニュアル", page=1)], vehicle_id="v1")
+        assert [r["content"] for r in await store.search("マニュアル", vehicle_id="v1")] == ["旧マニュアル"]
+
+        await store.upsert_chunks([Chunk(text="新マニュアル", page=1)], vehicle_id="v1")
+        assert [r["content"] for r in await store.search("マニュアル", vehicle_id="v1")] == ["新マニュアル"]
+
+        await store.delete_vehicle("v1")
+        assert await store.search("マニュアル", vehicle_id="v1") == []
+
+    @pytest.mark.asyncio
+    async def test_unchanged_reingest_keeps_cache(self, env):
+        store, _ = env
+        chunks = [Chunk(text="ワイパーのヒューズ", page=1)]
+        await store.upsert_chunks(chunks, vehicle_id="v1")
+        version = store._result_cache.version("v1")
+
+        await store.upsert_chunks(chunks, vehicle_id="v1")
+
+        assert store._result_cache.version("v1") == version
+
+    @pytest.mark.asyncio
+    async def test_version_switched_by_other_worker_invalidates(self, env, make_store):
+        store, _ = env
+        other = make_store()  # 同じインデックスディレクトリを使う別ワーカー
+        await store.upsert_chunks([Chunk(text="旧マニュアル", page=1)], vehicle_id="v1")
+        assert [r["content"] for r in await store.search("マニュアル", vehicle_id="v1")] == ["旧マニュアル"]
+        assert [r["content"] for r in await store.search("マニュアル")] == ["旧マニュアル"]
+
+        await other.upsert_chunks([Chunk(text="新マニュアル", page=1)], vehicle_id="v1")
+
+        assert [r["content"] for r in await store.search("マニュアル", vehicle_id="v1")] == ["新マニュアル"]
+        assert [r["content"] for r in await store.search("マニュアル")] == ["新マニュアル"]
@@ -0,0 +1,113 @@
+"""複数クエリの一括検索（Embedder.embed_queries / VehicleManualStore.search_many）のテスト"""
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+import pytest
+
+from app.rag.chunker import Chunk
+from app.rag.embedder import Embedder
+from app.rag.vector_store import VehicleManualStore
+from app.services.rag_service import RAGService
+
+_TOPICS = ["ブレーキ", "エンジン", "ワイパー"]
+
+
+def _vector(text: str) -> list[float]:
+    return [1.0 if topic in text else 0.0 for topic in _TOPICS] + [0.1]
+
+
+class _BatchBackend:
+    name = "fake"
+    model_name = "fake-model"
+
+    def __init__(self):
+        self.batches: list[list[str]] = []
+
+    async def embed_queries(self, texts):
+        self.batches.append(list(texts))
+        return np.array([_vector(t) for t in texts], dtype=np.float32)
+
+    async def embed_query(self, text):
+        return (await self.embed_queries([text]))[0]
+
+
+class TestEmbedQueries:
+    @pytest.mark.asyncio
+    async def test_only_misses_are_embedded_in_one_batch(self):
+        emb = Embedder()
+        backend = _BatchBackend()
+        emb._backend = backend
+
+        await emb.embed_query("ブレーキ")
+        vectors = await emb.embed_queries(["ワイパー", "ブレーキ", "エンジン", "ワイパー"])
+
+        assert backend.batches[-1] == ["ワイパー", "エンジン"]
+        assert vectors.shape == (4, 4)
+        assert vectors.dtype == np.float32
+        assert vectors[0].tolist() == vectors[3].tolist()
+        assert vectors[1].tolist() == pytest.approx(_vector("ブレーキ"))
+
+    @pytest.mark.asyncio
+    async def test_empty(self):
+        emb = Embedder()
+        emb._backend = _BatchBackend()
+        assert (await emb.embed_queries([])).shape[0] == 0
+
+
+class TestSearchMany:
+    @pytest.mark.asyncio
+    async def test_matches_individual_searches(self, fake_embedder, make_store):
+        chunks = [
+            Chunk(text=text, page=i + 1)
+            for i, text in enumerate([
+                "ブレーキ液の点検", "ブレーキパッドの交換", "エンジンオイルの交換",
+                "ワイパーのヒューズ", "タイヤの空気圧",
+            ])
+        ]
+        fake_embedder.vector_fn = _vector
+        queries = ["ブレーキが効かない", "エンジンがかからない", "ワイパーが動かない"]
+        store = make_store()
+        await store.upsert_chunks(chunks, vehicle_id="v1")
+        batched = await store.search_many(queries, vehicle_id="v1", n_results_per_query=[3, 2, 1])
+        individual = [
+            await store.search(q, vehicle_id="v1", n_results=n)
+            for q, n in zip(queries, [3, 2, 1])
+        ]
+
+        assert fake_embedder.query_batches == [queries]
+        assert [len(r) for r in batched] == [3, 2, 1]
+        assert batched == individual
+        assert batched[2][0]["content"] == "ワイパーのヒューズ"
+
+    @pytest.mark.asyncio
+    async def test_empty_queries(self):
+        assert await VehicleManualStore().search_many([]) == []
+
+
+class TestRAGServiceUsesBatchSearch:
+    @pytest.mark.asyncio
+    async def test_batched_vector_search_per_branch(self):
+        chunk = {"id": "v1_0", "content": "ワイパーのヒューズ", "page": 1, "section": "",
+                 "content_type": "specification", "has_warning": False, "score": 0.9}
+        mock_vs = AsyncMock()
+        mock_vs.search_many.side_effect = lambda queries, **kwargs: [[chunk] if i == 0 else [] for i in range(len(queries))]
+        mock_vs.hybrid_search.return_value = [chunk]
+        mock_vs.diversify.side_effect = lambda query, chunks, **kwargs: chunks
+
+        with patch("app.services.rag_service.vector_store", mock_vs), \
+             patch("app.services.rag_service._generate_alt_queries", AsyncMock(return_value=["a", "b"])), \
+             patch("app.services.rag_service.rerank", AsyncMock(side_effect=lambda query, chunks, top_n: [
+                 {**c, "rerank_score": 8} for c in chunks
+             ])):
+            result = await RAGService().query("ワイパーが動かない", vehicle_id="v1")
+
+        # メイン + 推論キーワードで1バッチ、追加クエリで1バッチ
+        assert mock_vs.search_many.await_count == 2
+        calls = {c.args[0][0]: c for c in mock_vs.search_many.call_args_list}
+        main_call, alt_call = calls["ワイパーが動かない"], calls["a"]
+        assert main_call.kwargs["n_results_per_query"][0] == 10
+        assert alt_call.args[0] == ["a", "b"]
+        assert alt_call.kwargs["n_results_per_query"] == 5
+        assert mock_vs.hybrid_search.call_args.kwargs["vector_results"] == [chunk]
+        mock_vs.search.assert_not_awaited()
+        assert [s["page"] for s in result["sources"]] == [1]
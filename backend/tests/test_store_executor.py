@@ -0,0 +1,116 @@
+"""インデックスI/O専用スレッドプール（StoreExecutor）と hybrid_search の並行実行のテスト"""
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from app.rag.store_executor import StoreExecutor
+from app.rag.vector_store import VehicleManualStore
+
+
+class TestStoreExecutor:
+    @pytest.mark.asyncio
+    async def test_runs_off_event_loop_thread(self):
+        executor = StoreExecutor(max_workers=2)
+        loop_thread = threading.get_ident()
+
+        result, thread_id = await executor.run(lambda x: (x * 2, threading.get_ident()), 21)
+
+        assert result == 42
+        assert thread_id != loop_thread
+        assert executor.stats()["completed"] == 1
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_concurrency_limit_and_queue_depth(self):
+        executor = StoreExecutor(max_workers=2)
+        lock = threading.Lock()
+        running = 0
+        peak = 0
+
+        def work():
+            nonlocal running, peak
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.05)
+            with lock:
+                running -= 1
+
+        await asyncio.gather(*(executor.run(work) for _ in range(6)))
+
+        stats = executor.stats()
+        assert peak == 2
+        assert stats["max_queued"] >= 4
+        assert stats["queued"] == 0
+        assert stats["running"] == 0
+        assert stats["completed"] == 6
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_exception_propagates(self):
+        executor = StoreExecutor(max_workers=1)
+
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError):
+            await executor.run(fail)
+        assert executor.stats()["running"] == 0
+        executor.shutdown()
+
+    @pytest.mark.asyncio
+    async def test_cancelled_before_start_leaves_queue(self):
+        executor = StoreExecutor(max_workers=1)
+        release = threading.Event()
+        blocker = asyncio.ensure_future(executor.run(release.wait))
+        await asyncio.sleep(0.01)
+
+        waiting = asyncio.ensure_future(executor.run(lambda: None))
+        await asyncio.sleep(0.01)
+        assert executor.stats()["queued"] == 1
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+        assert executor.stats()["queued"] == 0
+        release.set()
+        await blocker
+        executor.shutdown()
+
+
+class TestHybridSearchConcurrency:
+    @pytest.mark.asyncio
+    async def test_vector_and_keyword_searches_overlap(self):
+        store = VehicleManualStore()
+        in_flight = 0
+        peak = 0
+
+        async def tracked(result):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.02)
+            in_flight -= 1
+            return result
+
+        def chunk(content, content_type="general"):
+            return {"id": content, "content": content, "page": 1, "section": "",
+                    "content_type": content_type, "has_warning": False, "score": 0.5}
+
+        async def fake_search(query, vehicle_id=None, n_results=5, warning_only=False, analysis=None):
+            return await tracked([chunk("vector")])
+
+        async def fake_keyword_search(keyword, vehicle_id=None, n_results=5):
+            return await tracked([chunk(f"kw:{keyword}")])
+
+        with patch.object(store, "search", fake_search), \
+             patch.object(store, "keyword_search", fake_keyword_search):
+            results = await store.hybrid_search("ブレーキ警告灯が点灯してオイルが漏れる", vehicle_id="v1")
+
+        assert peak == 4  # ベクトル検索1 + キーワード検索3
+        contents = {r["content"] for r in results}
+        assert "vector" in contents
+        assert len(contents) == 4
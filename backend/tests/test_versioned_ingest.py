@@ -0,0 +1,257 @@
+"""版管理された再ingest（エイリアス切り替え・再embedding・不要版の掃除）のテスト"""
+import asyncio
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import admin
+from app.rag.chunker import Chunk
+from app.rag.index_aliases import IndexAliases, split_physical_key
+from app.rag.vector_store import chunk_id
+
+
+def _vector(text):
+    return [float(len(text)), float(text.count("ブ")), 1.0]
+
+
+@pytest.fixture
+def fake_embedder(fake_embedder):
+    fake_embedder.vector_fn = _vector
+    return fake_embedder
+
+
+def _chunks(texts: list[str]) -> list[Chunk]:
+    return [Chunk(text=t, page=i + 1) for i, t in enumerate(texts)]
+
+
+class TestIndexAliases:
+    def test_reserve_swap_and_persist(self, tmp_path):
+        path = str(tmp_path / "aliases.json")
+        aliases = IndexAliases(path)
+
+        assert aliases.resolve("v1") == "v1"  # 版管理導入前の車両
+        first = aliases.reserve("v1")
+        second = aliases.reserve("v1")  # 同時に構築しても重ならない
+        assert (first, second) == ("v1__v1", "v1__v2")
+
+        assert aliases.swap("v1", second, embedding_model="m") == "v1"
+        reloaded = IndexAliases(path)
+        assert reloaded.resolve("v1") == "v1__v2"
+        assert reloaded.entry("v1")["embedding_model"] == "m"
+        assert reloaded.is_live("v1__v2")
+        assert not reloaded.is_live("v1__v1")
+        assert reloaded.reserve("v1") == "v1__v3"
+
+    def test_split_physical_key(self):
+        assert split_physical_key("honda_fit__v12") == ("honda_fit", 12)
+        assert split_physical_key("honda_fit") == ("honda_fit", 0)
+
+
+class TestVersionedUpsert:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("backend", ["flat", "chroma"])
+    async def test_reingest_switches_version_and_keeps_ids(self, backend, fake_embedder, make_store):
+        store = make_store(backend)
+        await store.upsert_chunks(_chunks(["ブレーキ液の点検", "ワイパーのヒューズ"]), vehicle_id="v1")
+        first = store._physical("v1")
+        await store.upsert_chunks(_chunks(["ブレーキ液の点検", "タイヤ空気圧"]), vehicle_id="v1")
+        second = store._physical("v1")
+
+        results = await store.search("ブレーキ", vehicle_id="v1")
+        assert (first, second) == ("v1__v1", "v1__v2")
+        assert store._get_backend().list_ids(first) == []
+        assert results[0]["id"] == chunk_id("v1", 1, "ブレーキ液の点検")
+        assert sorted(r["content"] for r in results) == ["タイヤ空気圧", "ブレーキ液の点検"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("backend,expected_adds", [("flat", 1), ("chroma", 3)])
+    async def test_version_written_in_backend_batches(self, backend, expected_adds, fake_embedder, make_store):
+        store = make_store(backend)
+        index = store._get_backend()
+        with patch.object(index, "add", wraps=index.add) as add:
+            await store.upsert_chunks(_chunks([f"チャンク{i}" for i in range(120)]), vehicle_id="v1")
+
+        # flat は add のたびにファイル全体を書き直すので、1版を1回の add で書く
+        assert add.call_count == expected_adds
+        assert len(index.list_ids(store._physical("v1"))) == 120
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("backend", ["flat", "chroma"])
+    async def test_reingest_without_chunks_publishes_empty_version(self, backend, fake_embedder, make_store):
+        store = make_store(backend)
+        await store.upsert_chunks(_chunks(["ブレーキ液の点検"]), vehicle_id="v1")
+
+        counts = await store.upsert_chunks([], vehicle_id="v1")  # テキストを抽出できないPDF
+
+        assert counts == {"added": 0, "removed": 1, "unchanged": 0}
+        assert store._physical("v1") == "v1__v2"
+        assert await store.search("ブレーキ", vehicle_id="v1") == []
+        assert store._get_backend().list_vehicles() == []
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("backend", ["flat", "chroma"])
+    async def test_cross_vehicle_search_fills_results_while_building(self, backend, fake_embedder, make_store):
+        store = make_store(backend)
+        await store.upsert_chunks(_chunks(["ブレーキ液の点検", "タイヤ空気圧"]), vehicle_id="v1")
+        await store.upsert_chunks(_chunks(["ブレーキパッドの交換"]), vehicle_id="v2")
+        # 構築中の版（未切り替え）のチャンクがクエリに最も近い
+        building = store._get_aliases().reserve("v1")
+        texts = [f"ブレーキ{i}" for i in range(4)]
+        store._get_backend().add(
+            building, [f"{building}_{i}" for i in range(4)], np.array([_vector("ブレーキ")] * 4, dtype=np.float32),
+            texts, [{"vehicle_id": building, "page": 1}] * 4,
+        )
+
+        results = await store.search("ブレーキ", n_results=3)
+        keyword_results = await store.keyword_search("ブレーキ", n_results=2)
+
+        assert sorted(r["content"] for r in results) == ["タイヤ空気圧", "ブレーキパッドの交換", "ブレーキ液の点検"]
+        assert sorted(r["content"] for r in keyword_results) == ["ブレーキパッドの交換", "ブレーキ液の点検"]
+
+    @pytest.mark.asyncio
+    async def test_failed_build_keeps_current_version(self, fake_embedder, make_store):
+        store = make_store()
+        await store.upsert_chunks(_chunks(["旧チャンク"]), vehicle_id="v1")
+        fake_embedder.fail = True
+
+        with pytest.raises(RuntimeError):
+            await store.upsert_chunks(_chunks(["新チャンク"]), vehicle_id="v1")
+
+        assert store._physical("v1") == "v1__v1"
+        assert [r["content"] for r in await store.search("チャンク", vehicle_id="v1")] == ["旧チャンク"]
+        assert store._get_backend().list_vehicles() == ["v1__v1"]  # 途中まで書いた版は削除済み
+
+    @pytest.mark.asyncio
+    async def test_legacy_vehicle_migrates_on_next_ingest(self, fake_embedder, make_store):
+        store = make_store()
+        # 版管理導入前の形式（物理キー = 車両ID）で保存されたデータ
+        store._get_backend().add(
+            "v1", [chunk_id("v1", 1, "旧本文")], np.array([[3.0, 0.0, 1.0]], dtype=np.float32),
+            ["旧本文"], [{"vehicle_id": "v1", "page": 1}],
+        )
+        assert [r["content"] for r in await store.search("本文", vehicle_id="v1")] == ["旧本文"]
+
+        counts = await store.upsert_chunks(_chunks(["旧本文", "新本文"]), vehicle_id="v1")
+
+        assert counts == {"added": 1, "removed": 0, "unchanged": 1}
+        assert store._get_backend().list_vehicles() == ["v1__v1"]
+        assert sorted(r["content"] for r in await store.search("本文", vehicle_id="v1")) == ["新本文", "旧本文"]
+
+
+class TestReembed:
+    @pytest.mark.asyncio
+    async def test_reembed_with_new_model(self, fake_embedder, make_store):
+        store = make_store()
+        await store.upsert_chunks(_chunks(["ブレーキ液の点検", "ワイパーのヒューズ"]), vehicle_id="v1")
+
+        fake_embedder.model_name = "model-b"
+        fake_embedder.embedded.clear()
+        assert (await store.get_stats())["versions"]["v1"]["stale"] is True
+
+        result = await store.reembed_vehicle("v1")
+
+        assert result == {"vehicle_id": "v1", "chunks": 2, "embedding_model": "model-b"}
+        assert sorted(fake_embedder.embedded) == ["ブレーキ液の点検", "ワイパーのヒューズ"]
+        assert store._physical("v1") == "v1__v2"
+        assert (await store.get_stats())["versions"]["v1"]["stale"] is False
+        keyword = await store.keyword_search("ワイパー", vehicle_id="v1")
+        assert [r["id"] for r in keyword] == [chunk_id("v1", 2, "ワイパーのヒューズ")]
+
+    @pytest.mark.asyncio
+    async def test_reembed_vehicles_continues_after_failure(self, fake_embedder, make_store):
+        store = make_store()
+        await store.upsert_chunks(_chunks(["本文"]), vehicle_id="v1")
+
+        result = await store.reembed_vehicles(["missing", "v1"])
+
+        assert result["reembedded"] == ["v1"]
+        assert list(result["failed"]) == ["missing"]
+
+
+class TestGarbageCollection:
+    @pytest.mark.asyncio
+    async def test_drops_only_unreferenced_versions(self, fake_embedder, make_store):
+        store = make_store()
+        await store.upsert_chunks(_chunks(["本文"]), vehicle_id="v1")
+        backend = store._get_backend()
+        # 旧版の削除に失敗して残った版と、構築中の版
+        for key in ("v1__v0", "v1__v7"):
+            backend.add(key, [f"{key}_x"], np.ones((1, 3), dtype=np.float32), ["x"], [{"vehicle_id": key}])
+        store._building.add("v1__v7")
+
+        result = await store.collect_garbage()
+
+        assert result == {"dropped": ["v1__v0"]}
+        assert sorted(backend.list_vehicles()) == ["v1__v1", "v1__v7"]
+        assert await store.list_vehicles() == ["v1"]
+
+
+class TestSharedIndexDirectory:
+    """同じインデックスディレクトリを共有する複数ワーカー"""
+
+    @pytest.mark.asyncio
+    async def test_other_worker_follows_swap(self, fake_embedder, make_store):
+        worker_a = make_store()
+        worker_b = make_store()
+        await worker_a.upsert_chunks(_chunks(["旧本文"]), vehicle_id="v1")
+        assert [r["content"] for r in await worker_b.search("本文", vehicle_id="v1")] == ["旧本文"]
+
+        await worker_a.upsert_chunks(_chunks(["新本文"]), vehicle_id="v1")
+
+        assert worker_b._physical("v1") == "v1__v2"
+        assert [r["content"] for r in await worker_b.search("本文", vehicle_id="v1")] == ["新本文"]
+        assert [r["content"] for r in await worker_b.keyword_search("新本文", vehicle_id="v1")] == ["新本文"]
+
+    @pytest.mark.asyncio
+    async def test_gc_on_other_worker_keeps_live_and_in_progress_versions(self, fake_embedder, make_store):
+        worker_a = make_store()
+        worker_b = make_store()
+        await worker_a.upsert_chunks(_chunks(["旧本文"]), vehicle_id="v1")
+        worker_b._physical("v1")  # B がエイリアスを読み込んだ後に A が切り替える
+        await worker_a.upsert_chunks(_chunks(["新本文"]), vehicle_id="v1")
+        # A が構築中の版（B からは _building が見えない）
+        in_progress = worker_a._get_aliases().reserve("v1")
+        worker_a._get_backend().add(
+            in_progress, [f"{in_progress}_x"], np.ones((1, 3), dtype=np.float32), ["x"], [{"vehicle_id": in_progress}],
+        )
+
+        result = await worker_b.collect_garbage()
+
+        assert result == {"dropped": []}
+        assert sorted(worker_a._get_backend().list_vehicles()) == ["v1__v2", "v1__v3"]
+        assert [r["content"] for r in await worker_a.search("本文", vehicle_id="v1")] == ["新本文"]
+
+    @pytest.mark.asyncio
+    async def test_older_build_does_not_replace_newer_version(self, fake_embedder, make_store):
+        worker_a = make_store()
+        worker_b = make_store()
+        await worker_a.upsert_chunks(_chunks(["本文1"]), vehicle_id="v1")
+        older = worker_b._get_aliases().reserve("v1")  # B が先に払い出したが切り替えが遅れた版
+        await worker_a.upsert_chunks(_chunks(["本文2"]), vehicle_id="v1")
+
+        assert older == "v1__v2"
+        assert worker_b._get_aliases().swap("v1", older) == older
+        assert worker_b._physical("v1") == "v1__v3"
+
+
+class TestAdminEndpoints:
+    def test_reembed_and_gc(self, fake_embedder, make_store):
+        app = FastAPI()
+        app.include_router(admin.router, prefix="/api")
+        client = TestClient(app)
+
+        with patch.object(admin, "embedder", fake_embedder):
+            store = make_store()
+            with patch.object(admin, "vector_store", store):
+                empty = client.post("/api/admin/reembed")
+                asyncio.run(store.upsert_chunks(_chunks(["本文"]), vehicle_id="v1"))
+                scheduled = client.post("/api/admin/reembed")
+                gc = client.post("/api/admin/index-gc")
+
+        assert empty.status_code == 404
+        assert scheduled.json() == {"scheduled": ["v1"], "embedding_model": "fake-model"}
+        assert gc.json() == {"dropped": []}
+        assert store._physical("v1") == "v1__v2"
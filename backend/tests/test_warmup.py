@@ -0,0 +1,64 @@
+"""Tests for background warm-up and readiness reporting."""
+import pytest
+
+from app.services.warmup import WarmupService
+
+
+def _service_with_steps(*steps) -> WarmupService:
+    service = WarmupService()
+    service._steps = list(steps)
+    return service
+
+
+class TestWarmupService:
+    def test_initially_not_ready(self):
+        service = WarmupService()
+        assert service.status == "pending"
+        assert service.ready is False
+
+    @pytest.mark.asyncio
+    async def test_all_steps_succeed(self):
+        calls: list[str] = []
+
+        async def step_a():
+            calls.append("a")
+
+        async def step_b():
+            calls.append("b")
+
+        service = _service_with_steps(("a", step_a), ("b", step_b))
+        await service.run()
+
+        assert calls == ["a", "b"]
+        assert service.status == "ready"
+        assert service.ready is True
+        assert service.snapshot()["components"]["b"]["status"] == "ready"
+
+    @pytest.mark.asyncio
+    async def test_failed_step_marks_degraded_and_continues(self):
+        calls: list[str] = []
+
+        async def broken():
+            raise RuntimeError("model missing")
+
+        async def ok():
+            calls.append("ok")
+
+        service = _service_with_steps(("model", broken), ("index", ok))
+        await service.run()
+
+        assert calls == ["ok"]
+        assert service.status == "degraded"
+        assert service.ready is True
+        assert service.components["model"] == {"status": "failed", "error": "model missing"}
+
+    @pytest.mark.asyncio
+    async def test_start_runs_in_background(self):
+        async def ok():
+            pass
+
+        service = _service_with_steps(("a", ok))
+        task = service.start()
+        assert service.start() is task
+        await task
+        assert service.ready is True